@@ -0,0 +1,6 @@
+from project_code import cli
+
+import sys
+
+if __name__ == "__main__":
+    sys.exit(cli.main())
@@ -27,6 +27,25 @@ def open_standard_width(file_name):
     return active_image.resize(new_size)
 
 
+def open_full_resolution(file_name):
+    """
+    Opens an image with pillow without resizing it.
+
+    Meant for the tiled search of ``TransformImage.find_circles_tiled``, which keeps the detail of large images.
+
+    Parameters
+    ----------
+    file_name : str
+        The path to the image location.
+
+    Returns
+    -------
+    pillow.Image
+        The opened image.
+    """
+    return pillowImage.open(file_name)
+
+
 def canny_with_images_between_stages(file_name):
     """
     Manipulates an images with canny edge detection and prints images between every step.
@@ -0,0 +1,175 @@
+import multiprocessing
+import queue
+import traceback
+
+from project_code import analyse_image as open_image
+from project_code.image_manipulation.classes.wrapper import image_transform as analyse
+from project_code.image_manipulation import \
+    hough_circle_transform as hough, \
+    scratch_memory as scratch
+
+
+def _edge_settings(settings):
+    """The (kernel size, noise) of the settings, the arguments of ``TransformImage.apply_canny``."""
+    return settings.get('kernel_size', 3), settings['noise']
+
+
+def _detect_edges(image, settings):
+    """Runs canny edge detection on the image with the settings, returning the ``TransformImage``."""
+    working_image = analyse.TransformImage(image)
+    working_image.apply_canny(*_edge_settings(settings))
+    return working_image
+
+
+def analyse_in_process(source, settings, messages, scratch_settings=(None, None), commands=None):
+    """
+    Finds the circles in an image, sending progress messages. The target of the worker process.
+
+    Runs canny edge detection and then searches the radii one at a time with ``TransformImage.stream_circles``. After
+    every step it sends a message to the parent, which polls for them without waiting:
+    - ('image', pillow.Image): the opened and resized image, when the worker was given a file.
+    - ('prepared',): the edges have been detected and the worker waits to search, when it prepares an image.
+    - ('progress', steps done, total steps, description of the next step)
+    - ('done', {radius: [(x, y)]}): the found circles, the last message.
+    - ('error', traceback): the analysis failed, the last message.
+
+    Parameters
+    ----------
+    source: pillow.Image or str
+        The image to analyse, or the path to the image, which is opened with ``open_image.open_standard_width``.
+    settings: dict
+        'size': range of radii, 'noise': amount of noise, and optionally 'kernel_size', 'engine' and
+        'angular_tolerance', see ``TransformImage.apply_canny`` and ``TransformImage.stream_circles``.
+    messages: multiprocessing.Queue
+        The queue to send the messages to.
+    scratch_settings: tuple
+        The memory threshold and scratch directory of the parent, see ``scratch.configure``.
+    commands: multiprocessing.Queue
+        When given, only the edges are detected before waiting for the settings of the search on this queue. The
+        edges are detected again when the kernel size or noise of those settings differ, and None stops the worker.
+
+    Returns
+    -------
+    None
+        The last message holds the found circles or the error.
+    """
+    try:
+        scratch.configure(*scratch_settings)
+        if isinstance(source, str):
+            source = open_image.open_standard_width(source)
+            messages.put(('image', source))
+
+        working_image = None
+        if commands is not None:
+            working_image = _detect_edges(source, settings)
+            messages.put(('prepared',))
+            search_settings = commands.get()
+            if search_settings is None:
+                return
+            if _edge_settings(search_settings) != _edge_settings(settings):
+                working_image = None
+            settings = search_settings
+
+        radii = hough.radius_ranges[settings['size']]
+        total_steps = len(radii) + 1
+        messages.put(('progress', 0, total_steps, 'Detecting edges'))
+        if working_image is None:
+            working_image = _detect_edges(source, settings)
+        messages.put(('progress', 1, total_steps, 'Searching radius {}'.format(radii[0])))
+
+        found_circles = dict()
+        circles = working_image.stream_circles(settings['size'], settings.get('engine', 'auto'),
+                                               settings.get('angular_tolerance', hough.default_angular_tolerance))
+        for step, (radius, centers) in enumerate(circles, 2):
+            if centers:
+                found_circles[radius] = centers
+            next_step = 'Searching radius {}'.format(radius + 1) if step < total_steps else 'Done'
+            messages.put(('progress', step, total_steps, next_step))
+        messages.put(('done', found_circles))
+    except Exception:
+        messages.put(('error', traceback.format_exc()))
+
+
+class AnalysisWorker(object):
+    """
+    Runs the analysis of one image in a separate process, for interfaces that have to stay responsive.
+
+    The computation does not share the interpreter (and its lock) of the interface, and is stopped right away by
+    cancelling, which terminates the process. The owner starts the worker, calls ``poll`` regularly (with
+    ``tkinter.Misc.after`` in the interface) until it gets the 'done' or 'error' message, and may ``cancel`` it at any
+    time. A worker can also prepare an image ahead of time: it opens the image and detects its edges in the
+    background, and waits until ``search`` is called, so only the circle search is left when the image is needed.
+    """
+    def __init__(self, source, settings, prepare=False):
+        """
+        Creates a worker, does not start it yet.
+
+        Parameters
+        ----------
+        source: pillow.Image or str
+            The image to analyse, or the path to the image.
+        settings: dict
+            The settings of the analysis, see ``analyse_in_process``.
+        prepare: bool
+            Only open the image and detect its edges, and search for circles after ``search`` is called.
+        """
+        self.settings = settings
+        self.messages = multiprocessing.Queue()
+        self.commands = multiprocessing.Queue() if prepare else None
+        self.process = multiprocessing.Process(target=analyse_in_process,
+                                               args=(source, settings, self.messages, scratch.settings(),
+                                                     self.commands),
+                                               daemon=True)
+        self.finished = False
+
+    def start(self):
+        """Starts the analysis in the worker process."""
+        self.process.start()
+
+    def search(self, settings=None):
+        """
+        Lets a preparing worker search for circles, right away or as soon as the edges are detected.
+
+        Parameters
+        ----------
+        settings: dict
+            The settings of the search. The settings the worker prepared the image with when not given.
+        """
+        self.commands.put(settings if settings is not None else self.settings)
+
+    def poll(self):
+        """
+        Takes the messages the worker sent since the last call, without waiting.
+
+        Returns
+        -------
+        list [tuple]
+            The messages, oldest first. The worker is finished after a 'done' or 'error' message.
+        """
+        received = list()
+        while not self.finished:
+            try:
+                message = self.messages.get_nowait()
+            except queue.Empty:
+                if not self.process.is_alive() and self.process.exitcode is not None and self.messages.empty():
+                    # The process ended without its last message, for instance when it ran out of memory.
+                    received.append(('error', 'The analysis stopped with exit code {}.'.format(
+                        self.process.exitcode)))
+                    self.finished = True
+                break
+            received.append(message)
+            self.finished = message[0] in ('done', 'error')
+        if self.finished:
+            self.process.join()
+        return received
+
+    def cancel(self):
+        """Stops the analysis right away by terminating the worker process."""
+        if self.process.is_alive():
+            self.process.terminate()
+        if self.process.pid is not None:
+            self.process.join()
+        self.finished = True
+        self.messages.close()
+        if self.commands is not None:
+            self.commands.close()
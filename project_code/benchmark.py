@@ -0,0 +1,299 @@
+from project_code import synthetic_images as synthetic
+from project_code.image_manipulation import \
+    standard_filters as apply_filter, \
+    sobel_edge_detector as sobel, \
+    canny_edge_detector as canny, \
+    hough_circle_transform as hough
+from project_code.image_manipulation.classes import pixel_table as tables
+from project_code.image_manipulation.classes.wrapper import image_transform as analyse
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+# Directory of the digital test images.
+digital_images_directory = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_images',
+                                        'digital')
+
+default_sizes = (250, 500, 1000, 2000, 4000)
+default_presets = (1, 2)
+# Fraction a stage may be slower than its baseline before it counts as a regression.
+default_threshold = 0.2
+# Seconds a stage has to be slower than its baseline at least to count as a regression, ignores noise of fast stages.
+minimum_difference = 0.005
+
+# The stages up to canny, in the order of the pipeline. They do not depend on the range of radii.
+edge_stages = ('greyscale', 'gauss_blur', 'sobel', 'canny')
+
+
+def generated_image(width, radii, seed=0):
+    """
+    Generates a square greyscale image with light rings on a dark background, see ``synthetic.generate_image``.
+
+    Parameters
+    ----------
+    width: int
+        Length of the sides of the image.
+    radii: list [int]
+        The radii to draw rings of.
+    seed: int
+        Seed of the positions and radii of the rings.
+
+    Returns
+    -------
+    pillow.Image
+        The generated image. About a sixth of the image is covered by rings, which may overlap.
+    """
+    ring_count = max(int(width * width / (6 * np.mean(np.square(radii)) * np.pi)), 1)
+    image, _ = synthetic.generate_image(seed, width, count=ring_count, radii=(min(radii), max(radii)), overlap=1.0)
+    return image
+
+
+def digital_images(directory=digital_images_directory):
+    """The paths to the images in a directory, sorted."""
+    return sorted(os.path.join(directory, file_name) for file_name in os.listdir(directory)
+                  if file_name.lower().endswith(('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp')))
+
+
+def resized_image(image, width):
+    """Resizes an image to a width, without altering its proportions."""
+    return image.resize((width, max(int(width / image.width * image.height), 1)))
+
+
+def copy_table(value_table):
+    """Copies the planes of a pixel table into a new pixel table."""
+    height, width = value_table.shape
+    table_copy = tables.PixelTable(width, height)
+    for plane in ('values', 'cache', 'orientation', 'on'):
+        np.copyto(getattr(table_copy, plane), getattr(value_table, plane))
+    return table_copy
+
+
+def time_stage(prepare, run, repeats):
+    """
+    Times a stage.
+
+    The input of every run is prepared anew and is not timed, so stages that change their input in place can be
+    timed repeatedly. The output of the stages is discarded.
+
+    Parameters
+    ----------
+    prepare: callable
+        Returns the input of the stage.
+    run: callable
+        Runs the stage on the input.
+    repeats: int
+        Amount of times the stage is run.
+
+    Returns
+    -------
+    tuple: (list [float], object)
+        The time of every run in seconds, and the result of the last run.
+    """
+    times = list()
+    result = None
+    for _ in range(repeats):
+        stage_input = prepare()
+        start = time.perf_counter()
+        result = run(stage_input)
+        times.append(time.perf_counter() - start)
+    return times, result
+
+
+def benchmark_image(image_name, image, presets, repeats=3, kernel_size=5, noise=2, engine='auto'):
+    """
+    Times every stage, and the whole pipeline, on one image.
+
+    Every stage starts from the output of the previous stage.
+
+    Parameters
+    ----------
+    image_name: str
+        Name of the image in the results.
+    image: pillow.Image
+        The image.
+    presets: list [int]
+        The ranges of radii to search, see ``hough.radius_ranges``.
+    repeats: int
+        Amount of times every stage is run.
+    kernel_size: int
+        Size of the blur kernel and the non-maximum suppression.
+    noise: int
+        Approximate amount of noise in the image.
+    engine: str
+        How the edge pixels vote, see ``hough.accumulate_radius_range``.
+
+    Returns
+    -------
+    list: [dict]
+        The result of every stage: the image, its width and height, the preset (None for the edge stages), the stage,
+        the best and median time in seconds and, for the circle stages, the amount of found circles.
+    """
+    stage_inputs = {'greyscale': lambda: tables.PixelTable(image.width, image.height)}
+    stage_runs = {'greyscale': lambda table: table.fill_with_image(image),
+                  'gauss_blur': lambda table: apply_filter.gauss_blur(table, kernel_size),
+                  'sobel': lambda table: sobel.run_sobel_edge_detection(table),
+                  'canny': lambda table: canny.canny_detector(table, kernel_size, noise)}
+
+    results = list()
+
+    def record(stage, preset, times, circle_count=None):
+        result = {'image': image_name, 'width': image.width, 'height': image.height, 'preset': preset,
+                  'stage': stage, 'repeats': len(times), 'best': min(times), 'median': statistics.median(times)}
+        if circle_count is not None:
+            result['circles'] = circle_count
+        results.append(result)
+
+    def run_pipeline(working_image, preset):
+        working_image.apply_canny(kernel_size, noise)
+        return working_image.find_circles(preset, engine)
+
+    value_table = None
+    for stage in edge_stages:
+        if value_table is not None:
+            stage_inputs[stage] = lambda table=value_table: copy_table(table)
+        times, _ = time_stage(stage_inputs[stage], stage_runs[stage], repeats)
+        record(stage, None, times)
+        value_table = stage_inputs[stage]()
+        stage_runs[stage](value_table)
+
+    for preset in presets:
+        times, found_circles = time_stage(lambda: value_table,
+                                          lambda table: hough.find_circles_unset_size(table, preset, engine),
+                                          repeats)
+        record('hough', preset, times, sum(len(centers) for centers in found_circles.values()))
+
+        times, found_circles = time_stage(lambda: analyse.TransformImage(image),
+                                          lambda working_image: run_pipeline(working_image, preset), repeats)
+        record('pipeline', preset, times, sum(len(centers) for centers in found_circles.values()))
+    return results
+
+
+def compare_results(results, baseline_results, threshold=default_threshold):
+    """
+    Compares the best times of the results with those of a baseline.
+
+    Parameters
+    ----------
+    results: list [dict]
+        The results, see ``benchmark_image``.
+    baseline_results: list [dict]
+        The results of the baseline. Results without a counterpart are skipped.
+    threshold: float
+        Fraction a stage may be slower than its baseline before it counts as a regression. A stage also has to be
+        ``minimum_difference`` seconds slower.
+
+    Returns
+    -------
+    list: [dict]
+        The image, width, preset and stage of every compared result, with the 'baseline' and 'current' best time,
+        their 'ratio', and whether the stage 'regressed'.
+    """
+    def result_key(result):
+        return result['image'], result['width'], result['preset'], result['stage']
+
+    baseline_times = {result_key(result): result['best'] for result in baseline_results}
+    comparisons = list()
+    for result in results:
+        baseline_time = baseline_times.get(result_key(result))
+        if baseline_time is None:
+            continue
+        ratio = result['best'] / baseline_time if baseline_time > 0 else 1.0
+        comparisons.append({'image': result['image'], 'width': result['width'], 'preset': result['preset'],
+                            'stage': result['stage'], 'baseline': baseline_time, 'current': result['best'],
+                            'ratio': ratio,
+                            'regressed': ratio > 1 + threshold and result['best'] - baseline_time > minimum_difference})
+    return comparisons
+
+
+def build_parser():
+    """Builds the parser of the command line arguments."""
+    parser = argparse.ArgumentParser(prog='python -m project_code.benchmark',
+                                     description='Times every stage of the pipeline on images of increasing size.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=default_sizes, help='widths of the images in pixels')
+    parser.add_argument('--presets', type=int, nargs='+', default=default_presets, choices=range(6),
+                        help='ranges of radii to search, see the --size of the command line interface')
+    parser.add_argument('--images', nargs='*', default=None,
+                        help='images to resize to every size (default the digital test images)')
+    parser.add_argument('--no-generated', action='store_true', help='skip the generated images')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generated images')
+    parser.add_argument('--repeats', type=int, default=3, help='amount of times every stage is run (default 3)')
+    parser.add_argument('--kernel-size', type=int, default=5, help='size of the blur kernel (default 5)')
+    parser.add_argument('--noise', type=int, default=2, choices=range(6), help='amount of noise (default 2)')
+    parser.add_argument('--engine', default='auto', choices=hough.voting_engines,
+                        help='how the edge pixels vote in the hough transform (default auto)')
+    parser.add_argument('--output', default='benchmark.json', help='file to write the results to')
+    parser.add_argument('--baseline', help='results of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=default_threshold,
+                        help='fraction a stage may be slower than the baseline (default %(default)s)')
+    return parser
+
+
+def main(arguments=None):
+    """
+    Runs the benchmarks of every stage of the pipeline, and of the whole pipeline, on images of increasing size.
+
+    Times the greyscale conversion, the blur, the sobel edge detector, canny edge detection and the hough circle
+    transform separately, and the whole pipeline end to end, for every image size and range of radii:
+
+        python -m project_code.benchmark --sizes 250 1000 4000 --presets 1 2 --output benchmark.json
+
+    The images are the digital test images, resized to every size, and generated images with rings of the searched
+    radii. The results are written as JSON. Given the results of an earlier run as baseline, every stage that became
+    slower than the threshold allows is reported.
+
+    Parameters
+    ----------
+    arguments: list [str]
+        The command line arguments. Read from ``sys.argv`` when not given.
+
+    Returns
+    -------
+    int
+        The exit status: 0 when no stage regressed, 1 when a stage is slower than the baseline allows.
+    """
+    options = build_parser().parse_args(arguments)
+    image_paths = digital_images() if options.images is None else options.images
+    source_images = [(os.path.splitext(os.path.basename(path))[0], Image.open(path)) for path in image_paths]
+    generated_radii = sorted(set(radius for preset in options.presets for radius in hough.radius_ranges[preset]))
+
+    results = list()
+    for width in options.sizes:
+        images = [(image_name, resized_image(image, width)) for image_name, image in source_images]
+        if not options.no_generated:
+            images.append(('generated', generated_image(width, generated_radii, options.seed)))
+        for image_name, image in images:
+            for result in benchmark_image(image_name, image, options.presets, options.repeats, options.kernel_size,
+                                          options.noise, options.engine):
+                results.append(result)
+                print('{image} {width}x{height} preset {preset} {stage}: {best:.4f} s'.format(**result))
+
+    settings = {option: getattr(options, option)
+                for option in ('sizes', 'presets', 'repeats', 'kernel_size', 'noise', 'engine', 'seed')}
+    environment = {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+                   'processor': platform.processor(), 'cpu_count': os.cpu_count()}
+    with open(options.output, 'w') as output_file:
+        json.dump({'environment': environment, 'settings': settings, 'results': results}, output_file, indent=2)
+
+    if options.baseline is None:
+        return 0
+    with open(options.baseline) as baseline_file:
+        baseline_results = json.load(baseline_file)['results']
+    exit_status = 0
+    for comparison in compare_results(results, baseline_results, options.threshold):
+        if comparison['regressed']:
+            exit_status = 1
+            print('Regression: {image} width {width} preset {preset} {stage} took {current:.4f} s instead of '
+                  '{baseline:.4f} s ({ratio:.2f}x)'.format(**comparison), file=sys.stderr)
+    return exit_status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,322 @@
+from project_code import analyse_image as open_image
+from project_code.image_manipulation.classes.wrapper import image_transform as analyse
+from project_code.image_manipulation import \
+    hough_circle_transform as hough, \
+    stage_cache as caching, \
+    scratch_memory as scratch, \
+    instrumentation
+
+from concurrent import futures
+import argparse
+import contextlib
+import csv
+import glob
+import json
+import os
+import sys
+
+# Extensions of the files that are read from a directory.
+image_extensions = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp')
+
+# Columns of the per image CSV files and of the summary file.
+circle_columns = ('x', 'y', 'radius', 'diameter')
+summary_columns = ('file', 'width', 'height', 'zoom', 'circle_count', 'mean_diameter', 'mean_radius')
+
+
+def expand_image_paths(inputs, recursive=False):
+    """
+    Expands files, glob patterns and directories into a list of image files.
+
+    Parameters
+    ----------
+    inputs: list [str]
+        Paths to files or directories, or glob patterns.
+    recursive: bool
+        Also reads the images in the subdirectories of directories, and lets ``**`` in patterns match directories.
+
+    Returns
+    -------
+    list: [str]
+        The image files, in the order of the inputs. Directories and patterns are sorted. Every file occurs once.
+    """
+    image_paths = list()
+    for path in inputs:
+        if os.path.isdir(path):
+            if recursive:
+                found_paths = [os.path.join(directory, file_name) for directory, _, file_names in os.walk(path)
+                               for file_name in file_names]
+            else:
+                found_paths = [os.path.join(path, file_name) for file_name in os.listdir(path)]
+            found_paths = sorted(found_path for found_path in found_paths
+                                 if os.path.isfile(found_path) and found_path.lower().endswith(image_extensions))
+        elif glob.has_magic(path):
+            found_paths = sorted(found_path for found_path in glob.glob(path, recursive=recursive)
+                                 if os.path.isfile(found_path))
+        else:
+            found_paths = [path]
+
+        for found_path in found_paths:
+            if found_path not in image_paths:
+                image_paths.append(found_path)
+    return image_paths
+
+
+def analyse_file(file_name, size, noise, width=None, zoom=None, kernel_size=5, engine='auto',
+                 angular_tolerance=hough.default_angular_tolerance, pyramid=False, full_resolution=False,
+                 annotation_name=None, cache_directory=None, cache_size=caching.default_cache_size,
+                 memory_threshold=None, scratch_directory=None, event_name=None, collect_events=False):
+    """
+    Counts and measures the circles in one image.
+
+    The image is resized like in the GUI, or searched tile by tile at full resolution.
+
+    Parameters
+    ----------
+    file_name: str
+        Path to the image.
+    size: int
+        The range of radii, 0 - 5, see ``hough.radius_ranges``.
+    noise: int
+        Approximate amount of noise in the image, 0 - 5.
+    width: float
+        Real width of the image, for example in µm. Used to compute the zoom when it is not given.
+    zoom: float
+        Real length of one pixel of the searched image. 1 when neither the width nor the zoom is given.
+    kernel_size: int
+        Size of the blur kernel and the non-maximum suppression.
+    engine: str
+        How the edge pixels vote, one of ``hough.voting_engines``.
+    angular_tolerance: float
+        Maximum deviation from the gradient in radians at which the 'gradient' engine votes.
+    pyramid: bool
+        Search coarse-to-fine, see ``TransformImage.find_circles``.
+    full_resolution: bool
+        Search the image without resizing it, tile by tile, see ``TransformImage.find_circles_tiled``.
+    annotation_name: str
+        Path of a PNG to save the image with the found circles drawn over it to. Nothing is saved when not given.
+    cache_directory: str
+        Directory of the stage cache, so the edges of an image that was analysed before with the same kernel size and
+        noise are not computed again. Nothing is cached when not given, or when searching at full resolution.
+    cache_size: int
+        Maximum size of the stage cache in bytes.
+    memory_threshold: int
+        Arrays larger than this amount of bytes are memory-mapped in the scratch directory, see ``scratch.empty``.
+        The settings of the process are kept when not given.
+    scratch_directory: str
+        Directory of the memory-mapped arrays.
+    event_name: str
+        Path of a JSON lines file to append the timings and counts of every stage to, see ``instrumentation``.
+    collect_events: bool
+        Return the timings and counts of every stage under 'events', so that a single process can write the events of
+        all workers to one file.
+
+    Returns
+    -------
+    dict
+        The summary of the image (see ``summary_columns``), its circles under 'circles' and, when collected, its
+        events under 'events'.
+    """
+    if memory_threshold is not None:
+        scratch.configure(memory_threshold, scratch_directory)
+
+    if full_resolution:
+        image = open_image.open_full_resolution(file_name)
+    else:
+        image = open_image.open_standard_width(file_name)
+    stage_cache = None
+    if cache_directory is not None and not full_resolution:
+        stage_cache = caching.StageCache(cache_directory, cache_size)
+    working_image = analyse.TransformImage(image, stage_cache)
+
+    event_sinks = list()
+    with contextlib.ExitStack() as recording:
+        if event_name is not None:
+            event_sinks.append(instrumentation.JsonLinesSink(event_name))
+            recording.callback(event_sinks[-1].close)
+        if collect_events:
+            event_sinks.append(instrumentation.MemorySink())
+        if event_sinks:
+            recording.enter_context(working_image.record_events(*event_sinks))
+            recording.enter_context(instrumentation.measure('analyse_file', file=file_name))
+
+        if full_resolution:
+            found_circles = working_image.find_circles_tiled(size, kernel_size=kernel_size, noise=noise, engine=engine,
+                                                             angular_tolerance=angular_tolerance)
+        else:
+            working_image.apply_canny(kernel_size, noise)
+            found_circles = working_image.find_circles(size, engine=engine, angular_tolerance=angular_tolerance,
+                                                       pyramid=pyramid)
+
+    if zoom is None:
+        zoom = width / image.width if width else 1
+    circle_count, mean_diameter, mean_radius = open_image.process_circle_results(found_circles, zoom)
+
+    if annotation_name is not None:
+        working_image.working_image = working_image.working_image.convert('RGB')
+        working_image.draw_circles(found_circles, (255, 0, 0), show=False)
+        working_image.working_image.save(annotation_name, format='PNG')
+
+    circles = [{'x': x, 'y': y, 'radius': radius, 'diameter': 2 * radius * zoom}
+               for radius, centers in sorted(found_circles.items()) for x, y in centers]
+    result = {'file': file_name,
+              'width': image.width,
+              'height': image.height,
+              'zoom': zoom,
+              'circle_count': circle_count,
+              'mean_diameter': mean_diameter,
+              'mean_radius': mean_radius,
+              'circles': circles}
+    if collect_events:
+        result['events'] = event_sinks[-1].events
+    return result
+
+
+def output_names(image_paths, output_directory):
+    """Chooses a unique base name inside the output directory for the results of every image."""
+    names = list()
+    for image_path in image_paths:
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        name = stem
+        copy_number = 1
+        while name in names:
+            copy_number += 1
+            name = '{}_{}'.format(stem, copy_number)
+        names.append(name)
+    return [os.path.join(output_directory, name) for name in names]
+
+
+def write_result(result, base_name, output_format):
+    """
+    Writes the result of one image to ``base_name`` with the extension of the format.
+
+    JSON files contain the whole result, CSV files contain one row per circle.
+    """
+    if output_format == 'json':
+        with open(base_name + '.json', 'w') as result_file:
+            json.dump(result, result_file, indent=2)
+    else:
+        with open(base_name + '.csv', 'w', newline='') as result_file:
+            writer = csv.DictWriter(result_file, fieldnames=circle_columns)
+            writer.writeheader()
+            writer.writerows(result['circles'])
+
+
+def write_summary(results, output_directory, output_format):
+    """Writes the summary of every image into one ``summary`` file."""
+    summaries = [{column: result[column] for column in summary_columns} for result in results]
+    if output_format == 'json':
+        with open(os.path.join(output_directory, 'summary.json'), 'w') as summary_file:
+            json.dump(summaries, summary_file, indent=2)
+    else:
+        with open(os.path.join(output_directory, 'summary.csv'), 'w', newline='') as summary_file:
+            writer = csv.DictWriter(summary_file, fieldnames=summary_columns)
+            writer.writeheader()
+            writer.writerows(summaries)
+
+
+def build_parser():
+    """Builds the parser of the command line arguments."""
+    parser = argparse.ArgumentParser(prog='python -m project_code',
+                                     description='Counts and measures the circles in images.')
+    parser.add_argument('inputs', nargs='+', help='image files, directories or glob patterns')
+    parser.add_argument('--size', type=int, default=0, choices=range(6),
+                        help='approximate size of the circles, 0 (unknown) to 5 (big)')
+    parser.add_argument('--noise', type=int, default=0, choices=range(6),
+                        help='amount of clutter in the images, 0 (unknown) to 5 (a lot)')
+    scale = parser.add_mutually_exclusive_group()
+    scale.add_argument('--width', type=float, help='real width of every image, for example in µm')
+    scale.add_argument('--zoom', type=float, help='real length of one pixel of the searched image')
+    parser.add_argument('--kernel-size', type=int, default=5, help='size of the blur kernel (default 5)')
+    parser.add_argument('--engine', default='auto', choices=hough.voting_engines,
+                        help='how the edge pixels vote in the hough transform (default auto)')
+    parser.add_argument('--angular-tolerance', type=float, default=hough.default_angular_tolerance, metavar='RADIANS',
+                        help='deviation from the gradient at which the gradient engine votes (default %(default)s)')
+    parser.add_argument('--pyramid', action='store_true', help='search coarse-to-fine, faster for large circles')
+    parser.add_argument('--full-resolution', action='store_true',
+                        help='search the images without resizing them, tile by tile')
+    parser.add_argument('--output', default='results', help='directory to write the results to (default results)')
+    parser.add_argument('--format', default='json', choices=('json', 'csv'), help='format of the results')
+    parser.add_argument('--annotate', action='store_true', help='also save the images with the found circles')
+    parser.add_argument('--recursive', action='store_true', help='also search the subdirectories of directories')
+    parser.add_argument('--cache', metavar='DIRECTORY',
+                        help='directory to cache the edges of the images in, to reuse them in later runs')
+    parser.add_argument('--cache-size', type=float, default=caching.default_cache_size / 2 ** 20, metavar='MB',
+                        help='maximum size of the cache in megabytes (default %(default)d)')
+    parser.add_argument('--memory-threshold', type=float, metavar='MB',
+                        help='store arrays larger than this in memory-mapped files instead of RAM')
+    parser.add_argument('--scratch', metavar='DIRECTORY',
+                        help='directory for the memory-mapped files (default the temporary directory)')
+    parser.add_argument('--events', metavar='FILE',
+                        help='append the timings and counts of every stage to a JSON lines file')
+    parser.add_argument('--workers', type=int, default=1, help='amount of images analysed at the same time')
+    return parser
+
+
+def main(arguments=None):
+    """
+    Runs the command line interface, which counts and measures the circles in a batch of images.
+
+    Runs the whole pipeline (blur, canny edge detection and the hough circle transform) on every image, without a
+    screen:
+
+        python -m project_code images/*.png --size 3 --noise 2 --width 250 --output results --annotate
+
+    Writes a JSON or CSV file with the circles of every image, and a summary over all images.
+
+    Parameters
+    ----------
+    arguments: list [str]
+        The command line arguments. Read from ``sys.argv`` when not given.
+
+    Returns
+    -------
+    int
+        The exit status: 0 when every image was analysed, 1 when an image failed, 2 when no image was found.
+    """
+    parser = build_parser()
+    options = parser.parse_args(arguments)
+
+    image_paths = expand_image_paths(options.inputs, options.recursive)
+    if not image_paths:
+        print('No images found.', file=sys.stderr)
+        return 2
+
+    os.makedirs(options.output, exist_ok=True)
+    base_names = output_names(image_paths, options.output)
+    memory_threshold = None if options.memory_threshold is None else int(options.memory_threshold * 2 ** 20)
+    settings = {'size': options.size, 'noise': options.noise, 'width': options.width, 'zoom': options.zoom,
+                'kernel_size': options.kernel_size, 'engine': options.engine,
+                'angular_tolerance': options.angular_tolerance, 'pyramid': options.pyramid,
+                'full_resolution': options.full_resolution, 'cache_directory': options.cache,
+                'cache_size': int(options.cache_size * 2 ** 20), 'memory_threshold': memory_threshold,
+                'scratch_directory': options.scratch, 'collect_events': options.events is not None}
+
+    exit_status = 0
+    results = list()
+    with contextlib.ExitStack() as recording, futures.ProcessPoolExecutor(max_workers=options.workers) as pool:
+        # The workers send their events back, so only this process writes to the events file.
+        event_sink = None
+        if options.events is not None:
+            event_sink = instrumentation.JsonLinesSink(options.events)
+            recording.callback(event_sink.close)
+
+        analysed_images = [pool.submit(analyse_file, image_path,
+                                       annotation_name=base_name + '_circles.png' if options.annotate else None,
+                                       **settings)
+                           for image_path, base_name in zip(image_paths, base_names)]
+        for image_path, base_name, analysed_image in zip(image_paths, base_names, analysed_images):
+            try:
+                result = analysed_image.result()
+            except Exception as error:
+                print('Could not analyse {}: {}'.format(image_path, error), file=sys.stderr)
+                exit_status = 1
+                continue
+            for event in result.pop('events', ()):
+                event_sink.write(event)
+            write_result(result, base_name, options.format)
+            results.append(result)
+            print('{}: {} circles, mean diameter {:.2f}'.format(image_path, result['circle_count'],
+                                                               result['mean_diameter']))
+
+    write_summary(results, options.output, options.format)
+    return exit_status
@@ -0,0 +1,352 @@
+from project_code import \
+    cli, \
+    synthetic_images as synthetic
+from project_code.image_manipulation import \
+    hough_circle_transform as hough, \
+    instrumentation
+from project_code.image_manipulation.classes.wrapper import image_transform as analyse
+
+import argparse
+import collections
+import json
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+# Settings of a configuration and their defaults, see ``run_configuration``.
+default_configuration = {'size': 0, 'kernel_size': 5, 'noise': 2, 'engine': 'auto',
+                         'angular_tolerance': hough.default_angular_tolerance, 'workers': 1, 'pyramid': False,
+                         'tile_size': None}
+# Stages whose time is reported, the events of ``instrumentation``.
+reported_stages = ('gauss_blur', 'sobel', 'canny', 'hough')
+# Stages that search for circles, counted as 'hough' when the search does not report its hough stages itself.
+hough_stages = ('hough', 'hough_pyramid')
+# Stage of the tiled search, reported in its own column: its time includes the edge detection of every tile.
+tiled_stage = 'tiled_search'
+
+
+def match_circles(found_circles, true_circles, center_tolerance=3.0, radius_tolerance=2.0):
+    """
+    Matches found circles to true circles, one to one.
+
+    A found circle can match a true circle when their centers are at most ``center_tolerance`` pixels apart and their
+    radii differ at most ``radius_tolerance`` pixels. The closest pairs are matched first.
+
+    Parameters
+    ----------
+    found_circles: list [(int, int, int)]
+        (x, y, radius) of every found circle.
+    true_circles: list [(int, int, int)]
+        (x, y, radius) of every true circle.
+    center_tolerance: float
+        Maximum distance between the centers of matching circles.
+    radius_tolerance: float
+        Maximum difference between the radii of matching circles.
+
+    Returns
+    -------
+    list: [(int, int)]
+        The index of the found circle and the index of the true circle of every match.
+    """
+    if not len(found_circles) or not len(true_circles):
+        return list()
+    found_x, found_y, found_radii = np.asarray(found_circles, dtype=float).T
+    true_x, true_y, true_radii = np.asarray(true_circles, dtype=float).T
+    center_distances = np.hypot(found_x[:, np.newaxis] - true_x, found_y[:, np.newaxis] - true_y)
+    radius_differences = np.abs(found_radii[:, np.newaxis] - true_radii)
+
+    found_indexes, true_indexes = np.nonzero((center_distances <= center_tolerance) &
+                                             (radius_differences <= radius_tolerance))
+    order = np.lexsort((radius_differences[found_indexes, true_indexes],
+                        center_distances[found_indexes, true_indexes]))
+
+    matches = list()
+    matched_found = set()
+    matched_true = set()
+    for found_index, true_index in zip(found_indexes[order].tolist(), true_indexes[order].tolist()):
+        if found_index not in matched_found and true_index not in matched_true:
+            matches.append((found_index, true_index))
+            matched_found.add(found_index)
+            matched_true.add(true_index)
+    return matches
+
+
+def score_matches(found_circles, true_circles, matches):
+    """
+    Scores the matches of found circles to true circles.
+
+    Parameters
+    ----------
+    found_circles: list [(int, int, int)]
+        (x, y, radius) of every found circle.
+    true_circles: list [(int, int, int)]
+        (x, y, radius) of every true circle.
+    matches: list [(int, int)]
+        The matches, see ``match_circles``.
+
+    Returns
+    -------
+    dict
+        'true_positives', 'false_positives', 'false_negatives', 'precision', 'recall', 'f1', the mean absolute
+        'radius_error', the mean signed 'radius_bias' (found minus true) and the mean 'center_error' of the matches.
+        Precision and recall are 1 when there is nothing to find or nothing was found, the errors are None without
+        matches.
+    """
+    true_positives = len(matches)
+    false_positives = len(found_circles) - true_positives
+    false_negatives = len(true_circles) - true_positives
+    precision = true_positives / len(found_circles) if len(found_circles) else 1.0
+    recall = true_positives / len(true_circles) if len(true_circles) else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+    scores = {'true_positives': true_positives, 'false_positives': false_positives,
+              'false_negatives': false_negatives, 'precision': precision, 'recall': recall, 'f1': f1,
+              'radius_error': None, 'radius_bias': None, 'center_error': None}
+    if matches:
+        found = np.asarray([found_circles[found_index] for found_index, _ in matches], dtype=float)
+        true = np.asarray([true_circles[true_index] for _, true_index in matches], dtype=float)
+        scores['radius_error'] = float(np.abs(found[:, 2] - true[:, 2]).mean())
+        scores['radius_bias'] = float((found[:, 2] - true[:, 2]).mean())
+        scores['center_error'] = float(np.hypot(found[:, 0] - true[:, 0], found[:, 1] - true[:, 1]).mean())
+    return scores
+
+
+def run_configuration(image, configuration):
+    """
+    Finds the circles in an image with a configuration of the pipeline, and times its stages.
+
+    The image is searched at its own resolution, so the circles are in the coordinates of the ground truth.
+
+    Parameters
+    ----------
+    image: pillow.Image
+        The image.
+    configuration: dict
+        The settings of ``default_configuration`` to change. With a 'tile_size' the image is searched tile by tile,
+        see ``TransformImage.find_circles_tiled``.
+
+    Returns
+    -------
+    tuple: (list [(int, int, int)], dict {str: float})
+        (x, y, radius) of every found circle, and the wall time of every stage that ran and the 'total' in seconds.
+        A tiled search also reports its whole time, edge detection included, under ``tiled_stage``.
+    """
+    settings = dict(default_configuration)
+    settings.update(configuration)
+    settings.pop('name', None)
+    working_image = analyse.TransformImage(image)
+
+    stage_times = collections.defaultdict(float)
+    start = time.perf_counter()
+    with working_image.record_events(instrumentation.MemorySink()) as (events,):
+        if settings['tile_size'] is not None:
+            found_circles = working_image.find_circles_tiled(settings['size'], settings['tile_size'],
+                                                             settings['kernel_size'], settings['noise'],
+                                                             settings['engine'], settings['angular_tolerance'],
+                                                             settings['workers'])
+        else:
+            working_image.apply_canny(settings['kernel_size'], settings['noise'])
+            found_circles = working_image.find_circles(settings['size'], settings['engine'],
+                                                       settings['angular_tolerance'], settings['workers'],
+                                                       settings['pyramid'])
+    stage_times['total'] = time.perf_counter() - start
+
+    for event in events.events:
+        if event['event'] in reported_stages + (tiled_stage,):
+            stage_times[event['event']] += event['wall_time']
+    # The pyramid search only counts when it did not report its hough stages itself. The tiled search with several
+    # workers reports no stages of its tiles, so it only has its own column.
+    if 'hough' not in stage_times and any(event['event'] in hough_stages for event in events.events):
+        stage_times['hough'] = sum(event['wall_time'] for event in events.events if event['event'] in hough_stages)
+
+    circles = [(x, y, radius) for radius, centers in sorted(found_circles.items()) for x, y in centers]
+    return circles, dict(stage_times)
+
+
+def evaluate_configuration(labelled_images, configuration, center_tolerance=3.0, radius_tolerance=2.0):
+    """
+    Evaluates a configuration of the pipeline on a set of labelled images.
+
+    Parameters
+    ----------
+    labelled_images: list [(str, pillow.Image, list [(int, int, int)])]
+        The name, the image and the (x, y, radius) of every true circle of every image.
+    configuration: dict
+        The settings of the pipeline, see ``run_configuration``. Named after its 'name' in the report.
+    center_tolerance: float
+        Maximum distance between the centers of matching circles.
+    radius_tolerance: float
+        Maximum difference between the radii of matching circles.
+
+    Returns
+    -------
+    dict
+        The 'configuration', the scores over all images (see ``score_matches``, the errors are averaged over all
+        matches), the total 'stage_times' over all images, the mean 'seconds_per_image' and the result of every image
+        under 'images'.
+    """
+    image_results = list()
+    stage_times = collections.defaultdict(float)
+    all_found = list()
+    all_true = list()
+    all_matches = list()
+    for image_name, image, true_circles in labelled_images:
+        found_circles, image_stage_times = run_configuration(image, configuration)
+        matches = match_circles(found_circles, true_circles, center_tolerance, radius_tolerance)
+        image_result = {'image': image_name, 'stage_times': image_stage_times}
+        image_result.update(score_matches(found_circles, true_circles, matches))
+        image_results.append(image_result)
+
+        for stage_name, stage_time in image_stage_times.items():
+            stage_times[stage_name] += stage_time
+        all_matches.extend((found_index + len(all_found), true_index + len(all_true))
+                           for found_index, true_index in matches)
+        all_found.extend(found_circles)
+        all_true.extend(true_circles)
+
+    report = {'configuration': configuration}
+    report.update(score_matches(all_found, all_true, all_matches))
+    report['stage_times'] = dict(stage_times)
+    report['seconds_per_image'] = stage_times['total'] / max(len(labelled_images), 1)
+    report['images'] = image_results
+    return report
+
+
+def cheapest_configuration(reports, min_precision=0.0, min_recall=0.0):
+    """
+    Selects the fastest configuration that meets the accuracy bar.
+
+    Parameters
+    ----------
+    reports: list [dict]
+        The reports of the configurations, see ``evaluate_configuration``.
+    min_precision: float
+        Minimum precision.
+    min_recall: float
+        Minimum recall.
+
+    Returns
+    -------
+    dict
+        The report of the fastest configuration that meets the bar, None when no configuration does.
+    """
+    passing_reports = [report for report in reports
+                       if report['precision'] >= min_precision and report['recall'] >= min_recall]
+    if not passing_reports:
+        return None
+    return min(passing_reports, key=lambda report: report['seconds_per_image'])
+
+
+def load_labelled_images(image_paths):
+    """Opens images and loads the ground truth saved next to them, see ``synthetic.load_ground_truth``."""
+    return [(image_path, Image.open(image_path), synthetic.load_ground_truth(image_path))
+            for image_path in image_paths]
+
+
+def configuration_name(configuration):
+    """The 'name' of a configuration, or its settings when it has no name."""
+    if 'name' in configuration:
+        return configuration['name']
+    return ' '.join('{}={}'.format(key, value) for key, value in sorted(configuration.items())) or 'default'
+
+
+def format_table(reports):
+    """
+    Formats the scores and stage times of every configuration as a table of text, one row per configuration.
+
+    Stages that did not run in a configuration are shown as '-'.
+    """
+    stage_names = reported_stages + (tiled_stage, 'total')
+    header = '{:<30} {:>9} {:>6} {:>8} {:>8} {:>8}'.format('configuration', 'precision', 'recall', 'r error',
+                                                             'r bias', 'center')
+    header += ''.join(' {:>12}'.format(stage_name) for stage_name in stage_names)
+    rows = [header]
+    for report in reports:
+        row = '{:<30} {:>9.3f} {:>6.3f}'.format(configuration_name(report['configuration'])[:30],
+                                                report['precision'], report['recall'])
+        for error_name in ('radius_error', 'radius_bias', 'center_error'):
+            error = report[error_name]
+            row += ' {:>8}'.format('-' if error is None else '{:.2f}'.format(error))
+        for stage_name in stage_names:
+            stage_time = report['stage_times'].get(stage_name)
+            row += ' {:>12}'.format('-' if stage_time is None else '{:.4f}'.format(stage_time / len(report['images'])))
+        rows.append(row)
+    return '\n'.join(rows)
+
+
+def build_parser():
+    """Builds the parser of the command line arguments."""
+    parser = argparse.ArgumentParser(prog='python -m project_code.evaluation',
+                                     description='Measures the accuracy and speed of pipeline configurations.')
+    parser.add_argument('inputs', nargs='+', help='labelled image files, directories or glob patterns')
+    parser.add_argument('--config', action='append', type=json.loads, default=list(),
+                        help='JSON object with the settings of a configuration, can be repeated')
+    parser.add_argument('--configs', help='JSON file with a list of configurations')
+    parser.add_argument('--center-tolerance', type=float, default=3.0,
+                        help='maximum distance between matching centers in pixels (default 3)')
+    parser.add_argument('--radius-tolerance', type=float, default=2.0,
+                        help='maximum difference between matching radii in pixels (default 2)')
+    parser.add_argument('--min-precision', type=float, default=0.0, help='minimum precision of the cheapest pick')
+    parser.add_argument('--min-recall', type=float, default=0.0, help='minimum recall of the cheapest pick')
+    parser.add_argument('--output', help='JSON file to write the full report to')
+    return parser
+
+
+def main(arguments=None):
+    """
+    Evaluates configurations on labelled images.
+
+    Runs every configuration over a set of images with a known ground truth, such as the sets of ``synthetic_images``,
+    and matches the found circles to the true circles. Reports the precision, recall, radius error and the time of
+    every stage side by side, and lists the cheapest configuration that meets the minimum precision and recall:
+
+        python -m project_code.synthetic_images labelled --count 20 --radii 15 30
+        python -m project_code.evaluation labelled --config '{"size": 2}' --config '{"size": 2, "pyramid": true}' \\
+            --min-recall 0.9 --min-precision 0.9
+
+    Parameters
+    ----------
+    arguments: list [str]
+        The command line arguments. Read from ``sys.argv`` when not given.
+
+    Returns
+    -------
+    int
+        The exit status: 0 when a configuration meets the bar, 1 when none does, 2 when no image was found.
+    """
+    options = build_parser().parse_args(arguments)
+    image_paths = cli.expand_image_paths(options.inputs)
+    if not image_paths:
+        print('No images found.', file=sys.stderr)
+        return 2
+    configurations = list(options.config)
+    if options.configs is not None:
+        with open(options.configs) as configuration_file:
+            configurations.extend(json.load(configuration_file))
+    if not configurations:
+        configurations.append(dict())
+
+    labelled_images = load_labelled_images(image_paths)
+    reports = [evaluate_configuration(labelled_images, configuration, options.center_tolerance,
+                                      options.radius_tolerance)
+               for configuration in configurations]
+    print(format_table(reports))
+
+    if options.output is not None:
+        with open(options.output, 'w') as output_file:
+            json.dump(reports, output_file, indent=2)
+
+    cheapest_report = cheapest_configuration(reports, options.min_precision, options.min_recall)
+    if cheapest_report is None:
+        print('No configuration meets a precision of {} and a recall of {}.'.format(options.min_precision,
+                                                                                  options.min_recall))
+        return 1
+    print('Cheapest configuration that meets the bar: {} ({:.4f} s per image).'.format(
+        configuration_name(cheapest_report['configuration']), cheapest_report['seconds_per_image']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
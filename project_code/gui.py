@@ -1,33 +1,22 @@
 import analyse_image as open_image
+from project_code import \
+    analysis_worker as worker, \
+    cli
 from project_code.image_manipulation.classes.wrapper import image_transform as analyse_image
 import tkinter as tk
 from tkinter import filedialog as file_dialog
+from tkinter import ttk
 from PIL import Image, ImageTk
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import threading as thread
-
-
-# GuySoft
-# https://stackoverflow.com/questions/6893968/how-to-get-the-return-value-from-a-thread-in-python/65447493#65447493
-class Thread_R(thread.Thread):
-    def __init__(self, group=None, target=None, name=None, args=(), kwargs=None, *, daemon=None):
-        thread.Thread.__init__(self, group, target, name, args, kwargs, daemon=daemon)
-
-        self._return = None
-
-    def run(self):
-        if self._target is not None:
-            self._return = self._target(*self._args, **self._kwargs)
-
-    def join(self):
-        thread.Thread.join(self)
-        return self._return
 
+# Milliseconds between two checks for messages of the analysis worker.
+poll_interval = 100
+# Amount of images of the queue that are opened and take the edge detection in the background.
+prepare_count = 2
 
+# Paths to the images that are analysed next, in order.
 image_queue = list()
 
-image_queue_thread = thread.Thread()
-
 
 class ApplicationImageAnalysis(tk.Frame):
     """
@@ -45,6 +34,12 @@ class ApplicationImageAnalysis(tk.Frame):
         self.queue_locations = []
         self.settings = dict()
         self.current_image = None
+        # The analysis running in the background, None when no analysis runs.
+        self.analysis = None
+        # Path to the analysed image when it comes from the queue.
+        self.current_location = None
+        # Workers that prepare the next images of the queue, by path.
+        self.prepared_images = dict()
 
         self.build_start_menu()
 
@@ -58,23 +53,181 @@ class ApplicationImageAnalysis(tk.Frame):
         """
         Manipulates an images to find circles with Hough Circle Transform.
 
-        Does the following steps separately:
+        The analysis runs in a separate worker process, see ``worker.AnalysisWorker``, so the window stays responsive.
+        It does the following steps separately:
         - convert to greyscale
         - apply gaussian blur
         - apply sobel edge detection
         - canny non-maximum suppressor.
         - canny hysteresis_thresholding.
-        - hough transform for small radii (2 - 10)
-        lastly prints all found circle centers in the hough transform
+        - hough transform for the radii of the size setting, one radius at a time.
+        Meanwhile a progress bar is shown with a button to cancel the analysis.
+
+        Returns
+        -------
+        None
+            The analysis has started, its results are shown when it is done.
+        """
+        self.analysis = worker.AnalysisWorker(self.current_image.working_image, self.analysis_settings())
+        self.analysis.start()
+        self.build_progress_menu()
+        self.after(poll_interval, self.poll_analysis, self.analysis)
+
+    def analysis_settings(self):
+        """The settings of the analysis worker, see ``worker.analyse_in_process``."""
+        return {'size': self.settings['size'], 'noise': self.settings['noise']}
+
+    def load_next_image(self):
+        """
+        Analyses the next image of the queue, or asks for new images when the queue is empty.
+
+        The image usually has been opened and taken through the edge detection in the background already, see
+        ``prepare_next_images``, so only the circle search is left. Otherwise it is prepared now.
+
+        Returns
+        -------
+        None
+            The analysis of the next image has started, its results are shown when it is done.
+        """
+        if not image_queue:
+            self.load_new_image()
+            return
+
+        self.current_location = image_queue.pop(0)
+        self.current_image = None
+        self.analysis = self.prepared_images.pop(self.current_location, None)
+        if self.analysis is None:
+            self.analysis = worker.AnalysisWorker(self.current_location, self.analysis_settings(), prepare=True)
+            self.analysis.start()
+        self.analysis.search(self.analysis_settings())
+        self.build_progress_menu()
+        self.after(poll_interval, self.poll_analysis, self.analysis)
+
+    def prepare_next_images(self):
+        """
+        Starts preparing the next images of the queue in the background, with the current settings.
+
+        Up to ``prepare_count`` images are opened and taken through the edge detection. Workers that prepare images
+        that left the queue, or that use other settings, are stopped.
+
+        Returns
+        -------
+        None
+            The workers are stored in ``prepared_images``.
+        """
+        next_locations = image_queue[:prepare_count]
+        for location, prepared_image in list(self.prepared_images.items()):
+            if location not in next_locations or prepared_image.settings != self.analysis_settings():
+                prepared_image.cancel()
+                del self.prepared_images[location]
+
+        for location in next_locations:
+            if location not in self.prepared_images:
+                prepared_image = worker.AnalysisWorker(location, self.analysis_settings(), prepare=True)
+                prepared_image.start()
+                self.prepared_images[location] = prepared_image
+
+    def queue_images(self, locations):
+        """
+        Opens the first image of a selection and queues the others.
+
+        Parameters
+        ----------
+        locations: list [str]
+            Paths to the selected images.
 
         Returns
         -------
         None
-            The image has been searched for circles and the found circles have been drawn over the image.
+            The first image is opened and its settings are asked for. The others are in ``image_queue``.
+        """
+        image_queue[:] = locations[1:]
+        for prepared_image in self.prepared_images.values():
+            prepared_image.cancel()
+        self.prepared_images.clear()
+
+        self.current_location = locations[0]
+        self.current_image = analyse_image.TransformImage(open_image.open_standard_width(locations[0]))
+        self.image_information_enquiry()
+
+    def poll_analysis(self, analysis):
         """
-        self.current_image.apply_canny(noise=self.settings['noise'])
-        found_circles = self.current_image.apply_hough_circle_transform(self.settings['size'])
-        self.build_show_results(found_circles)
+        Handles the messages of the analysis worker, and checks again later while it runs.
+
+        Parameters
+        ----------
+        analysis: worker.AnalysisWorker
+            The polled worker. Polling stops when it is no longer the running analysis, as after cancelling.
+
+        Returns
+        -------
+        None
+            The progress bar shows the progress, or the results or the error are shown when the analysis finished.
+        """
+        if analysis is not self.analysis:
+            return
+        for message in analysis.poll():
+            if message[0] == 'image':
+                self.current_image = analyse_image.TransformImage(message[1])
+            elif message[0] == 'progress':
+                _, done_steps, total_steps, next_step = message
+                self.progress_bar.configure(maximum=total_steps, value=done_steps)
+                self.progress_label.configure(text=next_step)
+            elif message[0] == 'done':
+                self.analysis = None
+                self.build_show_results(message[1])
+                return
+            elif message[0] == 'error':
+                self.analysis = None
+                self.build_analysis_error(message[1])
+                return
+        self.after(poll_interval, self.poll_analysis, analysis)
+
+    def cancel_analysis(self):
+        """Stops the running analysis and returns to the run menu."""
+        if self.analysis is not None:
+            self.analysis.cancel()
+            self.analysis = None
+        if self.current_image is None:
+            # The worker was stopped before it sent the image of the queue.
+            self.current_image = analyse_image.TransformImage(open_image.open_standard_width(self.current_location))
+        self.build_run_menu()
+
+    def build_progress_menu(self):
+        """
+        Shows the progress of the running analysis, with a button to cancel it.
+
+        Returns
+        -------
+        None
+            The progress bar and cancel button are shown in the frame.
+        """
+        self.clear_frame()
+
+        self.progress_label = tk.Label(self, text='Starting analysis')
+        self.progress_bar = ttk.Progressbar(self, orient='horizontal', length=300, mode='determinate')
+        cancel_button = tk.Button(self, text='Cancel', command=self.cancel_analysis)
+
+        self.progress_label.pack()
+        self.progress_bar.pack()
+        cancel_button.pack()
+
+    def build_analysis_error(self, error):
+        """
+        Shows that the analysis failed.
+
+        Parameters
+        ----------
+        error: str
+            The description of the error.
+        """
+        self.clear_frame()
+
+        error_label = tk.Label(self, text='The analysis failed:\n{}'.format(error.strip().splitlines()[-1]))
+        run_menu_button = tk.Button(self, text='Back', command=self.build_run_menu)
+
+        error_label.pack()
+        run_menu_button.pack()
 
     def save_image_settings(self, width, size, noise):
         """Saves the settings to the frame object. Runs the run menu.
@@ -113,8 +266,12 @@ class ApplicationImageAnalysis(tk.Frame):
         load_file_button = tk.Button(master=self,
                                      text="Load Image",
                                      command=self.load_new_image)
+        load_folder_button = tk.Button(master=self,
+                                       text="Load Folder",
+                                       command=self.load_image_folder)
         information_label.pack()
         load_file_button.pack()
+        load_folder_button.pack()
 
         if self.current_image is not None:
             use_old_file = tk.Button(master=self,
@@ -126,19 +283,32 @@ class ApplicationImageAnalysis(tk.Frame):
         """
         File dialog with the user.
 
-        If an image is correctly read in, opens the image analysis menu.
+        Several images can be selected. If an image is correctly read in, opens the image analysis menu. The other
+        images are queued, see ``queue_images``.
         """
         # Source: https://pythonspot.com/tk-file-dialogs/
-        image_location = file_dialog.askopenfilename(initialdir="/",
-                                                     title="Select file",
-                                                     filetypes=(("jpeg files", "*.jpg"),
-                                                                ("png files", "*.png"),
-                                                                ("tiff files", "*.tiffany"),
-                                                                ("all files", "*.*")))
+        image_locations = file_dialog.askopenfilenames(initialdir="/",
+                                                       title="Select files",
+                                                       filetypes=(("jpeg files", "*.jpg"),
+                                                                  ("png files", "*.png"),
+                                                                  ("tiff files", "*.tiffany"),
+                                                                  ("all files", "*.*")))
+
+        if image_locations:
+            self.queue_images(list(image_locations))
+
+    def load_image_folder(self):
+        """
+        Folder dialog with the user.
+
+        Queues all images of the folder in name order, and opens the image analysis menu for the first one.
+        """
+        folder_location = file_dialog.askdirectory(initialdir="/", title="Select folder")
 
-        if image_location != "":
-            self.current_image = analyse_image.TransformImage(open_image.open_standard_width(image_location))
-            self.image_information_enquiry()
+        if folder_location:
+            image_locations = cli.expand_image_paths([folder_location])
+            if image_locations:
+                self.queue_images(image_locations)
 
     def image_information_enquiry(self):
         """"""
@@ -266,7 +436,8 @@ class ApplicationImageAnalysis(tk.Frame):
         mean_radius_label = tk.Label(self, text="Average radius: {:.2f}".format(mean_radius))
         self.current_image.draw_circles(results, (255, 0, 0))
 
-        load_image = tk.Button(self, text="Load Next Image", command=self.load_new_image)
+        queue_label = tk.Label(self, text="Images left in the queue: {}".format(len(image_queue)))
+        load_image = tk.Button(self, text="Load Next Image", command=self.load_next_image)
 
         result_image = self.render_image()
         self.clear_frame()
@@ -275,8 +446,12 @@ class ApplicationImageAnalysis(tk.Frame):
         mean_diameter_label.pack()
         mean_radius_label.pack()
         result_image.pack()
+        queue_label.pack()
         load_image.pack()
 
+        # The next images are prepared while the user reviews the results.
+        self.prepare_next_images()
+
     def render_image(self, background='white'):
         """"""
         width = self.current_image.working_image.width
@@ -1,59 +1,95 @@
-from project_code.my_maths import \
-    select_from_matrix as select, \
-    calculus as calculus
+from project_code.image_manipulation import instrumentation
 
 import numpy as np
 
+# (row, column) step along the edge intersection for every direction bin of ``quantize_orientation``.
+# The steps point from the top (or left) of the intersection to the bottom (or right).
+intersection_steps = ((0, 1),
+                      (1, -1),
+                      (1, 0),
+                      (1, 1))
 
+
+def quantize_orientation(orientation):
+    """
+    Quantizes gradient orientations into four direction bins.
+
+    The orientation is measured with the y-axis pointing up, see ``sobel_gradients``. The bins are:
+    - 0: horizontal gradient (within 22.5° of the x-axis).
+    - 1: gradient to the upper right or lower left.
+    - 2: vertical gradient (within 22.5° of the y-axis).
+    - 3: gradient to the upper left or lower right.
+    Pixels without an orientation are placed in bin 0.
+
+    Parameters
+    ----------
+    orientation: numpy.ndarray
+        Plane with gradient orientations in radians, within [-pi/2, pi/2].
+
+    Returns
+    -------
+    numpy.ndarray
+        int8 plane with the direction bin of every pixel.
+    """
+    bins = np.zeros(orientation.shape, dtype=np.int8)
+    bins[(orientation >= np.pi / 8) & (orientation < 3 * np.pi / 8)] = 1
+    bins[np.abs(orientation) >= 3 * np.pi / 8] = 2
+    bins[(orientation > -3 * np.pi / 8) & (orientation <= -np.pi / 8)] = 3
+    return bins
+
+
+@instrumentation.stage('non_maximum_suppression')
 def non_maximum_suppressor(image_pixel_table, kernel_size=5):
     """
     Turns off all pixels that have not been marked as local maximum.
 
     Checks for the pixel that is turned on if they are a local maximum. This local maximum is checked on the
-    intersection of the edge, in order to thin it.
+    intersection of the edge, in order to thin it: the ``kernel_size // 2`` pixels on both sides of the pixel along
+    its gradient direction.
+
+    Every pixel is compared with its neighbours in shifted copies of the original values and the result is collected in
+    a separate mask, so the outcome does not depend on the order in which pixels are visited. When a pixel is as strong
+    as a neighbour, the pixel that is first from the top (or the left) is kept.
 
     Parameters
     ----------
     image_pixel_table: PixelTable
-        Pixel table containing Grey Pixels.
+        Pixel table containing the output of the sobel edge detector.
     kernel_size: int
         Diameter of the to evaluate edge intersection.
 
     Returns
     -------
     None
-        All pixels in the intersection that aren't the local maximum have been turned off.
+        All pixels that aren't the local maximum of their edge intersection have been turned off.
     """
-    print("Non maximum suppression.")
-
-    image_values = image_pixel_table.pixels
+    image_values = image_pixel_table.values
     height, width = image_values.shape
     kernel_radius = kernel_size // 2
-    for row_index in range(kernel_radius, height - kernel_radius):
-        for column_index in range(kernel_radius, width - kernel_radius):
-            current_pixel = image_values[row_index][column_index]
-            if current_pixel.is_off():
-                continue
-
-            local_neighborhood = select.get_sub_matrix(image_values,
-                                                       row_index - kernel_radius,
-                                                       column_index - kernel_radius,
-                                                       size=kernel_size)
-
-            intersection_edge = select.vector_as_per_angle(local_neighborhood,
-                                                           current_pixel.orientation,
-                                                           kernel_radius)
-
-            # Calculates the local maximum of the intersection of the edge.
-            local_maximum_index, maximum = calculus.local_maximum_1d(intersection_edge)
-            # Turns off all pixels that aren't the local maximum in the edge.
-            for edge_index, edge_pixel in enumerate(intersection_edge):
-                if edge_index == local_maximum_index:
-                    continue
-                edge_pixel.turn_off()
-
-
-def hysteresis_thresholding(image_pixel_table, kernel_radius=5, noise=2):
+    direction_bins = quantize_orientation(image_pixel_table.orientation)
+    # Pixels outside the image never suppress a pixel.
+    padded_values = np.pad(image_values, kernel_radius, mode='constant', constant_values=-np.inf)
+
+    local_maxima = np.zeros((height, width), dtype=bool)
+    for direction_bin, (row_step, column_step) in enumerate(intersection_steps):
+        is_maximum = direction_bins == direction_bin
+        for distance in range(1, kernel_radius + 1):
+            row_shift = distance * row_step
+            column_shift = distance * column_step
+            following = padded_values[kernel_radius + row_shift:kernel_radius + row_shift + height,
+                                      kernel_radius + column_shift:kernel_radius + column_shift + width]
+            preceding = padded_values[kernel_radius - row_shift:kernel_radius - row_shift + height,
+                                      kernel_radius - column_shift:kernel_radius - column_shift + width]
+            is_maximum &= (image_values >= following) & (image_values > preceding)
+        local_maxima |= is_maximum
+
+    image_pixel_table.turn_off(image_pixel_table.on & ~local_maxima)
+    if instrumentation.enabled():
+        instrumentation.annotate(kernel_size=kernel_size, edge_pixels=int(np.count_nonzero(image_pixel_table.on)))
+
+
+@instrumentation.stage('hysteresis')
+def hysteresis_thresholding(image_pixel_table, kernel_radius=5, noise=2, connectivity=8, gap=0):
     """
     Turns off weak edges based on hysteresis thresholding.
 
@@ -62,6 +98,7 @@ def hysteresis_thresholding(image_pixel_table, kernel_radius=5, noise=2):
 
     Turns off pixels below a certain threshold a, and keeps pixels on above threshold b.
     Pixels between the two thresholds are only kept on if they are connected (directly or indirectly) with a pixel that
+    passes threshold b. The remaining pixels are labelled as connected edges, and an edge is kept when any of its pixels
     passes threshold b.
 
     Parameters
@@ -71,7 +108,11 @@ def hysteresis_thresholding(image_pixel_table, kernel_radius=5, noise=2):
     noise: int
         The approximate amount of noise in the image.
     kernel_radius: int
-        The maximum distance between adjacent pixels with creating edges.
+        Width of the border in which pixels are not turned off by threshold a.
+    connectivity: int
+        8 to connect diagonal neighbours, 4 to only connect horizontal and vertical neighbours.
+    gap: int
+        Amount of pixels that are off that is tolerated between pixels of the same edge.
 
     Returns
     -------
@@ -80,41 +121,53 @@ def hysteresis_thresholding(image_pixel_table, kernel_radius=5, noise=2):
     """
     if noise == 0:
         noise = 2
-    print('Hysteresis')
-    image_values = image_pixel_table.pixels
-    height, width = image_values.shape
-    brightness_scale = sorted(image_pixel_table.get_luminosity_active_pixels())
+    height, width = image_pixel_table.shape
+    brightness_scale = image_pixel_table.get_luminosity_active_pixels()
+    if brightness_scale.size == 0:
+        return
 
     high_threshold = np.percentile(brightness_scale, 55 + noise*10)
     low_threshold = high_threshold * (0.15 + noise * 0.2)
+    instrumentation.annotate(noise=noise, high_threshold=float(high_threshold), low_threshold=float(low_threshold))
 
-    for row_index in range(kernel_radius, height - kernel_radius):
-        for column_index in range(kernel_radius, width - kernel_radius):
+    weak_pixels = np.zeros((height, width), dtype=bool)
+    weak_pixels[kernel_radius:height - kernel_radius, kernel_radius:width - kernel_radius] = True
+    weak_pixels &= image_pixel_table.values < low_threshold
+    image_pixel_table.turn_off(weak_pixels)
 
-            if image_values[row_index][column_index] < low_threshold:
-                image_values[row_index][column_index].turn_off()
+    edge_labels, edge_count = image_pixel_table.find_continuous_edges(connectivity, gap)
+    strong_edges = np.zeros(edge_count + 1, dtype=bool)
+    strong_edges[edge_labels[image_pixel_table.on & (image_pixel_table.values > high_threshold)]] = True
+    # Label 0 marks the pixels that are off.
+    strong_edges[0] = False
 
-    continuous_edges = image_pixel_table.find_continuous_edges()
-    for edge in continuous_edges:
-        edge.validate(high_threshold)
+    image_pixel_table.turn_off(image_pixel_table.on & ~strong_edges[edge_labels])
+    if instrumentation.enabled():
+        instrumentation.annotate(edge_count=int(np.count_nonzero(strong_edges)),
+                                 edge_pixels=int(np.count_nonzero(image_pixel_table.on)))
 
 
-def canny_detector(image_pixel_table, kernel_size=5, noise=2):
+@instrumentation.stage('canny')
+def canny_detector(image_pixel_table, kernel_size=5, noise=2, connectivity=8, gap=0):
     """
     Apply the canny edge detector.
 
-    Transforms a pixel table containing Grey Pixels by turning off all pixels that are not a local maximum and applying
+    Transforms a pixel table by turning off all pixels that are not a local maximum and applying
     hysteresis thresholding.
 
     Parameters
     ----------
     image_pixel_table: PixelTable
-        The Pixel Table contain Grey Pixels. Assumed to contain output from sobel edge detector.
+        The Pixel Table. Assumed to contain output from sobel edge detector.
     kernel_size: int
-        Diameter of the non-maximum edge intersection; (Double the) length between adjacent pixels with creating edges
-        with hysteresis thresholding.
+        Diameter of the non-maximum edge intersection; (Double the) border width that is skipped by the low threshold
+        of hysteresis thresholding.
     noise: int
         Approximate amount of noise in the image.
+    connectivity: int
+        4 or 8, the connectivity of the edges of hysteresis thresholding.
+    gap: int
+        Amount of pixels that are off that is tolerated inside an edge by hysteresis thresholding.
 
     Returns
     -------
@@ -123,4 +176,7 @@ def canny_detector(image_pixel_table, kernel_size=5, noise=2):
         Pixel Table.
     """
     non_maximum_suppressor(image_pixel_table, kernel_size)
-    hysteresis_thresholding(image_pixel_table, kernel_size // 2, noise=noise)
+    hysteresis_thresholding(image_pixel_table, kernel_size // 2, noise=noise, connectivity=connectivity, gap=gap)
+    if instrumentation.enabled():
+        instrumentation.annotate(kernel_size=kernel_size, noise=noise,
+                                 edge_pixels=int(np.count_nonzero(image_pixel_table.on)))
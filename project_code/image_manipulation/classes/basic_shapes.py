@@ -1,4 +1,9 @@
-from project_code.my_maths import trigonometry as trig
+import functools
+
+import numpy as np
+
+# Amount of circle stencils kept by ``circle_stencil``.
+stencil_cache_size = 256
 
 
 class Circle:
@@ -31,30 +36,26 @@ class Circle:
         self.radius = circle_radius
         self.center = (center_x, center_y)
 
-    def circumference_indexes(self):
+    def circumference_indexes(self, thickness=1):
         """
         Computes which indexes fall on the circumference of the circle.
 
-        Deletes all double indexes.
+        The circumference is the cached stencil of ``circle_stencil`` moved to the center of the circle, so every index
+        occurs once.
+
+        Parameters
+        ----------
+        thickness: int
+            Width of the circumference in pixels.
 
         Returns
+        -------
         list: [(int, int)]
-            Indexes of the circumference.
+            Indexes of the circumference as (x, y).
         """
-        indexes = list()
-        for degree in range(3600):
-            degree //= 10
-
-            x_shift, y_shift = trig.new_xy_circumference_circle(degree, self.radius)
-            x_shift = int(x_shift)
-            y_shift = int(y_shift)
-            center_x, center_y = self.center
-            xy = (center_x + x_shift, center_y + y_shift)
-
-            if xy not in indexes:
-                indexes.append(xy)
-
-        return indexes
+        x_shifts, y_shifts = circle_stencil(self.radius, thickness)
+        center_x, center_y = self.center
+        return list(zip((x_shifts + center_x).tolist(), (y_shifts + center_y).tolist()))
 
     def circumference_indexes_fitted(self, max_x, max_y, min_x, min_y):
         """
@@ -74,10 +75,104 @@ class Circle:
         list: [(int, int)]
             Indexes of the circumference within the bounds of the canvas.
         """
-        potential_indexes = self.circumference_indexes()
+        x_shifts, y_shifts = circle_stencil(self.radius)
+        center_x, center_y = self.center
+        potential_indexes = np.stack((x_shifts + center_x, y_shifts + center_y), axis=1)
         return partial_circle_circumference(potential_indexes, max_x, max_y, min_x, min_y)
 
 
+def _midpoint_octant(radius):
+    """
+    Rasterises the first octant of a circle with the midpoint circle algorithm.
+
+    Returns the (x, y) shifts of the pixels from the center with x >= y >= 0, starting at (radius, 0).
+    """
+    x_shifts = list()
+    y_shifts = list()
+    x, y = radius, 0
+    decision = 1 - radius
+    while x >= y:
+        x_shifts.append(x)
+        y_shifts.append(y)
+        y += 1
+        if decision < 0:
+            decision += 2 * y + 1
+        else:
+            x -= 1
+            decision += 2 * (y - x) + 1
+    return np.array(x_shifts), np.array(y_shifts)
+
+
+def _row_extents(radius):
+    """
+    Finds the smallest and largest x shift of the midpoint circle on every row.
+
+    Returns two arrays indexed by the absolute y shift, from 0 up to and including the radius.
+    """
+    octant_x, octant_y = _midpoint_octant(radius)
+    # The second octant mirrors the first one in the diagonal.
+    x_shifts = np.concatenate((octant_x, octant_y))
+    y_shifts = np.concatenate((octant_y, octant_x))
+
+    smallest_x = np.full(radius + 1, radius + 1)
+    largest_x = np.full(radius + 1, -1)
+    np.minimum.at(smallest_x, y_shifts, x_shifts)
+    np.maximum.at(largest_x, y_shifts, x_shifts)
+    return smallest_x, largest_x
+
+
+@functools.lru_cache(maxsize=stencil_cache_size)
+def circle_stencil(radius, thickness=1):
+    """
+    Computes the shifts of the pixels on the circumference of a circle around (0, 0).
+
+    The circumference is rasterised with the midpoint (Bresenham) circle algorithm, so it is closed, symmetric and
+    contains every pixel once. A thicker circumference contains all pixels between the midpoint circles of the inner
+    and the outer radius, ``radius - (thickness - 1) // 2`` and ``radius + thickness // 2``.
+
+    The stencils are cached: the last ``stencil_cache_size`` stencils are kept. The returned arrays are read-only,
+    because they are shared by every caller.
+
+    Parameters
+    ----------
+    radius: int
+        Radius of the circle in pixels.
+    thickness: int
+        Width of the circumference in pixels.
+
+    Returns
+    -------
+    tuple: (numpy.ndarray, numpy.ndarray)
+        x shifts and y shifts of the pixels on the circumference, ordered by y and then by x.
+    """
+    if radius < 0 or thickness < 1:
+        raise ValueError("A circle needs a radius of at least 0 and a thickness of at least 1.")
+
+    outer_radius = radius + thickness // 2
+    inner_radius = radius - (thickness - 1) // 2
+
+    outer_smallest_x, outer_largest_x = _row_extents(outer_radius)
+    if inner_radius > 0:
+        inner_smallest_x, _ = _row_extents(inner_radius)
+    else:
+        inner_smallest_x = np.zeros(0, dtype=int)
+
+    # Pixels inside the outer circle, but not strictly inside the inner circle.
+    y_shifts, x_shifts = np.indices((2 * outer_radius + 1, 2 * outer_radius + 1)) - outer_radius
+    absolute_x = np.abs(x_shifts)
+    absolute_y = np.abs(y_shifts)
+    on_circumference = absolute_x <= outer_largest_x[absolute_y]
+    inside_inner = absolute_y < len(inner_smallest_x)
+    inside_inner[inside_inner] = absolute_x[inside_inner] < inner_smallest_x[absolute_y[inside_inner]]
+    on_circumference &= ~inside_inner
+
+    x_shifts = x_shifts[on_circumference]
+    y_shifts = y_shifts[on_circumference]
+    x_shifts.setflags(write=False)
+    y_shifts.setflags(write=False)
+    return x_shifts, y_shifts
+
+
 def partial_circle_circumference(circle_indexes, max_x, max_y, min_x, min_y):
     """
     Casts a circle to a smaller canvas.
@@ -87,7 +182,7 @@ def partial_circle_circumference(circle_indexes, max_x, max_y, min_x, min_y):
     Parameters
     ----------
     circle_indexes: list [(int, int)]
-        Indexes that belong to the circumference of the circle.
+        Indexes that belong to the circumference of the circle, or an (amount, 2) array of them.
     max_x: int
         Maximum valid x index
     max_y: int
@@ -102,13 +197,7 @@ def partial_circle_circumference(circle_indexes, max_x, max_y, min_x, min_y):
     list: [(int, int)]
         Valid indexes that belong to the circumference of the circle.
     """
-    fitted_indexes = list()
-
-    for x, y in circle_indexes:
-        if x >= max_x or x <= min_x:
-            continue
-        if y >= max_y or y <= min_y:
-            continue
-        fitted_indexes.append((x, y))
-
-    return fitted_indexes
+    circle_indexes = np.asarray(circle_indexes, dtype=int).reshape(-1, 2)
+    x, y = circle_indexes.T
+    fitted = (x < max_x) & (x > min_x) & (y < max_y) & (y > min_y)
+    return [tuple(index) for index in circle_indexes[fitted].tolist()]
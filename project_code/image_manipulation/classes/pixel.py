@@ -7,6 +7,9 @@ angle_colour_dict = {-1.75:    (255,   0,      0),
                      1.25:     (255,   255,    255),
                      1.75:     (100,   100,    100)}
 
+# Weights of red, green and blue in the grey value of a pixel.
+luma_weights = (0.299, 0.587, 0.114)
+
 
 class GrayPixel:
     """
@@ -43,7 +46,8 @@ class GrayPixel:
         if isinstance(pixel_values, tuple):
             pixel_values = pixel_values[:3]
             red, green, blue = pixel_values
-            pixel_values = int((0.299 * red) + (0.587 * green) + (0.114 * blue))
+            red_weight, green_weight, blue_weight = luma_weights
+            pixel_values = int((red_weight * red) + (green_weight * green) + (blue_weight * blue))
 
         self.value = pixel_values
 
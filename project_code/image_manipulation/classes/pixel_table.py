@@ -1,15 +1,23 @@
 import numpy as np
-from project_code.image_manipulation.classes import \
-    edge as edges, \
-    pixel as pixel
+from project_code.image_manipulation import scratch_memory as scratch
+from project_code.image_manipulation.classes import pixel as pixel
+from project_code.my_maths import connected_components as components
+
+# Amount of rows converted at once, bounds the size of the float64 intermediate of rgb images.
+conversion_rows = 256
 
 
 class PixelTable:
     """
-    A pixel table containing pixels representing an image.
+    A pixel table containing planes representing an image.
+
+    The table stores the image as typed planes instead of pixel objects:
+    - ``values``: float32 plane with the grey value of every pixel.
+    - ``cache``: float32 plane with the pending value of every pixel. NaN marks an empty cache.
+    - ``orientation``: float32 plane with the gradient orientation of every pixel. NaN marks no orientation.
+    - ``on``: boolean plane, True for every pixel that is turned on.
 
-    Has the attribute ``pixels``, which is an array that contains the pixels.
-    The pixels have to be Grey Pixels.
+    Planes larger than the memory threshold are memory-mapped files, see ``scratch.empty``.
 
     Contains member functions that can manipulate the pixel table:
     - Function to automatically itself with the greyscale variant of an image.
@@ -35,13 +43,22 @@ class PixelTable:
         PixelTable
             The created Pixel Table object.
         """
-        self.pixels = np.ndarray((height, width), dtype=pixel.GrayPixel)
+        self.values = scratch.zeros((height, width), dtype=np.float32)
+        self.cache = scratch.full((height, width), np.nan, dtype=np.float32)
+        self.orientation = scratch.full((height, width), np.nan, dtype=np.float32)
+        self.on = scratch.zeros((height, width), dtype=bool)
+
+    @property
+    def shape(self):
+        """The (height, width) of the pixel table."""
+        return self.values.shape
 
     def fill_with_image(self, image):
         """
         Fills the Pixel Table with an image.
 
-        Sets the attribute ``pixels`` to Grey Pixel variants of the images pixels.
+        Sets the attribute ``values`` to the grey values of the images pixels. The whole image is converted at once,
+        see ``greyscale_plane``.
 
         Parameters
         ----------
@@ -53,82 +70,81 @@ class PixelTable:
         None
             The pixel table is filled with the greyscale variant of the image.
         """
-        for row in range(image.height):
-            for column in range(image.width):
-                pixel_rgb = image.getpixel((column, row))
-                pixel_value = pixel.GrayPixel(pixel_rgb)
-                self.pixels[row][column] = pixel_value
+        greyscale_plane(image, out=self.values)
+        self.orientation.fill(np.nan)
+        self.update_on_mask()
+
+    def update_on_mask(self):
+        """Marks every pixel with a value or an orientation as turned on."""
+        np.not_equal(self.values, 0, out=self.on)
+        self.on |= ~np.isnan(self.orientation)
 
     def set_new_pixel_values(self):
         """Sets the value of the cache to a pixel for every pixel in the pixel table."""
-        for row in self.pixels:
-            for active_pixel in row:
-                active_pixel.set_new_value()
+        filled_cache = ~np.isnan(self.cache)
+        self.values[filled_cache] = self.cache[filled_cache]
+        self.clear_cache()
+        self.update_on_mask()
 
     def clear_cache(self):
         """Clears the cache of every pixel in the pixel table."""
-        for row in self.pixels:
-            for active_pixel in row:
-                active_pixel.cache = None
+        self.cache.fill(np.nan)
+
+    def turn_off(self, mask):
+        """
+        Turns off all pixels selected by the mask by resetting their value and orientation.
+
+        Parameters
+        ----------
+        mask: numpy.ndarray
+            Boolean plane (or any valid numpy index) selecting the pixels to turn off.
+
+        Returns
+        -------
+        None
+            The selected pixels have been turned off.
+        """
+        self.values[mask] = 0
+        self.orientation[mask] = np.nan
+        self.on[mask] = False
 
     def turn_off_borders(self, border_width=2):
         """
         Turns off the borderpixels inside the pixel table.
         """
-        total_height, total_width = self.pixels.shape
-        for row_index in range(border_width):
-            for column_index in range(total_width):
-                self.pixels[row_index, column_index].turn_off()
-                self.pixels[-row_index, column_index].turn_off()
-
-        for row_index in range(border_width, total_height - border_width):
-            for column_index in range(border_width):
-                self.pixels[row_index][column_index].turn_off()
-                self.pixels[row_index][-column_index].turn_off()
+        border = np.ones(self.shape, dtype=bool)
+        border[border_width:-border_width or None, border_width:-border_width or None] = False
+        self.turn_off(border)
 
     def get_active_pixels(self):
-        """Gets a list with all pixels inside the table that are turned on."""
-        active = list()
-        for row_pixels in self.pixels:
-            for current_pixel in row_pixels:
-                if current_pixel.is_off():
-                    active.append(current_pixel)
-        return active
+        """Gets the (row indexes, column indexes) of all pixels inside the table that are turned on."""
+        return np.nonzero(self.on)
 
     def get_luminosity_active_pixels(self):
-        """Composes a list of pixel values of all pixels that are turned on."""
-        return [active_pixel.value for active_pixel in self.get_active_pixels()]
+        """Composes an array of pixel values of all pixels that are turned on."""
+        return self.values[self.on]
 
-    def find_continuous_edges(self):
+    def find_continuous_edges(self, connectivity=8, gap=0):
         """
         Searches for and groups connected pixels which are on.
 
-        Checks for every pixel if the pixel is on. If the pixel is on, nearby pixels are searches for other pixels that
-        are turned on to add to the edge. If no pixels are found, the edge is completed.
+        Labels the connected components of the pixels that are turned on, see ``label_components``. Branching edges
+        are labelled as one edge.
+
+        Parameters
+        ----------
+        connectivity: int
+            8 to connect diagonal neighbours, 4 to only connect horizontal and vertical neighbours.
+        gap: int
+            Amount of pixels that are off that is tolerated between pixels of the same edge.
 
         Returns
         -------
-        list: [ContinuousEdge]
-            A list with all found Continuous Edges.
+        tuple: (numpy.ndarray, int)
+            Plane with the label of the edge of every pixel that is on, and 0 for every pixel that is off.
+            Amount of found edges.
         """
-        all_edges = list()
-        table_height, table_width = self.pixels.shape
-        for row_index in range(2, table_height - 2):
-            for column_index in range(2, table_width - 2):
-                current_pixel = self.pixels[row_index][column_index]
-                # skips the pixel if it is off.
-                if current_pixel.is_off():
-                    continue
-                # skips the pixel if it has already been used in a different edge.
-                if current_pixel.cache == 1:
-                    continue
-                active_edge = edges.ContinuousEdge(current_pixel)
-                active_edge.fill_missing_pixels(self.pixels, column_index, row_index)
-                all_edges.append(active_edge)
-
-        self.clear_cache()
-
-        return all_edges
+        return components.label_components(self.on, connectivity, gap)
 
     def rgb_copy(self):
         """
@@ -136,32 +152,89 @@ class PixelTable:
 
         The rgb will contain the grey value of the pixel.
         """
-        total_height, total_width = self.pixels.shape
-        rgb_table = list()
-        for row_index in range(total_height):
-            current_pixel_row = list()
-            for column_index in range(total_width):
-                rgb = self.pixels[row_index][column_index].copy_colour_variant()
-                current_pixel_row.append(rgb)
-            rgb_table.append(current_pixel_row)
-
-        return np.array(rgb_table)
+        grey = self.values.astype(int)
+        return np.stack((grey, grey, grey), axis=-1)
 
     def orientation_copy(self):
         """
-        Creates a list with a copy of all pixels based on their orientation.
+        Creates an array with a copy of all pixels based on their orientation.
 
         All orientations are given a different colour. Pixels without an orientation
         are given the colour black.
         """
-        total_height, total_width = self.pixels.shape
-        rgb_table = list()
+        angles = np.array(list(pixel.angle_colour_dict.keys()))
+        colours = np.array(list(pixel.angle_colour_dict.values()) + [(255, 0, 0), (0, 0, 0)])
+
+        # Index of the first angle the orientation is smaller than or equal to.
+        colour_indexes = np.searchsorted(angles, np.nan_to_num(self.orientation), side='left')
+        colour_indexes[np.isnan(self.orientation)] = len(colours) - 1
 
-        for row_index in range(total_height):
-            current_pixel_row = list()
-            for column_index in range(total_width):
-                rgb = self.pixels[row_index][column_index].copy_orientation_as_colour()
-                current_pixel_row.append(rgb)
-            rgb_table.append(current_pixel_row)
+        return colours[colour_indexes]
 
-        return np.array(rgb_table)
+
+def greyscale_plane(image, out=None):
+    """
+    Converts a pillow image to a plane of grey values in one bulk operation.
+
+    Uses the same luma weights as ``GrayPixel``, so every value equals the value of the Grey Pixel of that pixel,
+    except for 16-bit images. Greyscale images ("L", "LA", "1") are used as is. 16-bit images ("I;16", "I;16L",
+    "I;16B", "I") are divided by 257 to scale them to 0 - 255, the range the edge detection expects, while a Grey Pixel
+    keeps their raw value up to 65535.
+    Palette images are converted by weighting their palette once and looking up every pixel. Other modes are converted
+    to rgb first.
+
+    Parameters
+    ----------
+    image: pillow.Image
+        The image to convert to greyscale.
+    out: numpy.ndarray
+        Optional (height, width) plane to write the grey values into.
+
+    Returns
+    -------
+    numpy.ndarray
+        The (height, width) float32 plane with the grey values of the image.
+    """
+    if out is None:
+        out = np.empty((image.height, image.width), dtype=np.float32)
+
+    mode = image.mode
+    if mode in ('P', 'PA'):
+        palette = np.array(image.getpalette('RGB'), dtype=np.float64).reshape(-1, 3)
+        red, green, blue = palette.T
+        red_weight, green_weight, blue_weight = pixel.luma_weights
+        palette_values = np.floor((red_weight * red) + (green_weight * green) + (blue_weight * blue))
+        indexes = np.asarray(image)
+        if indexes.ndim == 3:
+            indexes = indexes[:, :, 0]
+        np.take(palette_values.astype(np.float32), indexes, out=out)
+        return out
+
+    if mode not in ('L', 'LA', '1', 'I', 'I;16', 'I;16L', 'I;16B', 'F', 'RGB', 'RGBA', 'RGBX'):
+        image = image.convert('RGB')
+        mode = 'RGB'
+
+    image_array = np.asarray(image)
+    if mode == 'LA':
+        image_array = image_array[:, :, 0]
+
+    if image_array.ndim == 2:
+        # Single channel images only have to be cast (and scaled) into the plane.
+        if mode == '1':
+            np.multiply(image_array, 255, out=out)
+        elif mode in ('I', 'I;16', 'I;16L', 'I;16B'):
+            np.divide(image_array, 257, out=out)
+        else:
+            out[...] = image_array
+        return out
+
+    # Weights the channels in the same order as the Grey Pixel, in chunks of rows to bound memory.
+    red_weight, green_weight, blue_weight = pixel.luma_weights
+    for start_row in range(0, image.height, conversion_rows):
+        rgb_rows = image_array[start_row:start_row + conversion_rows]
+        grey_rows = red_weight * rgb_rows[:, :, 0]
+        grey_rows += green_weight * rgb_rows[:, :, 1]
+        grey_rows += blue_weight * rgb_rows[:, :, 2]
+        np.floor(grey_rows, out=out[start_row:start_row + conversion_rows], casting='same_kind')
+
+    return out
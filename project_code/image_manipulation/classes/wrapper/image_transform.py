@@ -2,13 +2,18 @@ from project_code.image_manipulation import \
     standard_filters as apply_filter, \
     sobel_edge_detector as sobel, \
     canny_edge_detector as canny, \
-    hough_circle_transform as hough
+    hough_circle_transform as hough, \
+    tiled_pipeline as tiling, \
+    stage_cache as caching, \
+    instrumentation
 
 from project_code.image_manipulation.classes import \
     pixel_table as tables, \
     basic_shapes as shapes
 
 import matplotlib.pyplot as plot
+import numpy as np
+from PIL import Image
 
 
 class TransformImage(object):
@@ -27,8 +32,9 @@ class TransformImage(object):
     Other functions:
     - Plots greyscale pixel table in matplotlib.
     - Draws pixel_table over the original image.
+    - Records events with the timings and counts of the stages, see ``record_events``.
     """
-    def __init__(self, img):
+    def __init__(self, img, stage_cache=None):
         """Creates an Image Analysis object.
 
         Creates a pixel table and fills it with a grey version of pixels of the given image.
@@ -38,6 +44,9 @@ class TransformImage(object):
         ----------
         img: pillow.Image
             an instance of pillow.Image.
+        stage_cache: caching.StageCache
+            Cache to look up and store the results of the blur, sobel and canny stages in. Nothing is cached when not
+            given.
 
         Returns
         -------
@@ -49,11 +58,74 @@ class TransformImage(object):
         image_pixel_table.fill_with_image(self.working_image)
         self.pixel_values = image_pixel_table
 
+        self.stage_cache = stage_cache
+        # Key of the content of the pixel table, None when it is unknown (or nothing is cached).
+        self.stage_key = caching.image_key(self.working_image) if stage_cache is not None else None
+
+    def _run_stages(self, stages):
+        """
+        Runs a chain of stages on the pixel table, skipping the stages whose result is cached.
+
+        The key of every stage follows from the current key and the parameters of the stages up to it. The table is
+        restored from the last stage of the chain that is cached, and only the stages after it are run. Their results
+        are stored in the cache.
+
+        Parameters
+        ----------
+        stages: list [(str, dict, callable)]
+            Name, parameters and function of every stage, in order.
+
+        Returns
+        -------
+        None
+            Pixel table contains the result of the last stage.
+        """
+        if self.stage_key is None:
+            for _, _, run_stage in stages:
+                run_stage()
+            return
+
+        keys = list()
+        key = self.stage_key
+        for stage_name, parameters, _ in stages:
+            key = caching.stage_key(key, stage_name, parameters)
+            keys.append(key)
+
+        first_stage = 0
+        for index in reversed(range(len(stages))):
+            arrays = self.stage_cache.load(keys[index])
+            if arrays is not None:
+                for plane in ('values', 'orientation', 'on'):
+                    np.copyto(getattr(self.pixel_values, plane), arrays[plane])
+                first_stage = index + 1
+                break
+        instrumentation.emit('stage_cache', stages=[stage_name for stage_name, _, _ in stages],
+                             cached_stages=first_stage)
+
+        for (_, _, run_stage), key in zip(stages[first_stage:], keys[first_stage:]):
+            run_stage()
+            self.stage_cache.store(key, {'values': self.pixel_values.values,
+                                         'orientation': self.pixel_values.orientation,
+                                         'on': self.pixel_values.on})
+        self.stage_key = keys[-1]
+
+    def _blur_stage(self, kernel_size, border_mode):
+        return ('blur', {'kernel_size': kernel_size, 'border_mode': border_mode},
+                lambda: apply_filter.gauss_blur(self.pixel_values, kernel_size, border_mode))
+
+    def _sobel_stage(self, kernel_size, operator, magnitude):
+        return ('sobel', {'kernel_size': kernel_size, 'operator': operator, 'magnitude': magnitude},
+                lambda: sobel.run_sobel_edge_detection(self.pixel_values, kernel_size, operator, magnitude))
+
+    def _canny_stage(self, kernel_size, noise):
+        return ('canny', {'kernel_size': kernel_size, 'noise': noise},
+                lambda: canny.canny_detector(self.pixel_values, kernel_size, noise))
+
     def method1(self):
         """Source: """
         return self.working_image.method1()
 
-    def apply_gaussian_blur(self, kernel_size=3):
+    def apply_gaussian_blur(self, kernel_size=3, border_mode='reflect'):
         """
         Blurs the image using a gaussian blur.
 
@@ -63,26 +135,37 @@ class TransformImage(object):
         ----------
         kernel_size: int
             Size of the gaussian kernel.
+        border_mode: str
+            How the image is extended beyond its border: 'reflect', 'nearest' or 'constant'.
 
         Returns
         -------
         None
             Pixel table image has been blurred.
         """
-        apply_filter.gauss_blur(self.pixel_values, kernel_size)
+        self._run_stages([self._blur_stage(kernel_size, border_mode)])
 
-    def apply_sobel_edge_detection(self):
+    def apply_sobel_edge_detection(self, kernel_size=3, operator='sobel', magnitude='l1'):
         """
         Searches the image for edges using Sobel Edge Detection.
 
         The image stored inside the Pixel Table is scanned by the Sobel Edge Detector.
 
+        Parameters
+        ----------
+        kernel_size: int
+            Size of the derivative kernel: 3, 5 or 7.
+        operator: str
+            'sobel' or 'scharr'.
+        magnitude: str
+            'hypot' for the exact gradient magnitude, 'l1' for the sum of the absolute derivatives.
+
         Returns
         -------
         None
             Pixel table contains the result of the sobel edge detector.
         """
-        sobel.run_sobel_edge_detection(self.pixel_values)
+        self._run_stages([self._sobel_stage(kernel_size, operator, magnitude)])
 
     def apply_canny_edge_detection(self, kernel_size=3, noise=2):
         """
@@ -101,9 +184,10 @@ class TransformImage(object):
         None
             Pixel table contains the result of the sobel edge detector.
         """
-        canny.canny_detector(self.pixel_values, kernel_size, noise)
+        self._run_stages([self._canny_stage(kernel_size, noise)])
 
-    def apply_hough_circle_transform(self, size):
+    def apply_hough_circle_transform(self, size, engine='auto', angular_tolerance=hough.default_angular_tolerance,
+                                     workers=1):
         """
         Searches for a circles using Hough Circle Transform.
 
@@ -111,18 +195,28 @@ class TransformImage(object):
         ----------
         size: int
             approximate range of radii in the pixels.
+        engine: str
+            How the edge pixels vote, one of ``hough.voting_engines``: 'auto', 'circle', 'gradient' or 'fft'.
+        angular_tolerance: float
+            Maximum deviation from the gradient in radians at which the 'gradient' engine votes.
+        workers: int
+            Amount of worker processes that search the radii. All cpus are used when None.
 
         Returns
         -------
         dict: {int: [(int, int)]}
             A dictionary with radii, containing a list with their found circle centers as (x, y).
         """
-        return hough.find_circles_unset_size(self.pixel_values, size)
+        return hough.find_circles_unset_size(self.pixel_values, size, engine, angular_tolerance, workers)
 
+    @instrumentation.stage('apply_canny')
     def apply_canny(self, kernel_size=3, noise=2):
         """
         Searches for edges using Canny Edge Detection.
 
+        Blurs the image, runs the sobel edge detector and canny edge detection. With a stage cache, a cached edge map
+        is loaded without running any stage, and otherwise the pipeline resumes after the last cached stage.
+
         Parameters
         ----------
         kernel_size: int
@@ -130,9 +224,9 @@ class TransformImage(object):
         noise: int
             Approximate amount of noise in the image.
         """
-        self.apply_gaussian_blur(kernel_size)
-        self.apply_sobel_edge_detection()
-        self.apply_canny_edge_detection(kernel_size, noise)
+        self._run_stages([self._blur_stage(kernel_size, 'reflect'),
+                          self._sobel_stage(3, 'sobel', 'l1'),
+                          self._canny_stage(kernel_size, noise)])
 
     def apply_canny_show_images(self, kernel_size=3):
         """"""
@@ -143,12 +237,15 @@ class TransformImage(object):
         self.plot_pixel_table(cut_edge=2)
 
         canny.non_maximum_suppressor(self.pixel_values, kernel_size)
+        self.stage_key = None
         self.plot_pixel_table(cut_edge=2)
 
         canny.hysteresis_thresholding(self.pixel_values, kernel_size)
         self.plot_pixel_table(cut_edge=2)
 
-    def find_circles(self, size=1):
+    @instrumentation.stage('find_circles')
+    def find_circles(self, size=1, engine='auto', angular_tolerance=hough.default_angular_tolerance, workers=1,
+                     pyramid=False):
         """
         Searches for a circles using Hough Circle Transform.
 
@@ -158,8 +255,103 @@ class TransformImage(object):
         ----------
         size: int
             The range of radii.
+        engine: str
+            How the edge pixels vote, one of ``hough.voting_engines``: 'auto', 'circle', 'gradient' or 'fft'.
+        angular_tolerance: float
+            Maximum deviation from the gradient in radians at which the 'gradient' engine votes.
+        workers: int
+            Amount of worker processes that search the radii. All cpus are used when None.
+        pyramid: bool
+            Search for candidates in a downsampled edge map and refine them at full resolution. Much faster for large
+            radii, supports the 'auto', 'circle' and 'fft' engines.
+        """
+        return hough.find_circles_unset_size(self.pixel_values, size, engine, angular_tolerance, workers, pyramid)
+
+    def stream_circles(self, size=1, engine='auto', angular_tolerance=hough.default_angular_tolerance):
+        """
+        Searches for circles using Hough Circle Transform, yielding the circles of every radius when they are final.
+
+        Collecting the radii with circles gives the result of ``find_circles``, but the circles of small radii are
+        available while the larger radii are still searched, see ``hough.stream_circles_radius_range``.
+
+        Parameters
+        ----------
+        size: int
+            The range of radii.
+        engine: str
+            How the edge pixels vote, one of ``hough.voting_engines``: 'auto', 'circle', 'gradient' or 'fft'.
+        angular_tolerance: float
+            Maximum deviation from the gradient in radians at which the 'gradient' engine votes.
+
+        Yields
+        ------
+        tuple: (int, [(int, int)])
+            A radius and the list with its found circle centers as (x, y), for every radius of the range.
+        """
+        radii = hough.radius_ranges[size]
+        found_circles = hough.stream_circles_radius_range(self.pixel_values, radii, engine=engine,
+                                                          angular_tolerance=angular_tolerance)
+        for radius, (x, y, found_radii, scores) in zip(radii, found_circles):
+            yield radius, list(zip(x.tolist(), y.tolist()))
+
+    def record_events(self, *sinks, memory=False):
+        """
+        Records the events of the stages run inside a with block.
+
+        Every stage reports its wall time, cpu time and counts such as the amount of edge pixels or of candidates per
+        radius, see ``instrumentation.measure``:
+
+            with working_image.record_events(instrumentation.MemorySink()) as (events,):
+                working_image.apply_canny(5, 2)
+
+        Parameters
+        ----------
+        sinks: object
+            Where the events are sent: an ``instrumentation.LoggerSink``, ``JsonLinesSink`` or ``MemorySink``.
+        memory: bool
+            Also trace the peak memory of every stage. Slows the stages down.
+
+        Returns
+        -------
+        contextmanager
+            The with block, gives the sinks.
+        """
+        return instrumentation.recording(*sinks, memory=memory)
+
+    def find_circles_tiled(self, size=1, tile_size=tiling.default_tile_size, kernel_size=5, noise=2, engine='auto',
+                           angular_tolerance=hough.default_angular_tolerance, workers=1):
+        """
+        Searches the original image for circles, tile by tile.
+
+        Runs the blur, canny edge detection and the hough circle transform on overlapping tiles of the original image,
+        so full resolution images can be searched with bounded memory, see ``tiling.find_circles_tiled``. The pixel
+        table is not used.
+
+        Parameters
+        ----------
+        size: int
+            The range of radii.
+        tile_size: int
+            Length of the sides of the tiles, without their overlap.
+        kernel_size: int
+            Size of the blur kernel and the non-maximum suppression.
+        noise: int
+            Approximate amount of noise in the image.
+        engine: str
+            How the edge pixels vote, one of ``hough.voting_engines``: 'auto', 'circle', 'gradient' or 'fft'.
+        angular_tolerance: float
+            Maximum deviation from the gradient in radians at which the 'gradient' engine votes.
+        workers: int
+            Amount of processes that search tiles at the same time. All cpus are used when None.
+
+        Returns
+        -------
+        dict: {int: [(int, int)]}
+            A dictionary with radii, containing a list with their found circle centers as (x, y).
         """
-        return hough.find_circles_unset_size(self.pixel_values, size)
+        x, y, radii, scores = tiling.find_circles_tiled(self.working_image, hough.radius_ranges[size], tile_size,
+                                                        kernel_size, noise, engine, angular_tolerance, workers)
+        return hough.circles_per_radius(x, y, radii)
 
     def plot_pixel_table(self, cut_edge=2):
         """
@@ -231,34 +423,50 @@ class TransformImage(object):
         if show:
             self.working_image.show()
 
-    def draw_circles(self, radius_and_indexes, colour, width=1):
+    def draw_circles(self, radius_and_indexes, colour, width=1, show=True):
         """
         Draws a circle on the image.
 
         Draws one or several circles on the image for every given index. The image itself, not the rendition inside the
-        pixel table, is changed.
+        pixel table, is changed. All circles are collected in one mask from the cached circle stencils and pasted at
+        once.
 
         Parameters
         ----------
-        radius_and_indexes: tuple (int, int, int)
-            Radius, column index (x), row index (y) of the circle
+        radius_and_indexes: dict {int: [(int, int)]}
+            Radii with a list containing the centers of the circles of that radius as (x, y).
         colour: tuple (int, int, int)
             The colour to draw in as RGB value.
         width: int
             The pixel radius around the pixel to also draw in.
+        show: bool
+            Show the image if True. Standard set to True.
 
         Returns
         -------
         None
             Circles are drawn on the image.
         """
-        for radius in radius_and_indexes:
-            base_circle = shapes.Circle(radius, 0, 0)
-            base_circle_indexes = base_circle.circumference_indexes()
-
-            for x_index, y_index in radius_and_indexes[radius]:
-                self.draw_over_image([(x_index, y_index)], colour, width, False)
-                current_indexes = [(base_x + x_index, base_y + y_index) for base_x, base_y in base_circle_indexes]
-                self.draw_over_image(current_indexes, colour, width, False)
-
-        self.working_image.show()
+        image_width, image_height = self.working_image.size
+        drawn = np.zeros((image_height, image_width), dtype=bool)
+        # Every drawn point is widened to the same square as ``draw_over_image``.
+        brush_y, brush_x = np.indices((2 * width, 2 * width)).reshape(2, -1, 1) - width
+
+        for radius, centers in radius_and_indexes.items():
+            if not centers:
+                continue
+            center_x, center_y = np.array(centers).reshape(-1, 2).T
+            x_shifts, y_shifts = shapes.circle_stencil(radius)
+            # The centers themselves are drawn as well.
+            x = np.concatenate((center_x, (center_x[:, np.newaxis] + x_shifts).ravel()))
+            y = np.concatenate((center_y, (center_y[:, np.newaxis] + y_shifts).ravel()))
+
+            brush_x_indexes = (x + brush_x).ravel()
+            brush_y_indexes = (y + brush_y).ravel()
+            inside = (brush_x_indexes >= 0) & (brush_x_indexes < image_width) & \
+                     (brush_y_indexes >= 0) & (brush_y_indexes < image_height)
+            drawn[brush_y_indexes[inside], brush_x_indexes[inside]] = True
+
+        self.working_image.paste(colour, mask=Image.fromarray(drawn.astype(np.uint8) * 255))
+        if show:
+            self.working_image.show()
@@ -1,276 +1,1225 @@
+from project_code.image_manipulation import \
+    scratch_memory as scratch, \
+    instrumentation
 from project_code.image_manipulation.classes import basic_shapes as shapes
 
-from project_code.my_maths import \
-    calculus as calc, \
-    select_from_matrix as matrix_select
+from project_code.my_maths import calculus as calc
+
+from concurrent import futures
+from multiprocessing import shared_memory
+import collections
+import itertools
+import os
+import time
 
 import numpy as np
 
+# Range of radii to search for every size setting.
+radius_ranges = {0: range(10, 201),
+                 1: range(6, 15),
+                 2: range(15, 31),
+                 3: range(30, 101),
+                 4: range(60, 101),
+                 5: range(100, 201)}
+
+# Maximum amount of votes cast at once by ``draw_around_pixels``.
+vote_chunk_size = 2 ** 22
+
+# Planes published to the worker processes of ``find_circles_parallel``, attached by ``_attach_shared_planes``.
+_shared_planes = dict()
+
+# Ways of casting the votes of the edge pixels into an accumulator, see ``accumulate_radius_range``.
+voting_engines = ('auto', 'circle', 'gradient', 'fft')
+
+# Amount of votes the 'circle' engine casts in the time the 'fft' engine takes per pixel of the padded edge map. The
+# 'auto' engine convolves a radius when drawing its circles would cost more.
+fft_vote_cost = 2.0
+
+# Deviation from the gradient in radians at which the 'gradient' engine votes by default, see ``draw_along_gradients``.
+default_angular_tolerance = 0.2
+
+
+def edge_points(value_table):
+    """
+    Extracts the coordinates of all edge pixels.
+
+    Parameters
+    ----------
+    value_table: pix.PixelTable
+        The table matrix containing all the values of the edges.
 
-def draw_around_pixels(value_table, circle_indexes, radius):
+    Returns
+    -------
+    tuple: (numpy.ndarray, numpy.ndarray)
+        Row indexes (y) of all pixels that are turned on.
+        Column indexes (x) of all pixels that are turned on.
     """
-    Draws a circle in around every pixel.
+    return value_table.get_active_pixels()
 
-    The circles are drawn in cache space by adding 1 to the cache. All circles have the same radius.
+
+def edge_orientations(value_table, edge_indexes):
+    """
+    Looks up the gradient orientation of edge pixels.
 
     Parameters
     ----------
     value_table: pix.PixelTable
-        The table matrix containing all the values of the edges. The objects inside pixel table have to have a cache
-        attribute the function can use.
-    circle_indexes: list [(int, int)]
-        Minimum value to be considered a peak.
+        The table matrix containing the orientations of the edges, see ``run_sobel_edge_detection``.
+    edge_indexes: tuple (numpy.ndarray, numpy.ndarray)
+        Row indexes and column indexes of the edge pixels, see ``edge_points``.
+
+    Returns
+    -------
+    numpy.ndarray
+        Orientation of every edge pixel in radians. NaN for pixels without an orientation.
+    """
+    return value_table.orientation[edge_indexes]
+
+
+def draw_around_pixels(edge_indexes, circle_stencil, shape):
+    """
+    Draws a circle around every edge pixel in a separate accumulator.
+
+    Every edge pixel casts a vote on every pixel of the circle around it. The votes are collected by counting the
+    raveled indexes of all votes at once. All circles have the same radius. Votes that fall outside the image are
+    dropped.
+
+    Parameters
+    ----------
+    edge_indexes: tuple (numpy.ndarray, numpy.ndarray)
+        Row indexes and column indexes of the edge pixels, see ``edge_points``.
+    circle_stencil: tuple (numpy.ndarray, numpy.ndarray)
+        x shifts and y shifts of the circumference of the circle around (0, 0), see ``shapes.circle_stencil``.
+    shape: tuple (int, int)
+        Height and width of the image.
+
+    Returns
+    -------
+    numpy.ndarray
+        float32 accumulator with the fraction of the circle around every pixel that falls on an edge.
+    """
+    height, width = shape
+    edge_rows, edge_columns = edge_indexes
+    x_shifts, y_shifts = circle_stencil
+    vote_counts = np.zeros(height * width, dtype=np.int64)
+
+    # Casts the votes of a limited amount of edge pixels at once to bound the memory use.
+    chunk_size = max(vote_chunk_size // len(x_shifts), 1)
+    for chunk_start in range(0, len(edge_rows), chunk_size):
+        vote_rows = edge_rows[chunk_start:chunk_start + chunk_size, np.newaxis] + y_shifts
+        vote_columns = edge_columns[chunk_start:chunk_start + chunk_size, np.newaxis] + x_shifts
+        inside = (vote_rows >= 0) & (vote_rows < height) & (vote_columns >= 0) & (vote_columns < width)
+        vote_counts += np.bincount(vote_rows[inside] * width + vote_columns[inside], minlength=height * width)
+
+    accumulator = vote_counts.reshape(height, width).astype(np.float32)
+    accumulator *= np.float32(1 / len(x_shifts))
+    return accumulator
+
+
+def draw_along_gradients(edge_indexes, orientations, radius, shape, angular_tolerance=default_angular_tolerance):
+    """
+    Casts the votes of every edge pixel at the possible centers along its gradient.
+
+    The center of a circle lies on the line through an edge pixel along its gradient, at a distance of the radius.
+    The orientation does not tell on which side, so every edge pixel votes on both points at +radius and -radius along
+    its gradient. With an angular tolerance the votes are spread over the arc of the circle around the edge pixel
+    within the tolerance of the gradient, one vote per pixel of the arc. An edge pixel votes at most once on the
+    same pixel. Edge pixels without an orientation do not vote.
+
+    The orientation of an edge pixel deviates from the direction to the true center by up to a few tenths of a radian,
+    because the edges are blurred and sampled on a pixel grid. Without a tolerance most votes miss the center, so a
+    complete circle only scores a small fraction of the threshold. The default tolerance, ``default_angular_tolerance``,
+    lets a circle collect about as many votes as with the 'circle' engine.
+
+    The votes are normalised like ``draw_around_pixels``: the votes are divided by the amount of pixels of the
+    circumference, so a complete circle whose gradients all point at its center scores 1.
+
+    Parameters
+    ----------
+    edge_indexes: tuple (numpy.ndarray, numpy.ndarray)
+        Row indexes and column indexes of the edge pixels, see ``edge_points``.
+    orientations: numpy.ndarray
+        Gradient orientation of every edge pixel in radians, see ``edge_orientations``.
     radius: int
-        Radius of the circle.
+        Radius of the circles.
+    shape: tuple (int, int)
+        Height and width of the image.
+    angular_tolerance: float
+        Maximum deviation from the gradient in radians at which votes are cast.
 
     Returns
     -------
-    Nothing
-        The circles have been drawn in cache space.
-    """
-    accumulator = 1 / len(circle_indexes)
-    image_values = value_table.pixels
-    height, width = image_values.shape
-
-    right_border_start = width - radius
-    lower_border_start = height - radius
-
-    for row_index in range(radius, height - radius):
-        cast_circle = circle_indexes.copy()
-
-        # Casts the circle if it doesn't fit in the y direction to fit on the canvas.
-        if row_index < radius:
-            cast_circle = shapes.partial_circle_circumference(cast_circle,
-                                                              row_index,
-                                                              radius,
-                                                              -radius,
-                                                              -radius)
-        elif row_index > lower_border_start:
-            cast_circle = shapes.partial_circle_circumference(cast_circle,
-                                                              radius,
-                                                              radius,
-                                                              row_index - height,
-                                                              -radius)
-
-        for column_index in range(radius, width - radius):
-            current_pixel = image_values[row_index][column_index]
-            if current_pixel.is_off():
-                continue
+    numpy.ndarray
+        float32 accumulator with the fraction of the circle around every pixel that points at the pixel.
+    """
+    height, width = shape
+    has_orientation = ~np.isnan(orientations)
+    edge_rows = edge_indexes[0][has_orientation]
+    edge_columns = edge_indexes[1][has_orientation]
+    orientations = orientations[has_orientation].astype(np.float64)
 
-            # Casts the circle (further) if the circle does not fit in the x direction.
-            if column_index < radius:
-                cast_circle = shapes.partial_circle_circumference(cast_circle.copy(),
-                                                                  radius,
-                                                                  column_index,
-                                                                  -radius,
-                                                                  -radius)
-            elif column_index > right_border_start:
-                cast_circle = shapes.partial_circle_circumference(cast_circle.copy(),
-                                                                  radius,
-                                                                  radius,
-                                                                  -radius,
-                                                                  column_index - width)
+    # One step along the arc moves the vote by about one pixel.
+    arc_steps = int(angular_tolerance * radius)
+    angle_offsets = np.arange(-arc_steps, arc_steps + 1) / radius
+    # Votes on both sides: the opposite direction is half a turn further.
+    angle_offsets = np.concatenate((angle_offsets, angle_offsets + np.pi))
 
-            for x_shift, y_shift in cast_circle:
-                perimeter_pixel = image_values[row_index + y_shift][column_index + x_shift]
-                if perimeter_pixel.cache is None:
-                    perimeter_pixel.cache = accumulator
-                else:
-                    perimeter_pixel.cache += accumulator
+    vote_counts = np.zeros(height * width, dtype=np.int64)
+    chunk_size = max(vote_chunk_size // len(angle_offsets), 1)
+    for chunk_start in range(0, len(edge_rows), chunk_size):
+        angles = orientations[chunk_start:chunk_start + chunk_size, np.newaxis] + angle_offsets
+        # Orientations are measured with the y-axis pointing up, rows count downwards.
+        vote_rows = edge_rows[chunk_start:chunk_start + chunk_size, np.newaxis] - np.rint(radius * np.sin(angles))
+        vote_columns = edge_columns[chunk_start:chunk_start + chunk_size, np.newaxis] + np.rint(radius * np.cos(angles))
+        inside = (vote_rows >= 0) & (vote_rows < height) & (vote_columns >= 0) & (vote_columns < width)
 
+        votes = np.where(inside, vote_rows * width + vote_columns, -1).astype(np.int64)
+        # Neighbouring angles can round to the same pixel, only the first of them votes.
+        votes.sort(axis=1)
+        votes[:, 1:][votes[:, 1:] == votes[:, :-1]] = -1
+        vote_counts += np.bincount(votes[votes >= 0], minlength=height * width)
 
-def find_accumulator_peaks(value_table, threshold, radius):
+    accumulator = vote_counts.reshape(height, width).astype(np.float32)
+    accumulator *= np.float32(1 / len(shapes.circle_stencil(radius)[0]))
+    return accumulator
+
+
+def _fast_fft_length(length):
+    """Finds the smallest length of at least ``length`` without prime factors above 5, which the FFT handles fast."""
+    while True:
+        remainder = length
+        for factor in (2, 3, 5):
+            while remainder % factor == 0:
+                remainder //= factor
+        if remainder == 1:
+            return length
+        length += 1
+
+
+def edge_spectrum(edge_indexes, shape, max_radius):
     """
-    Finds peaks inside the cache of the pixel.
+    Computes the spectrum of the binary edge map for ``convolve_ring``.
+
+    The edge map is padded with ``max_radius`` zeros on the bottom and the right, so the convolution with any ring
+    up to that radius does not wrap around the image.
 
     Parameters
     ----------
-    value_table: pix.PixelTable
-        The table matrix containing all the values of the edges. The objects inside pixel table have to have a cache
-        attribute the function can use.
+    edge_indexes: tuple (numpy.ndarray, numpy.ndarray)
+        Row indexes and column indexes of the edge pixels, see ``edge_points``.
+    shape: tuple (int, int)
+        Height and width of the image.
+    max_radius: int
+        Largest radius that will be convolved with the spectrum.
+
+    Returns
+    -------
+    tuple: (numpy.ndarray, tuple (int, int))
+        The real FFT of the padded edge map.
+        The height and width of the padded edge map.
+    """
+    height, width = shape
+    padded_shape = (_fast_fft_length(height + max_radius), _fast_fft_length(width + max_radius))
+    edge_map = np.zeros(padded_shape, dtype=np.float64)
+    edge_map[edge_indexes] = 1
+    return np.fft.rfft2(edge_map), padded_shape
+
+
+def convolve_ring(spectrum, padded_shape, circle_stencil, shape):
+    """
+    Builds the accumulator of one radius by convolving the edge map with a ring.
+
+    Every pixel of the accumulator counts the edge pixels on the circle around it, which equals the amount of votes
+    ``draw_around_pixels`` casts on it. The ring is placed around the origin of the padded map, wrapping around to
+    the far side, so the convolution is not shifted.
+
+    Parameters
+    ----------
+    spectrum: numpy.ndarray
+        Spectrum of the edge map, see ``edge_spectrum``.
+    padded_shape: tuple (int, int)
+        Height and width of the padded edge map.
+    circle_stencil: tuple (numpy.ndarray, numpy.ndarray)
+        x shifts and y shifts of the circumference of the circle around (0, 0), see ``shapes.circle_stencil``.
+    shape: tuple (int, int)
+        Height and width of the image.
+
+    Returns
+    -------
+    numpy.ndarray
+        float32 accumulator with the fraction of the circle around every pixel that falls on an edge.
+    """
+    height, width = shape
+    x_shifts, y_shifts = circle_stencil
+    ring = np.zeros(padded_shape, dtype=np.float64)
+    ring[y_shifts % padded_shape[0], x_shifts % padded_shape[1]] = 1
+
+    vote_counts = np.fft.irfft2(spectrum * np.fft.rfft2(ring), s=padded_shape)[:height, :width]
+    # The counts are integers, rounding removes the error of the transform.
+    accumulator = np.rint(vote_counts).astype(np.float32)
+    accumulator *= np.float32(1 / len(x_shifts))
+    return accumulator
+
+
+def find_accumulator_peaks(accumulator, threshold, footprint, top_k=None, border=0):
+    """
+    Finds peaks inside the accumulator.
+
+    A value is a peak when it is the maximum of the box around it and passes the threshold. The box contains
+    ``footprint`` pixels on both sides of the value. When several values in a box share the maximum, only the first one
+    (top, then left) is kept, so every peak is found once.
+
+    Parameters
+    ----------
+    accumulator: numpy.ndarray
+        The accumulator of the circles of one radius, see ``draw_around_pixels``.
     threshold: float
         Minimum value to be considered a peak.
-    radius: int
-        Radius of the circle we are looking for.
+    footprint: int or tuple (int, int)
+        Radius of the box, or the radius along y and x.
+    top_k: int
+        Maximum amount of peaks to return, the strongest are kept. All peaks are returned when not given.
+    border: int
+        Peaks within this amount of pixels of the border of the accumulator are skipped.
 
     Returns
     -------
-    list: [(int, int)]
-        location of the found peaks as (x, y)
+    tuple: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        x, y and magnitude of the found peaks, from the strongest to the weakest peak.
     """
-    found_peaks = []
-    image_values = value_table.pixels
-    height, width = image_values.shape
+    if isinstance(footprint, int):
+        footprint = (footprint, footprint)
+    height, width = accumulator.shape
 
-    for row_index in range(radius, height - radius):
-        for column_index in range(radius, width - radius):
-            current_pixel = image_values[row_index][column_index]
-            if current_pixel.cache is None:
-                continue
-            if current_pixel.cache > threshold:
-                # Saves the circle center as (x, y, magnitude).
-                local_neighborhood = matrix_select.get_sub_matrix(mother_matrix=image_values,
-                                                                  x_start=row_index,
-                                                                  y_start=column_index,
-                                                                  size=radius)
+    local_maximum = calc.maximum_filter(accumulator, footprint)
+    peaks = (accumulator == local_maximum) & (accumulator > threshold)
+    y, x = np.nonzero(peaks[border:height - border, border:width - border])
+    y += border
+    x += border
 
-                maximum_index, local_maximum = calc.local_maximum_2d_cache(local_neighborhood)
-                local_maximum_x, local_maximum_y = maximum_index
-                found_peaks.append((column_index + local_maximum_x, row_index + local_maximum_y, local_maximum))
+    keep = _first_of_ties(np.stack((y, x), axis=1), footprint)
+    y = y[keep]
+    x = x[keep]
+    scores = accumulator[y, x]
 
-    return found_peaks
+    # Stable sort, so equal peaks stay in the order of the image.
+    strongest_first = np.argsort(-scores, kind='stable')[:top_k]
+    return x[strongest_first], y[strongest_first], scores[strongest_first]
 
 
-def find_circles_set_radius(value_table, radius):
+@instrumentation.stage('hough_radius')
+def find_circles_set_radius(value_table, radius, edge_indexes=None, engine='auto',
+                            angular_tolerance=default_angular_tolerance, footprint=None, top_k=None):
     """
     Searches an image for circles.
 
     Searches an image inside a Pixel Table for circles using the hough circle transform.
-    Draws a circle around point 0 and saves the indexes.
+    Takes the cached circle around point 0, see ``shapes.circle_stencil``.
     Draws a circle around every pixel that is turned on. All pixels that get drawn on get a count.
     The pixels with a count higher than amount on indexes inside the circle * 0.5 are considered candidates for a
-    circle.
+    circle. The local maxima among the candidates are the found circles, see ``find_accumulator_peaks``.
 
     Parameters
     ----------
     value_table: pix.PixelTable
-        The table matrix containing all the values of the edges. The objects inside pixel table have to have a cache
-        attribute the function can use.
+        The table matrix containing all the values of the edges.
     radius: int
         Radius of the circle we are looking for.
+    edge_indexes: tuple (numpy.ndarray, numpy.ndarray)
+        The edge pixels of ``value_table``, see ``edge_points``. Extracted from the table when not given.
+    engine: str
+        How the edge pixels vote, see ``accumulate_radius_range``.
+    angular_tolerance: float
+        Maximum deviation from the gradient in radians at which the 'gradient' engine votes.
+    footprint: int
+        Radius of the neighbourhood in which only one circle is found. Half of the radius when not given.
+    top_k: int
+        Maximum amount of circles to return, the strongest are kept.
 
     Returns
     -------
-    list: [(int, int)]
-        Centers of all found circles as (x, y)
+    tuple: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        x, y and magnitude of the centers of all found circles, from the strongest to the weakest circle.
     """
-    print('Hough {}'.format(radius))
+    if edge_indexes is None:
+        edge_indexes = edge_points(value_table)
+    instrumentation.annotate(radius=radius, engine=engine, edge_pixels=len(edge_indexes[0]))
 
-    base_circle = shapes.Circle(radius, 0, 0)
-    base_circle_indexes = base_circle.circumference_indexes()
+    orientations = edge_orientations(value_table, edge_indexes) if engine == 'gradient' else None
+    accumulator = accumulate_radius_range(edge_indexes, value_table.shape, range(radius, radius + 1), engine,
+                                          orientations, angular_tolerance)[0]
 
-    draw_around_pixels(value_table, base_circle_indexes, radius)
+    if footprint is None:
+        footprint = max(radius // 2, 1)
 
     threshold = 0.5
-    found_circle_centers = find_accumulator_peaks(value_table, threshold, radius)
+    found_circles = find_accumulator_peaks(accumulator, threshold, footprint, top_k, border=radius)
+    instrumentation.annotate(circles=len(found_circles[0]))
+    return found_circles
+
+
+def accumulate_radius_range(edge_indexes, shape, radii, engine='auto', orientations=None,
+                            angular_tolerance=default_angular_tolerance):
+    """
+    Builds the accumulator volume of a range of radii.
+
+    The edge pixels are extracted once and cast their votes for every radius into one (radius, y, x) volume.
+    The engine selects how the votes are cast:
+    - 'circle': every edge pixel votes on the whole circle around it, see ``draw_around_pixels``.
+    - 'gradient': every edge pixel only votes along its gradient, see ``draw_along_gradients``. Needs the
+      orientations of the edge pixels.
+    - 'fft': the edge map is convolved with a ring for every radius, see ``convolve_ring``. Gives the same
+      accumulator as 'circle', but its cost does not depend on the amount of edge pixels or the radius. The spectrum of
+      the edge map is computed once for all radii.
+    - 'auto': the same accumulator as 'circle', computed per radius by 'circle' or 'fft', whichever is cheaper. Small
+      radii of sparse edge maps are drawn, large radii and dense edge maps are convolved, see ``fft_vote_cost``.
+
+    Parameters
+    ----------
+    edge_indexes: tuple (numpy.ndarray, numpy.ndarray)
+        Row indexes and column indexes of the edge pixels, see ``edge_points``.
+    shape: tuple (int, int)
+        Height and width of the image.
+    radii: range
+        The radii to accumulate.
+    engine: str
+        One of ``voting_engines``.
+    orientations: numpy.ndarray
+        Gradient orientation of every edge pixel, see ``edge_orientations``. Only used by the 'gradient' engine.
+    angular_tolerance: float
+        Maximum deviation from the gradient in radians at which the 'gradient' engine votes.
+
+    Returns
+    -------
+    numpy.ndarray
+        float32 volume with the accumulator of ``radii[i]`` at index i. Memory-mapped when it is larger than the
+        memory threshold, see ``scratch.empty``.
+    """
+    height, width = shape
+    accumulator_volume = scratch.empty((len(radii), height, width), dtype=np.float32)
+    accumulators = radius_accumulators(edge_indexes, shape, radii, engine, orientations, angular_tolerance)
+    for radius_index, accumulator in enumerate(accumulators):
+        accumulator_volume[radius_index] = accumulator
+    return accumulator_volume
 
-    value_table.clear_cache()
 
-    return found_circle_centers
+def radius_accumulators(edge_indexes, shape, radii, engine='auto', orientations=None,
+                        angular_tolerance=default_angular_tolerance):
+    """
+    Builds the accumulators of a range of radii one at a time.
 
+    Yields the layers of ``accumulate_radius_range`` in order, see there for the parameters and the engines.
 
-def find_circles_unset_size(value_table, size=2):
+    Yields
+    ------
+    numpy.ndarray
+        float32 accumulator of the next radius.
     """
-    Searches the image inside the pixel table for circles.
+    if engine not in voting_engines:
+        raise ValueError("Unknown voting engine '{}', use one of {}.".format(engine, ', '.join(voting_engines)))
+    if engine == 'gradient' and orientations is None:
+        raise ValueError("The 'gradient' engine needs the orientations of the edge pixels.")
+
+    if not len(radii):
+        return
+    height, width = shape
+    padded_size = _fast_fft_length(height + max(radii)) * _fast_fft_length(width + max(radii))
+    # Computed at the first radius that is convolved.
+    spectrum = None
+
+    for radius in radii:
+        if engine == 'gradient':
+            yield draw_along_gradients(edge_indexes, orientations, radius, shape, angular_tolerance)
+            continue
+        circle_stencil = shapes.circle_stencil(radius)
+        vote_count = len(edge_indexes[0]) * len(circle_stencil[0])
+        if engine == 'fft' or (engine == 'auto' and vote_count > fft_vote_cost * padded_size):
+            if spectrum is None:
+                spectrum, padded_shape = edge_spectrum(edge_indexes, shape, max(radii))
+            yield convolve_ring(spectrum, padded_shape, circle_stencil, shape)
+        else:
+            yield draw_around_pixels(edge_indexes, circle_stencil, shape)
+
+
+def _first_of_ties(peak_indexes, window_radius):
+    """
+    Selects the first peak of every group of peaks that lie within each others window.
+
+    Peaks that lie within each others window have the same magnitude, because both are the maximum of their window.
+    Only the first of them, in the order of ``peak_indexes``, is kept.
+
+    The peaks are sorted into a grid of cells one window radius plus one long, so two peaks within each others window
+    lie in the same or in neighbouring cells. Only the peaks of neighbouring cells are compared, which keeps the cost
+    linear in the amount of peaks.
+
+    Parameters
+    ----------
+    peak_indexes: numpy.ndarray
+        (peak count, dimensions) array with the index of every peak, the preferred peaks first.
+    window_radius: tuple
+        Radius of the window along every dimension.
+
+    Returns
+    -------
+    numpy.ndarray
+        Boolean array selecting the peaks that are kept.
+    """
+    peak_count, dimensions = peak_indexes.shape
+    keep = np.ones(peak_count, dtype=bool)
+    if peak_count < 2:
+        return keep
+
+    window_radius = np.asarray(window_radius)
+    cells = peak_indexes // (window_radius + 1)
+    # One empty cell on both sides, so the neighbours of every cell lie inside the grid.
+    cells += 1 - cells.min(axis=0)
+    grid_shape = tuple(cells.max(axis=0) + 2)
+    cell_keys = np.ravel_multi_index(cells.T, grid_shape)
+    cell_order = np.argsort(cell_keys, kind='stable')
+    sorted_keys = cell_keys[cell_order]
+
+    for offset in itertools.product((-1, 0, 1), repeat=dimensions):
+        neighbour_keys = np.ravel_multi_index((cells + offset).T, grid_shape)
+        first_neighbours = np.searchsorted(sorted_keys, neighbour_keys, side='left')
+        neighbour_counts = np.searchsorted(sorted_keys, neighbour_keys, side='right') - first_neighbours
+        # Every pair of a peak and a peak in the neighbouring cell.
+        peaks = np.repeat(np.arange(peak_count), neighbour_counts)
+        pair_offsets = np.arange(len(peaks)) - np.repeat(np.cumsum(neighbour_counts) - neighbour_counts,
+                                                         neighbour_counts)
+        neighbours = cell_order[np.repeat(first_neighbours, neighbour_counts) + pair_offsets]
+
+        # Only peaks that come earlier suppress a peak.
+        suppressing = neighbours < peaks
+        for dimension in range(dimensions):
+            suppressing &= np.abs(peak_indexes[peaks, dimension] - peak_indexes[neighbours, dimension]) <= \
+                window_radius[dimension]
+        keep[peaks[suppressing]] = False
+    return keep
+
 
-    Searches for a specified range of radii.
+def find_volume_peaks(accumulator_volume, radii, threshold=0.5, spatial_radius=None, radius_radius=None):
+    """
+    Finds the local maxima of an accumulator volume.
+
+    A value is a peak when it is the maximum of the 3d box around it and passes the threshold. The box contains
+    ``radius_radius`` radii and ``spatial_radius`` pixels on both sides of the value. Peaks whose circle center lies
+    within a radius of the border of the image are skipped. When several values in a box share the maximum, only the
+    first one (smallest radius, then top, then left) is kept. The layers are searched one at a time with a sliding
+    window along the radius, see ``_stream_volume_peaks``.
+
+    Parameters
+    ----------
+    accumulator_volume: numpy.ndarray
+        (radius, y, x) accumulator volume, see ``accumulate_radius_range``.
+    radii: range
+        The radius of every layer of the volume.
+    threshold: float
+        Minimum value to be considered a peak.
+    spatial_radius: int
+        Radius of the box along x and y. Half of the smallest radius when not given.
+    radius_radius: int
+        Radius of the box along the radius. Half of the smallest radius when not given.
+
+    Returns
+    -------
+    tuple: (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        x, y, radius and score of every found circle.
+    """
+    found_circles = _stream_volume_peaks(iter(accumulator_volume), radii, accumulator_volume.shape[1:], threshold,
+                                         spatial_radius, radius_radius)
+    return _collect_volume_peaks(found_circles, radii)
+
+
+def peak_windows(radii, spatial_radius=None, radius_radius=None):
+    """Fills in the default window radii of ``find_volume_peaks``: half of the smallest radius."""
+    if spatial_radius is None:
+        spatial_radius = max(radii[0] // 2, 1)
+    if radius_radius is None:
+        radius_radius = max(radii[0] // 2, 1)
+    return spatial_radius, radius_radius
+
+
+def _stream_volume_peaks(accumulators, radii, shape, threshold=0.5, spatial_radius=None, radius_radius=None):
+    """
+    Finds the peaks of the accumulators of a range of radii, one radius at a time.
+
+    Finds the same circles as ``find_volume_peaks``, but the accumulators are read one at a time and the circles of a
+    radius are yielded as soon as the accumulators of its neighbourhood along the radius have been read. The maximum
+    along the radius slides over the spatial maxima of the layers, see ``calc.sliding_maximum_stream``, so only the
+    layers of about two windows are kept in memory.
+
+    Parameters
+    ----------
+    accumulators: iterator [numpy.ndarray]
+        The accumulator of every radius, in order, see ``radius_accumulators``.
+    radii: range
+        The radius of every accumulator.
+    shape: tuple (int, int)
+        Height and width of the image.
+    threshold: float
+        Minimum value to be considered a peak.
+    spatial_radius: int
+        Radius of the box along x and y.
+    radius_radius: int
+        Radius of the box along the radius.
+
+    Yields
+    ------
+    tuple: (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray, int)
+        x, y, radius and score of the circles of the next radius, and its amount of candidates inside the border, for
+        every radius.
+    """
+    spatial_radius, radius_radius = peak_windows(radii, spatial_radius, radius_radius)
+    window_radius = (radius_radius, spatial_radius, spatial_radius)
+    height, width = shape
+    # Accumulators whose peaks have not been searched yet, the oldest first.
+    waiting_layers = collections.deque()
+
+    def spatial_maxima():
+        for accumulator in accumulators:
+            waiting_layers.append(accumulator)
+            yield calc.maximum_filter(accumulator, spatial_radius)
+
+    # Candidates of the previous radii that can still tie with later candidates.
+    previous_candidates = np.zeros((0, 3), dtype=np.intp)
+    local_maxima = calc.sliding_maximum_stream(spatial_maxima(), radius_radius)
+    for radius_index, local_maximum in enumerate(local_maxima):
+        radius = radii[radius_index]
+        values = waiting_layers.popleft()
+
+        y, x = np.nonzero((values == local_maximum) & (values > threshold))
+        # Skips circles whose center lies too close to the border.
+        inside = (y >= radius) & (y < height - radius) & (x >= radius) & (x < width - radius)
+        candidates = np.stack((np.full(np.count_nonzero(inside), radius_index), y[inside], x[inside]), axis=1)
+
+        previous_candidates = previous_candidates[previous_candidates[:, 0] >= radius_index - radius_radius]
+        keep = _first_of_ties(np.concatenate((previous_candidates, candidates)), window_radius)
+        keep = keep[len(previous_candidates):]
+        previous_candidates = np.concatenate((previous_candidates, candidates))
+
+        found_y = candidates[keep, 1]
+        found_x = candidates[keep, 2]
+        yield found_x, found_y, np.full(len(found_x), radius), values[found_y, found_x], len(candidates)
+
+
+def _collect_volume_peaks(found_circles, radii):
+    """
+    Joins the circles of every radius found by ``_stream_volume_peaks``.
+
+    Returns
+    -------
+    tuple: (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        x, y, radius and score of every found circle.
+    """
+    x, y, found_radii, scores, candidate_counts = zip(*found_circles)
+    if instrumentation.enabled():
+        instrumentation.annotate(candidates={int(radius): count for radius, count in zip(radii, candidate_counts)
+                                             if count})
+    return (np.concatenate(x), np.concatenate(y), np.concatenate(found_radii),
+            np.concatenate(scores).astype(np.float32))
+
+
+def _volume_peak_candidates(accumulator_volume, spatial_maximum, radius_radius, threshold, first_radius, end_radius):
+    """
+    Finds the values of some layers of an accumulator volume that are the maximum of their 3d box.
+
+    Only the layers from index ``first_radius`` up to ``end_radius`` are searched, but their boxes reach into the
+    neighbouring layers, so the candidates of consecutive ranges of layers add up to the candidates of the volume.
+
+    Parameters
+    ----------
+    accumulator_volume: numpy.ndarray
+        (radius, y, x) accumulator volume, see ``accumulate_radius_range``.
+    spatial_maximum: numpy.ndarray
+        The maximum filter along x and y of every layer of the volume.
+    radius_radius: int
+        Radius of the box along the radius.
+    threshold: float
+        Minimum value to be considered a peak.
+    first_radius: int
+        Index of the first layer to search.
+    end_radius: int
+        Index after the last layer to search.
+
+    Returns
+    -------
+    numpy.ndarray
+        (candidate count, 3) array with the (radius index, y, x) of every candidate, sorted.
+    """
+    radius_count, height, width = accumulator_volume.shape
+    first_window = max(first_radius - radius_radius, 0)
+    end_window = min(end_radius + radius_radius, radius_count)
+    core = slice(first_radius - first_window, end_radius - first_window)
+
+    peak_indexes = [np.zeros((0, 3), dtype=np.intp)]
+    # Slides along the radius in chunks of rows to bound the memory use.
+    row_chunk = max(vote_chunk_size // max((end_window - first_window) * width, 1), 1)
+    for start_row in range(0, height, row_chunk):
+        rows = slice(start_row, start_row + row_chunk)
+        local_maximum = calc.sliding_maximum(spatial_maximum[first_window:end_window, rows], radius_radius,
+                                             axis=0)[core]
+        chunk_values = accumulator_volume[first_radius:end_radius, rows]
+        radius_indexes, y, x = np.nonzero((chunk_values == local_maximum) & (chunk_values > threshold))
+        peak_indexes.append(np.stack((radius_indexes + first_radius, y + start_row, x), axis=1))
+
+    peak_indexes = np.concatenate(peak_indexes)
+    return peak_indexes[np.lexsort(peak_indexes.T[::-1])]
+
+
+def _annotate_candidates(peak_indexes, radii):
+    """Adds the amount of peak candidates of every radius with candidates to the running stage."""
+    if instrumentation.enabled():
+        counts = np.bincount(peak_indexes[:, 0], minlength=len(radii))
+        instrumentation.annotate(candidates={int(radii[index]): int(counts[index]) for index in np.flatnonzero(counts)})
+
+
+def _select_volume_peaks(peak_indexes, accumulator_volume, radii, spatial_radius, radius_radius):
+    """
+    Selects the circles among the sorted candidates of ``_volume_peak_candidates``.
+
+    Skips the candidates whose circle does not fit inside the image and keeps the first of every group of tied
+    candidates.
+
+    Returns
+    -------
+    tuple: (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        x, y, radius and score of every found circle.
+    """
+    _annotate_candidates(peak_indexes, radii)
+    radius_count, height, width = accumulator_volume.shape
+    radius_indexes, y, x = peak_indexes.T
+    peak_radii = np.asarray(radii)[radius_indexes]
+
+    # Skips circles whose center lies too close to the border.
+    inside = (y >= peak_radii) & (y < height - peak_radii) & (x >= peak_radii) & (x < width - peak_radii)
+    keep = np.nonzero(inside)[0]
+    keep = keep[_first_of_ties(peak_indexes[keep], (radius_radius, spatial_radius, spatial_radius))]
+
+    scores = accumulator_volume[radius_indexes[keep], y[keep], x[keep]]
+    return x[keep], y[keep], peak_radii[keep], scores
+
+
+def _share_array(array):
+    """Copies an array into a new shared memory block, returns the block and its ('memory', name, shape, dtype) spec."""
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+    return block, ('memory', block.name, array.shape, array.dtype.str)
+
+
+def _open_shared_plane(plane_spec):
+    """Opens a plane of ``find_circles_parallel`` from its spec, returns the shared memory block (or None) and array."""
+    storage, location, shape, dtype = plane_spec
+    if storage == 'file':
+        return None, scratch.open_shared_file(location, shape, dtype)
+    block = shared_memory.SharedMemory(name=location)
+    return block, np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+def _attach_shared_planes(plane_specs, scratch_settings=(None, None)):
+    """
+    Attaches a worker process to the shared planes of ``find_circles_parallel``.
+
+    The workers share the resource tracker of the parent process, which owns the shared memory blocks and unlinks them.
+    The workers also get the memory threshold and scratch directory of the parent, see ``scratch.configure``.
+    """
+    scratch.configure(*scratch_settings)
+    for plane_name, plane_spec in plane_specs.items():
+        _shared_planes[plane_name] = _open_shared_plane(plane_spec)
+
+
+def _accumulate_shard(radius_indexes, radii, engine, angular_tolerance, spatial_radius):
+    """
+    Fills the shared accumulator volume and its spatial maximum for some radii, in a worker process.
+
+    Every accumulator is written straight into the shared volume as soon as it is computed, so a worker holds only one
+    private layer at a time.
+    """
+    edge_map = _shared_planes['edge_map'][1]
+    accumulator_volume = _shared_planes['accumulator_volume'][1]
+    spatial_maximum = _shared_planes['spatial_maximum'][1]
+
+    edge_indexes = np.nonzero(edge_map)
+    orientations = _shared_planes['orientation'][1][edge_indexes] if engine == 'gradient' else None
+    shard_radii = [radii[radius_index] for radius_index in radius_indexes]
+
+    accumulators = radius_accumulators(edge_indexes, edge_map.shape, shard_radii, engine, orientations,
+                                       angular_tolerance)
+    for radius_index, accumulator in zip(radius_indexes, accumulators):
+        accumulator_volume[radius_index] = accumulator
+        spatial_maximum[radius_index] = calc.maximum_filter(accumulator, spatial_radius)
+
+
+def _shard_peak_candidates(first_radius, end_radius, radius_radius, threshold):
+    """Finds the peak candidates of a range of layers of the shared accumulator volume, in a worker process."""
+    return _volume_peak_candidates(_shared_planes['accumulator_volume'][1], _shared_planes['spatial_maximum'][1],
+                                   radius_radius, threshold, first_radius, end_radius)
+
+
+def find_circles_parallel(value_table, radii, workers, threshold=0.5, spatial_radius=None, radius_radius=None,
+                          engine='auto', angular_tolerance=default_angular_tolerance):
+    """
+    Searches the image inside the pixel table for circles with a radius inside a range, using several processes.
+
+    The edge map and the orientation plane are published once through shared memory, together with the accumulator
+    volume and its spatial maximum filter. The radii are split across a pool of worker processes in two rounds:
+    - Every worker accumulates a shard of radii and filters them along x and y. The radii are dealt out in turns, so
+      every worker gets small and large radii.
+    - Every worker searches a consecutive range of layers for peak candidates, looking into the neighbouring layers.
+    The parent merges the candidates of all workers and selects the circles among them. Every step computes the same
+    values as ``find_volume_peaks``, so the found circles equal those of the serial search.
 
     Parameters
     ----------
     value_table: pix.PixelTable
-        The table matrix containing all the values of the edges. The objects inside pixel table have to have a cache
-        attribute the function can use.
-    size: int
-        Signifies the range of radii to look for.
+        The table matrix containing all the values of the edges.
+    radii: range
+        The radii to look for.
+    workers: int
+        Amount of worker processes. All cpus are used when None.
+    threshold: float
+        Minimum fraction of a circle that has to lie on edges.
+    spatial_radius: int
+        Radius of the neighbourhood along x and y in which only one circle is found.
+    radius_radius: int
+        Radius of the neighbourhood along the radius in which only one circle is found.
+    engine: str
+        How the edge pixels vote, see ``accumulate_radius_range``.
+    angular_tolerance: float
+        Maximum deviation from the gradient in radians at which the 'gradient' engine votes.
 
     Returns
     -------
-    dict: {int: [(int, int)]}
-        Radii with a list containing the centers of the found circles of that radius.
+    tuple: (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        x, y, radius and score of every found circle.
     """
-    radius_range = {0: range(10, 201),
-                    1: range(6, 15),
-                    2: range(15, 31),
-                    3: range(30, 101),
-                    4: range(60, 101),
-                    5: range(100, 201)}
+    if engine not in voting_engines:
+        raise ValueError("Unknown voting engine '{}', use one of {}.".format(engine, ', '.join(voting_engines)))
+    if workers is None:
+        workers = os.cpu_count() or 1
+    spatial_radius, radius_radius = peak_windows(radii, spatial_radius, radius_radius)
+    radii = list(radii)
+    volume_shape = (len(radii),) + value_table.shape
+    volume_bytes = int(np.prod(volume_shape)) * np.dtype(np.float32).itemsize
+
+    blocks = dict()
+    scratch_files = list()
+    plane_specs = dict()
+    # View on the shared accumulator volume, released before the shared memory and the files.
+    accumulator_volume = None
+    try:
+        for plane_name, plane in (('edge_map', value_table.on), ('orientation', value_table.orientation)):
+            blocks[plane_name], plane_specs[plane_name] = _share_array(plane)
+        for plane_name in ('accumulator_volume', 'spatial_maximum'):
+            # Volumes larger than the memory threshold are shared through memory-mapped files instead.
+            if scratch.spills(volume_shape, np.float32):
+                scratch_files.append(scratch.create_shared_file(volume_shape, np.float32))
+                plane_specs[plane_name] = ('file', scratch_files[-1], volume_shape, np.dtype(np.float32).str)
+            else:
+                blocks[plane_name] = shared_memory.SharedMemory(create=True, size=max(volume_bytes, 1))
+                plane_specs[plane_name] = ('memory', blocks[plane_name].name, volume_shape, np.dtype(np.float32).str)
+
+        shard_count = max(min(workers, len(radii)), 1)
+        with futures.ProcessPoolExecutor(max_workers=shard_count, initializer=_attach_shared_planes,
+                                         initargs=(plane_specs, scratch.settings())) as pool:
+            accumulated = [pool.submit(_accumulate_shard, list(range(shard, len(radii), shard_count)), radii,
+                                       engine, angular_tolerance, spatial_radius)
+                           for shard in range(shard_count)]
+            for shard in accumulated:
+                shard.result()
 
-    potential_circle_centers = dict()
-    for radius in radius_range[size]:
-        potential_circle_centers[radius] = find_circles_set_radius(value_table, radius)
+            layer_ranges = np.array_split(np.arange(len(radii)), shard_count)
+            candidates = [pool.submit(_shard_peak_candidates, int(layers[0]), int(layers[-1]) + 1, radius_radius,
+                                      threshold)
+                          for layers in layer_ranges if len(layers)]
+            # The ranges are consecutive, so the merged candidates stay sorted.
+            peak_indexes = np.concatenate([shard.result() for shard in candidates])
 
+        if 'accumulator_volume' in blocks:
+            accumulator_volume = np.ndarray(volume_shape, dtype=np.float32, buffer=blocks['accumulator_volume'].buf)
+        else:
+            accumulator_volume = scratch.open_shared_file(scratch_files[0], volume_shape, np.float32)
+        return _select_volume_peaks(peak_indexes, accumulator_volume, radii, spatial_radius, radius_radius)
+    finally:
+        # The shared memory and the files can only be released when no array uses them anymore.
+        accumulator_volume = None
+        # Every block and file is released even when another one fails, which would hide the original error.
+        for block in blocks.values():
+            try:
+                block.close()
+            except BufferError:
+                pass
+            try:
+                block.unlink()
+            except OSError:
+                pass
+        for scratch_file in scratch_files:
+            try:
+                os.remove(scratch_file)
+            except OSError:
+                pass
+
+
+@instrumentation.stage('hough')
+def find_circles_radius_range(value_table, radii, threshold=0.5, spatial_radius=None, radius_radius=None,
+                              engine='auto', angular_tolerance=default_angular_tolerance, workers=1):
     """
-    Search for the maximum in nearby 3d space. 
+    Searches the image inside the pixel table for circles with a radius inside a range.
+
+    Builds the accumulators of the radii one at a time and searches them for 3d local maxima with a sliding window
+    along the radius, see ``find_volume_peaks``, so the whole accumulator volume is never held in memory. With more
+    than one worker the search is split across processes, see ``find_circles_parallel``.
 
-    The first two dimensions are the x and y axis in the image (width and height). The last dimension is the radius 
-    size.
-    Searches for a higher peak near the given circle center.
+    Parameters
+    ----------
+    value_table: pix.PixelTable
+        The table matrix containing all the values of the edges.
+    radii: range
+        The radii to look for.
+    threshold: float
+        Minimum fraction of a circle that has to lie on edges.
+    spatial_radius: int
+        Radius of the neighbourhood along x and y in which only one circle is found.
+    radius_radius: int
+        Radius of the neighbourhood along the radius in which only one circle is found.
+    engine: str
+        How the edge pixels vote, see ``accumulate_radius_range``.
+    angular_tolerance: float
+        Maximum deviation from the gradient in radians at which the 'gradient' engine votes.
+    workers: int
+        Amount of worker processes. All cpus are used when None.
+
+    Returns
+    -------
+    tuple: (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        x, y, radius and score of every found circle.
     """
-    circle_centers = dict()
+    instrumentation.annotate(first_radius=radii[0], last_radius=radii[-1], engine=engine, workers=workers)
+    if workers != 1:
+        found_circles = find_circles_parallel(value_table, radii, workers, threshold, spatial_radius, radius_radius,
+                                              engine, angular_tolerance)
+    else:
+        edge_indexes = edge_points(value_table)
+        instrumentation.annotate(edge_pixels=len(edge_indexes[0]))
+        orientations = edge_orientations(value_table, edge_indexes) if engine == 'gradient' else None
+        accumulators = radius_accumulators(edge_indexes, value_table.shape, radii, engine, orientations,
+                                           angular_tolerance)
+        found_circles = _collect_volume_peaks(_stream_volume_peaks(accumulators, radii, value_table.shape, threshold,
+                                                                   spatial_radius, radius_radius), radii)
+    instrumentation.annotate(circles=len(found_circles[0]))
+    return found_circles
+
+
+def pyramid_factor(radii, smallest_coarse_radius=8):
+    """
+    Chooses how much the edge map can be downsampled for a range of radii.
+
+    The factor is the largest power of two that keeps the smallest radius at ``smallest_coarse_radius`` pixels or more,
+    so the circles are still recognisable in the downsampled edge map.
 
-    wanted_count = len(potential_circle_centers)
-    count = 0
-    while count != wanted_count:
-        count = 0
-        for radius in potential_circle_centers:
-            if len(potential_circle_centers[radius]) == 0:
-                count += 1
+    Parameters
+    ----------
+    radii: range
+        The radii to look for.
+    smallest_coarse_radius: int
+        Smallest radius of the downsampled circles.
+
+    Returns
+    -------
+    int
+        The downsampling factor, 1 when the radii are too small to downsample.
+    """
+    factor = 1
+    while radii[0] // (2 * factor) >= smallest_coarse_radius:
+        factor *= 2
+    return factor
+
+
+def downsample_edges(edge_map, factor):
+    """
+    Downsamples an edge map by turning on every block of ``factor`` x ``factor`` pixels that contains an edge.
+
+    Parameters
+    ----------
+    edge_map: numpy.ndarray
+        Boolean plane with the edge pixels.
+    factor: int
+        Size of the blocks.
+
+    Returns
+    -------
+    numpy.ndarray
+        Boolean plane with one pixel per block. Blocks at the bottom and right border may be incomplete.
+    """
+    height, width = edge_map.shape
+    coarse_height = -(-height // factor)
+    coarse_width = -(-width // factor)
+    padded_map = np.zeros((coarse_height * factor, coarse_width * factor), dtype=bool)
+    padded_map[:height, :width] = edge_map
+    return padded_map.reshape(coarse_height, factor, coarse_width, factor).any(axis=(1, 3))
+
+
+def refine_circles(edge_map, x, y, radii, search_radii, window, radius_window, threshold=0.5):
+    """
+    Refines approximate circles by searching their best center and radius in a small window.
+
+    For every approximate circle, the fraction of the circle on the edges is computed for every center within
+    ``window`` pixels and every radius within ``radius_window`` of the approximate radius, like
+    ``draw_around_pixels`` would.
+    The best circle of the window is kept when it passes the threshold. Circles that do not fit inside the image are
+    skipped.
+
+    Parameters
+    ----------
+    edge_map: numpy.ndarray
+        Boolean plane with the edge pixels.
+    x: numpy.ndarray
+        Approximate x coordinate of the center of every circle.
+    y: numpy.ndarray
+        Approximate y coordinate of the center of every circle.
+    radii: numpy.ndarray
+        Approximate radius of every circle.
+    search_radii: range
+        The radii that can be found.
+    window: int
+        Distance in pixels over which the centers are refined.
+    radius_window: int
+        Distance in radii over which the radii are refined.
+    threshold: float
+        Minimum fraction of a circle that has to lie on edges.
+
+    Returns
+    -------
+    tuple: (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        x, y, radius and score of every refined circle.
+    """
+    height, width = edge_map.shape
+    window_y, window_x = np.indices((2 * window + 1, 2 * window + 1)).reshape(2, -1) - window
+    refined = list()
+    for center_x, center_y, radius in zip(x.tolist(), y.tolist(), radii.tolist()):
+        best_circle = None
+        for search_radius in range(max(radius - radius_window, search_radii[0]),
+                                   min(radius + radius_window, search_radii[-1]) + 1):
+            centers_x = center_x + window_x
+            centers_y = center_y + window_y
+            inside = (centers_y >= search_radius) & (centers_y < height - search_radius) & \
+                     (centers_x >= search_radius) & (centers_x < width - search_radius)
+            if not inside.any():
                 continue
-            if radius not in circle_centers:
-                circle_centers[radius] = list()
+            x_shifts, y_shifts = shapes.circle_stencil(search_radius)
+            hits = edge_map[centers_y[inside, np.newaxis] + y_shifts, centers_x[inside, np.newaxis] + x_shifts]
+            scores = hits.sum(axis=1, dtype=np.int64).astype(np.float32) * np.float32(1 / len(x_shifts))
+            best = np.argmax(scores)
+            # A larger radius only wins with a strictly better score, like the peaks of ``find_volume_peaks``.
+            if best_circle is None or scores[best] > best_circle[3]:
+                best_circle = (centers_x[inside][best], centers_y[inside][best], search_radius, scores[best])
+        if best_circle is not None and best_circle[3] > threshold:
+            refined.append(best_circle)
 
-            x_coordinate, y_coordinate, magnitude = potential_circle_centers[radius][0]
-            radius_3d_space = radius // 2
-            magnitude_3d_space = constructs_magnitudes_in_3d_space(potential_circle_centers,
-                                                                   x_coordinate,
-                                                                   y_coordinate,
-                                                                   radius,
-                                                                   radius_3d_space,
-                                                                   delete=True)
+    if not refined:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp), \
+            np.zeros(0, dtype=np.float32)
+    refined_x, refined_y, refined_radii, scores = (np.array(values) for values in zip(*refined))
+    return refined_x, refined_y, refined_radii, scores.astype(np.float32)
 
-            magnitude_index, biggest_magnitude = calc.local_maximum_3d(magnitude_3d_space)
-            magnitude_index = (magnitude_index[0] + x_coordinate - radius_3d_space,
-                               magnitude_index[1] + y_coordinate - radius_3d_space)
 
-            circle_centers[radius].append(magnitude_index)
+@instrumentation.stage('hough_pyramid')
+def find_circles_pyramid(value_table, radii, factor=None, threshold=0.5, spatial_radius=None, radius_radius=None,
+                         engine='auto'):
+    """
+    Searches the image inside the pixel table for circles with a coarse-to-fine search.
 
-    return circle_centers
+    The edge map is downsampled by the factor, see ``downsample_edges``, and searched for circles with the radii
+    scaled down by the same factor. Every coarse circle is then refined at full resolution around its scaled up
+    center and radius, see ``refine_circles``: the center within one block, the radius within the neighbourhood along
+    the radius (or two blocks, when larger), because the coarse search merges the circles in that neighbourhood.
+    Circles that are refined into the same circle are merged. Only these windows are searched at full resolution, so
+    large circles are found much faster than by ``find_circles_radius_range``. Radii that are too small to
+    downsample are searched by ``find_circles_radius_range``.
 
+    Parameters
+    ----------
+    value_table: pix.PixelTable
+        The table matrix containing all the values of the edges.
+    radii: range
+        The radii to look for.
+    factor: int
+        Downsampling factor. Chosen by ``pyramid_factor`` when not given.
+    threshold: float
+        Minimum fraction of a circle that has to lie on edges.
+    spatial_radius: int
+        Radius of the neighbourhood along x and y in which only one circle is found.
+    radius_radius: int
+        Radius of the neighbourhood along the radius in which only one circle is found.
+    engine: str
+        How the edge pixels vote in the downsampled search: 'auto', 'circle' or 'fft'.
 
-def constructs_magnitudes_in_3d_space(data_dict, x_start, y_start, z_start, radius=10, delete=False):
+    Returns
+    -------
+    tuple: (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        x, y, radius and score of every found circle.
     """
-    Constructs a 3d matrix.
+    if engine not in ('auto', 'circle', 'fft'):
+        raise ValueError("The pyramid search only supports the 'auto', 'circle' and 'fft' engines.")
+    if factor is None:
+        factor = pyramid_factor(radii)
+    if factor == 1:
+        return find_circles_radius_range(value_table, radii, threshold, spatial_radius, radius_radius, engine)
+    spatial_radius, radius_radius = peak_windows(radii, spatial_radius, radius_radius)
+    instrumentation.annotate(first_radius=radii[0], last_radius=radii[-1], engine=engine, factor=factor)
+
+    coarse_map = downsample_edges(value_table.on, factor)
+    coarse_radii = range(max(radii[0] // factor, 1), -(-radii[-1] // factor) + 1)
+    coarse_accumulators = radius_accumulators(np.nonzero(coarse_map), coarse_map.shape, coarse_radii, engine)
+    coarse_x, coarse_y, coarse_found_radii, coarse_scores = _collect_volume_peaks(_stream_volume_peaks(
+        coarse_accumulators, coarse_radii, coarse_map.shape, threshold, max(spatial_radius // factor, 1),
+        max(radius_radius // factor, 1)), coarse_radii)
+    instrumentation.annotate(coarse_circles=len(coarse_x))
+
+    x, y, found_radii, scores = refine_circles(value_table.on, coarse_x * factor + factor // 2,
+                                               coarse_y * factor + factor // 2, coarse_found_radii * factor, radii,
+                                               factor, max(2 * factor, radius_radius), threshold)
+    found_circles = merge_circles(x, y, found_radii, scores, spatial_radius, radius_radius)
+    instrumentation.annotate(circles=len(found_circles[0]))
+    return found_circles
 
-    The 3d matrix is filled with the pixels cache of every pixel inside the bounds of the parameters.
-    Z is the key in the dictionary. All values will be searched with a range of radius in both positive and negative
-    direction. All values that can't be found will be assigned 0.
+
+def stream_circles_radius_range(value_table, radii, threshold=0.5, spatial_radius=None, radius_radius=None,
+                                engine='auto', angular_tolerance=default_angular_tolerance):
+    """
+    Searches the image inside the pixel table for circles with a radius inside a range, yielding them per radius.
+
+    The radii are accumulated one at a time, from small to large. The circles of a radius are final as soon as the
+    radii in its neighbourhood along the radius have been accumulated, and are yielded right away, see
+    ``_stream_volume_peaks``. Only the layers of about two neighbourhoods are kept in memory, and every radius costs
+    the same however wide its neighbourhood. Together the yielded circles equal those of ``find_circles_radius_range``.
 
     Parameters
     ----------
-    data_dict: dict {int: [(int, int)]}
-        Dictionary containing point in the 3d space.
-    x_start: int
-        x coordinate of the center.
-    y_start: int
-        y coordinate of the center.
-    z_start: int
-        z coordinate of the center.
-    radius: int
-        Radius of the 3d space to construct around the center.
-    delete: bool
-        Deletes all values put into the 3d space from ``data_dict``.
+    value_table: pix.PixelTable
+        The table matrix containing all the values of the edges.
+    radii: range
+        The radii to look for.
+    threshold: float
+        Minimum fraction of a circle that has to lie on edges.
+    spatial_radius: int
+        Radius of the neighbourhood along x and y in which only one circle is found.
+    radius_radius: int
+        Radius of the neighbourhood along the radius in which only one circle is found.
+    engine: str
+        How the edge pixels vote, see ``accumulate_radius_range``.
+    angular_tolerance: float
+        Maximum deviation from the gradient in radians at which the 'gradient' engine votes.
+
+    Yields
+    ------
+    tuple: (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        x, y, radius and score of the circles of the next radius, for every radius. Can be empty.
+    """
+    # Reports a 'hough_stream_radius' event for every radius. Its wall time excludes the time spent by the consumer.
+    resumed = time.perf_counter()
+    edge_indexes = edge_points(value_table)
+    orientations = edge_orientations(value_table, edge_indexes) if engine == 'gradient' else None
+    accumulators = radius_accumulators(edge_indexes, value_table.shape, radii, engine, orientations,
+                                       angular_tolerance)
+
+    found_circles = _stream_volume_peaks(accumulators, radii, value_table.shape, threshold, spatial_radius,
+                                         radius_radius)
+    for radius, (x, y, found_radii, scores, candidate_count) in zip(radii, found_circles):
+        instrumentation.emit('hough_stream_radius', radius=radius, engine=engine, candidates=candidate_count,
+                             circles=len(x), wall_time=time.perf_counter() - resumed)
+        yield x, y, found_radii, scores
+        resumed = time.perf_counter()
+
+
+def merge_circles(x, y, radii, scores, spatial_radius, radius_radius):
+    """
+    Merges circles that were found more than once, for example by neighbouring tiles.
+
+    A circle is dropped when a stronger circle lies within its window: at most ``spatial_radius`` pixels away along x
+    and y, and with a radius that differs at most ``radius_radius``. Of equally strong circles the first one is kept.
+
+    Parameters
+    ----------
+    x: numpy.ndarray
+        x coordinate of the center of every circle.
+    y: numpy.ndarray
+        y coordinate of the center of every circle.
+    radii: numpy.ndarray
+        Radius of every circle.
+    scores: numpy.ndarray
+        Score of every circle.
+    spatial_radius: int
+        Radius of the window along x and y.
+    radius_radius: int
+        Radius of the window along the radius.
 
     Returns
     -------
-    numpy.ndarray
-        The constructed 3d space.
+    tuple: (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        x, y, radius and score of the remaining circles, sorted by radius, y and x.
     """
-    magnitude_3d_space = np.zeros((radius * 2, radius * 2, radius * 2))
+    strongest_first = np.argsort(-scores, kind='stable')
+    circle_indexes = np.stack((radii, y, x), axis=1)[strongest_first]
+    keep = strongest_first[_first_of_ties(circle_indexes, (radius_radius, spatial_radius, spatial_radius))]
+    keep = keep[np.lexsort((x[keep], y[keep], radii[keep]))]
+    return x[keep], y[keep], radii[keep], scores[keep]
 
-    for height_index in range(radius * 2):
-        try:
-            circle_centers = data_dict[z_start + height_index - radius]
-        except KeyError:
-            continue
 
-        # searches for peaks that are located nearby.
-        nearby_peaks = [(x, y, magnitude) for x, y, magnitude in circle_centers
-                        if x_start - radius <= x < x_start + radius
-                        and y_start - radius <= y < y_start + radius]
-        for x, y, magnitude in nearby_peaks:
-            magnitude_3d_space[height_index][y + radius - y_start][x + radius - x_start] = magnitude
-            if delete:
-                list_with_centers = data_dict[z_start + height_index - radius]
-                list_with_centers.remove((x, y, magnitude))
-
-    return magnitude_3d_space
+def circles_per_radius(x, y, radii):
+    """
+    Groups found circles by their radius.
+
+    Parameters
+    ----------
+    x: numpy.ndarray
+        x coordinate of the center of every circle.
+    y: numpy.ndarray
+        y coordinate of the center of every circle.
+    radii: numpy.ndarray
+        Radius of every circle.
+
+    Returns
+    -------
+    dict: {int: [(int, int)]}
+        Radii with a list containing the centers of the found circles of that radius.
+    """
+    circle_centers = dict()
+    for center_x, center_y, radius in zip(x.tolist(), y.tolist(), radii.tolist()):
+        circle_centers.setdefault(radius, list()).append((center_x, center_y))
+    return circle_centers
+
+
+def find_circles_unset_size(value_table, size=2, engine='auto', angular_tolerance=default_angular_tolerance,
+                            workers=1, pyramid=False):
+    """
+    Searches the image inside the pixel table for circles.
+
+    Searches for a specified range of radii. Searches for the maximum in nearby 3d space: the first two dimensions
+    are the x and y axis in the image (width and height), the last dimension is the radius size.
+
+    Parameters
+    ----------
+    value_table: pix.PixelTable
+        The table matrix containing all the values of the edges.
+    size: int
+        Signifies the range of radii to look for.
+    engine: str
+        How the edge pixels vote, see ``accumulate_radius_range``.
+    angular_tolerance: float
+        Maximum deviation from the gradient in radians at which the 'gradient' engine votes.
+    workers: int
+        Amount of worker processes. All cpus are used when None.
+    pyramid: bool
+        Search coarse-to-fine, see ``find_circles_pyramid``. Does not use the workers.
+
+    Returns
+    -------
+    dict: {int: [(int, int)]}
+        Radii with a list containing the centers of the found circles of that radius.
+    """
+    if pyramid:
+        x, y, radii, scores = find_circles_pyramid(value_table, radius_ranges[size], engine=engine)
+    else:
+        x, y, radii, scores = find_circles_radius_range(value_table, radius_ranges[size], engine=engine,
+                                                        angular_tolerance=angular_tolerance, workers=workers)
+    return circles_per_radius(x, y, radii)
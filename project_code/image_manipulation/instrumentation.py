@@ -0,0 +1,237 @@
+import contextlib
+import functools
+import json
+import logging
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# The sinks that receive the events.
+_sinks = list()
+# Details and memory peaks of the stages that are running, the innermost stage last.
+_open_stages = list()
+# Trace the peak memory of every stage with tracemalloc. Slows down the stages that allocate a lot.
+trace_memory = False
+
+
+class LoggerSink:
+    """Logs every event as one line: the name of the event followed by its fields as key=value."""
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger if logger is not None else logging.getLogger('project_code')
+        self.level = level
+
+    def write(self, event):
+        fields = ' '.join('{}={}'.format(key, value) for key, value in event.items()
+                          if key not in ('event', 'timestamp'))
+        self.logger.log(self.level, '%s %s', event['event'], fields)
+
+
+class JsonLinesSink:
+    """Writes every event as one JSON object per line, to a file object or appended to the file with a given name."""
+    def __init__(self, file):
+        self.owns_file = isinstance(file, str)
+        self.file = open(file, 'a') if self.owns_file else file
+
+    def write(self, event):
+        self.file.write(json.dumps(event, default=_json_value) + '\n')
+        self.file.flush()
+
+    def close(self):
+        """Closes the file when the sink opened it."""
+        if self.owns_file:
+            self.file.close()
+
+
+class MemorySink:
+    """Collects every event in the list ``events``."""
+    def __init__(self):
+        self.events = list()
+
+    def write(self, event):
+        self.events.append(event)
+
+    def named(self, event_name):
+        """The collected events with a name, in order."""
+        return [event for event in self.events if event['event'] == event_name]
+
+
+def _json_value(value):
+    """Converts numpy scalars and arrays, which json can not write, to python values."""
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(value).__name__))
+
+
+def add_sink(sink):
+    """Adds a sink that receives all following events."""
+    _sinks.append(sink)
+
+
+def remove_sink(sink):
+    """Removes a sink, it receives no more events."""
+    _sinks.remove(sink)
+
+
+def enabled():
+    """Whether any sink receives events. Guards details that cost time to compute."""
+    return bool(_sinks)
+
+
+@contextlib.contextmanager
+def recording(*sinks, memory=False):
+    """
+    Sends the events of the stages inside the with block to sinks.
+
+    Every stage reports an event with its name, wall time, cpu time and the details it adds with ``annotate``, such as
+    the amount of edge pixels or the amount of candidates per radius. Events of worker processes are only recorded
+    when the worker adds sinks itself.
+
+    Parameters
+    ----------
+    sinks: object
+        The sinks, objects with a ``write(event)`` method: a ``LoggerSink`` logs one line per event, a
+        ``JsonLinesSink`` writes one JSON object per line to a file and a ``MemorySink`` collects the events in a list.
+    memory: bool
+        Also trace the peak memory of every stage with tracemalloc, see ``trace_memory``.
+
+    Yields
+    ------
+    tuple
+        The sinks.
+    """
+    global trace_memory
+    previous_trace_memory = trace_memory
+    started_tracing = memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    trace_memory = previous_trace_memory or memory
+    for sink in sinks:
+        add_sink(sink)
+    try:
+        yield sinks
+    finally:
+        for sink in sinks:
+            remove_sink(sink)
+        trace_memory = previous_trace_memory
+        if started_tracing:
+            tracemalloc.stop()
+
+
+def emit(event_name, **fields):
+    """
+    Sends an event to every sink.
+
+    Parameters
+    ----------
+    event_name: str
+        Name of the event, the stage that reports it.
+    fields: object
+        The details of the event.
+
+    Returns
+    -------
+    None
+        The sinks received the event, with its name under 'event' and the time under 'timestamp'.
+    """
+    if not _sinks:
+        return
+    event = {'event': event_name, 'timestamp': time.time()}
+    event.update(fields)
+    for sink in list(_sinks):
+        sink.write(event)
+
+
+def annotate(**fields):
+    """Adds details to the event of the innermost running stage. Does nothing outside a measured stage."""
+    if _open_stages:
+        _open_stages[-1]['fields'].update(fields)
+
+
+def _max_rss():
+    """The peak resident memory of the process in bytes, None when the platform does not report it."""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in kilobytes, apart from macOS.
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+@contextlib.contextmanager
+def measure(stage_name, **fields):
+    """
+    Measures the stage inside the with block and reports it as an event, see ``emit``.
+
+    The event contains the fields, the details added with ``annotate``, 'wall_time' and 'cpu_time' in seconds, and
+    'max_rss', the peak resident memory of the process so far in bytes. With ``trace_memory`` it also contains
+    'peak_memory': the most memory the stage allocated on top of what was allocated when it started, in bytes.
+    Nothing is measured without sinks, so the stages only pay one check per call.
+
+    Parameters
+    ----------
+    stage_name: str
+        Name of the stage.
+    fields: object
+        Details of the stage that are known at the start.
+    """
+    if not _sinks:
+        yield
+        return
+
+    running_stage = {'fields': dict(fields), 'peak': 0}
+    tracing = trace_memory and tracemalloc.is_tracing()
+    if tracing:
+        current_memory, peak_memory = tracemalloc.get_traced_memory()
+        # The peak of the enclosing stage is kept before it is reset.
+        if _open_stages:
+            _open_stages[-1]['peak'] = max(_open_stages[-1]['peak'], peak_memory)
+        tracemalloc.reset_peak()
+        start_memory = current_memory
+    _open_stages.append(running_stage)
+    start_wall_time = time.perf_counter()
+    start_cpu_time = time.process_time()
+    try:
+        yield
+    finally:
+        wall_time = time.perf_counter() - start_wall_time
+        cpu_time = time.process_time() - start_cpu_time
+        _open_stages.pop()
+        event_fields = running_stage['fields']
+        event_fields.update(wall_time=wall_time, cpu_time=cpu_time, max_rss=_max_rss())
+        if tracing:
+            peak_memory = max(running_stage['peak'], tracemalloc.get_traced_memory()[1])
+            if _open_stages:
+                _open_stages[-1]['peak'] = max(_open_stages[-1]['peak'], peak_memory)
+            event_fields['peak_memory'] = max(peak_memory - start_memory, 0)
+        emit(stage_name, **event_fields)
+
+
+def stage(stage_name):
+    """
+    Decorates a function to measure every call as a stage, see ``measure``.
+
+    Without sinks the function is called directly.
+
+    Parameters
+    ----------
+    stage_name: str
+        Name of the stage.
+
+    Returns
+    -------
+    callable
+        The decorator.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def measured_function(*args, **kwargs):
+            if not _sinks:
+                return function(*args, **kwargs)
+            with measure(stage_name):
+                return function(*args, **kwargs)
+        return measured_function
+    return decorator
@@ -25,19 +25,22 @@ def gaussian_formula(x, sigma):
     return math.exp((x**2 / (2 * sigma ** 2)) * -1) / sigma * math.sqrt(2 * math.pi)
 
 
-def gaussian_kernel(size=5):
+def gaussian_kernel_1d(size=5):
     """
-    Creates a 2d Gaussian kernel.
+    Creates a 1d Gaussian kernel.
+
+    The 2d Gaussian kernel is the outer product of this kernel with itself, which allows the blur to be applied as
+    two 1d passes.
 
     Parameters
     ----------
     size : int
-        Size of x and y. Has to be uneven.
+        Length of the kernel. Has to be uneven.
 
     Returns
     -------
     numpy.ndarray
-        The created (``size`` x ``size``) gaussian kernel.
+        The created normalised gaussian kernel of length ``size``.
     """
     if size % 2 != 1:
         raise ValueError("Gaussian filter must have an uneven size.")
@@ -46,13 +49,27 @@ def gaussian_kernel(size=5):
     kernel_radius = size // 2
     sigma = kernel_radius / 2
 
-    # compute the actual kernel elements
-    gaussian_1d = [gaussian_formula(x - kernel_radius, sigma) for x in range(size)]
+    gaussian_1d = np.array([gaussian_formula(x - kernel_radius, sigma) for x in range(size)])
+
+    return gaussian_1d / gaussian_1d.sum()
+
+
+def gaussian_kernel(size=5):
+    """
+    Creates a 2d Gaussian kernel.
 
-    kernel_2d = [[row_weight * column_weight for row_weight in gaussian_1d] for column_weight in gaussian_1d]
+    The kernel is the outer product of ``gaussian_kernel_1d`` with itself, so the 2d and the separable blur use the
+    same weights.
 
-    # normalize the kernel elements
-    sum_kernel = sum([sum(row) for row in kernel_2d])
-    kernel_2d = [[x / sum_kernel for x in row] for row in kernel_2d]
+    Parameters
+    ----------
+    size : int
+        Size of x and y. Has to be uneven.
 
-    return np.array(kernel_2d)
+    Returns
+    -------
+    numpy.ndarray
+        The created (``size`` x ``size``) gaussian kernel.
+    """
+    gaussian_1d = gaussian_kernel_1d(size)
+    return np.outer(gaussian_1d, gaussian_1d)
@@ -0,0 +1,122 @@
+import os
+import tempfile
+
+import numpy as np
+
+# Arrays larger than this amount of bytes are memory-mapped. None keeps every array in RAM.
+memory_threshold = None
+# Directory of the memory-mapped files. The directory for temporary files when None.
+scratch_directory = None
+
+
+def configure(threshold=None, directory=None):
+    """
+    Sets the memory threshold and the scratch directory of this process.
+
+    Also used as the initializer of process pools, to give worker processes the settings of their parent.
+
+    Parameters
+    ----------
+    threshold: int
+        Arrays larger than this amount of bytes are memory-mapped. None keeps every array in RAM.
+    directory: str
+        Directory of the memory-mapped files. The directory for temporary files when None.
+
+    Returns
+    -------
+    None
+        The settings are stored in the module.
+    """
+    global memory_threshold, scratch_directory
+    memory_threshold = threshold
+    scratch_directory = directory
+
+
+def settings():
+    """The (memory threshold, scratch directory) of this process, the arguments of ``configure``."""
+    return memory_threshold, scratch_directory
+
+
+def spills(shape, dtype):
+    """Whether an array of the shape and dtype is larger than the memory threshold."""
+    array_bytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return memory_threshold is not None and array_bytes > max(memory_threshold, 0)
+
+
+def empty(shape, dtype=np.float32):
+    """
+    Allocates an uninitialized array, memory-mapped when it is larger than the memory threshold.
+
+    A memory-mapped array is stored in a file inside the scratch directory instead of RAM. The operating system keeps
+    only the parts in use in memory, so a search that needs more memory than is available becomes slower instead of
+    being killed. The file is removed from the directory right away, and freed by the operating system when the array
+    is released.
+
+    Parameters
+    ----------
+    shape: tuple (int)
+        Shape of the array.
+    dtype: numpy.dtype
+        Type of the array.
+
+    Returns
+    -------
+    numpy.ndarray
+        The array, a ``numpy.memmap`` when it spills to disk.
+    """
+    if not spills(shape, dtype):
+        return np.empty(shape, dtype=dtype)
+    with tempfile.TemporaryFile(prefix='scratch-', suffix='.dat', dir=scratch_directory) as scratch_file:
+        # The memory map keeps its own handle of the file.
+        return np.memmap(scratch_file, dtype=dtype, mode='w+', shape=shape)
+
+
+def zeros(shape, dtype=np.float32):
+    """Allocates an array filled with zeros, see ``empty``."""
+    if not spills(shape, dtype):
+        return np.zeros(shape, dtype=dtype)
+    # New files read as zeros.
+    return empty(shape, dtype)
+
+
+def full(shape, fill_value, dtype=np.float32):
+    """Allocates an array filled with a value, see ``empty``."""
+    array = empty(shape, dtype)
+    array.fill(fill_value)
+    return array
+
+
+def empty_like(array):
+    """Allocates an uninitialized array with the shape and dtype of another array, see ``empty``."""
+    return empty(array.shape, array.dtype)
+
+
+def create_shared_file(shape, dtype=np.float32):
+    """
+    Creates a named memory-mapped file that other processes can open, see ``open_shared_file``.
+
+    The caller removes the file when it is no longer used.
+
+    Parameters
+    ----------
+    shape: tuple (int)
+        Shape of the array.
+    dtype: numpy.dtype
+        Type of the array.
+
+    Returns
+    -------
+    str
+        Path of the file, which reads as an array filled with zeros.
+    """
+    file_descriptor, path = tempfile.mkstemp(prefix='scratch-', suffix='.dat', dir=scratch_directory)
+    with os.fdopen(file_descriptor, 'wb') as scratch_file:
+        scratch_file.truncate(int(np.prod(shape)) * np.dtype(dtype).itemsize)
+    return path
+
+
+def open_shared_file(path, shape, dtype=np.float32):
+    """Opens a file of ``create_shared_file`` as a writable array."""
+    if int(np.prod(shape)) == 0:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r+', shape=shape)
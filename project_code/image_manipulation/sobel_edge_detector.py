@@ -1,61 +1,105 @@
-from project_code.my_maths import \
-    select_from_matrix as select, \
-    trigonometry as trig
+from project_code.image_manipulation import \
+    standard_filters as apply_filter, \
+    instrumentation
 
+import numpy as np
 
-def sobel_calculation(matrix, kernel_radius=1, adjusted_size=2):
+
+def derivative_kernels(kernel_size=3, operator='sobel'):
     """
-    Calculates the result of a matrix and both sobel kernels.
+    Creates the 1d kernels of a separable derivative operator.
 
-    The sobel kernels are 3x3. The result of the kernel is normalised before being returned. The calculations are done
-    separately without using matrices, so we don't compute the row with products with zero, which we already know does
-    not influence the result.
+    The 2d operator that responds to changes along the x-axis is the outer product of the smoothing kernel (applied
+    vertically) and the derivative kernel (applied horizontally). Sobel kernels of size 5 and 7 are built from the
+    binomial coefficients, like the 3x3 kernel. The Scharr operator only exists as 3x3.
+    Both kernels are normalised, so a step edge of height 1 gives a response of 1.
 
     Parameters
     ----------
-    matrix: numpy.ndarray
-        Part of the image to apply the sobel kernel to.
-    kernel_radius: int
-        Radius of the kernel.
-    adjusted_size: int
-        Diameter of the kernel minus one.
+    kernel_size: int
+        Size of the operator: 3, 5 or 7.
+    operator: str
+        'sobel' or 'scharr'.
 
     Returns
     -------
-    tuple: (int, int)
-        The horizontal weight.
-        The vertical weight.
+    tuple: (numpy.ndarray, numpy.ndarray)
+        The smoothing kernel.
+        The derivative kernel.
+    """
+    if operator == 'scharr':
+        if kernel_size != 3:
+            raise ValueError("The Scharr operator only exists as 3x3 kernel.")
+        smoothing = np.array([3, 10, 3], dtype=np.float64)
+    elif operator == 'sobel':
+        if kernel_size not in (3, 5, 7):
+            raise ValueError("Sobel kernels must have a size of 3, 5 or 7.")
+        smoothing = np.array([1], dtype=np.float64)
+        for _ in range(kernel_size - 1):
+            smoothing = np.convolve(smoothing, [1, 1])
+    else:
+        raise ValueError("Unknown derivative operator '{}', use 'sobel' or 'scharr'.".format(operator))
+
+    # The derivative is the central difference, smoothed by a binomial kernel two sizes smaller.
+    derivative = np.array([-1, 0, 1], dtype=np.float64)
+    for _ in range(kernel_size - 3):
+        derivative = np.convolve(derivative, [1, 1])
+
+    return smoothing / smoothing.sum(), derivative / derivative[derivative > 0].sum()
+
+
+def sobel_gradients(plane, kernel_size=3, operator='sobel', magnitude='l1', border_mode='nearest'):
     """
-    horizontal = 0
-    vertical = 0
-    normaliser = 0
-    for i in range(kernel_radius):
-        factor = i + 1
-        normaliser += 2 * factor * (kernel_radius + 2)
-        row_horizontal = matrix[i][kernel_radius] * factor * 2 - matrix[adjusted_size - i][kernel_radius] * factor * 2
+    Calculates the gradient magnitude and orientation of every pixel of an image.
+
+    Both derivatives are calculated for the whole image at once with the separable operator of
+    ``derivative_kernels``.
 
-        row_vertical = matrix[kernel_radius][adjusted_size - i] * factor * 2 - matrix[kernel_radius][i] * factor * 2
+    The orientation is the angle of the gradient in radians, measured from the x-axis with the y-axis pointing up (to
+    the first row). The direction of the gradient is irrelevant for edges, so the orientation is folded into
+    (-pi/2, pi/2].
 
-        for j in range(kernel_radius):
-            row_horizontal += matrix[i][j] * factor\
-                              + matrix[i][adjusted_size - j] * factor \
-                              - matrix[adjusted_size - i][j] * factor \
-                              - matrix[adjusted_size - i][2] * factor
+    Parameters
+    ----------
+    plane: numpy.ndarray
+        2d array with the grey values of the image.
+    kernel_size: int
+        Size of the operator: 3, 5 or 7.
+    operator: str
+        'sobel' or 'scharr'.
+    magnitude: str
+        'hypot' for the exact length of the gradient, 'l1' for the sum of the absolute derivatives.
+    border_mode: str
+        How the image is extended beyond its border: 'reflect', 'nearest' or 'constant'.
+
+    Returns
+    -------
+    tuple: (numpy.ndarray, numpy.ndarray)
+        The float32 plane with gradient magnitudes.
+        The float32 plane with gradient orientations.
+    """
+    smoothing, derivative = derivative_kernels(kernel_size, operator)
 
-            row_vertical += matrix[j][adjusted_size - i] * factor \
-                            + matrix[kernel_radius - j][adjusted_size - i] * factor \
-                            - matrix[j][i].value * factor \
-                            - matrix[kernel_radius - j][i] * factor
+    x_response = apply_filter.correlate_separable(plane, smoothing, derivative, border_mode)
+    y_response = apply_filter.correlate_separable(plane, derivative, smoothing, border_mode)
 
-        horizontal += row_horizontal
-        vertical += row_vertical
+    if magnitude == 'hypot':
+        strength = np.hypot(x_response, y_response)
+    elif magnitude == 'l1':
+        strength = np.abs(x_response) + np.abs(y_response)
+    else:
+        raise ValueError("Unknown magnitude '{}', use 'hypot' or 'l1'.".format(magnitude))
 
-    normaliser = 1 / normaliser
+    # Rows count downwards, so the y-response is negated to measure the angle with the y-axis pointing up.
+    orientation = np.arctan2(-y_response, x_response)
+    orientation[orientation > np.pi / 2] -= np.pi
+    orientation[orientation <= -np.pi / 2] += np.pi
 
-    return horizontal * normaliser, vertical * normaliser
+    return strength, orientation.astype(np.float32, copy=False)
 
 
-def run_sobel_edge_detection(value_table, kernel_size=3):
+@instrumentation.stage('sobel')
+def run_sobel_edge_detection(value_table, kernel_size=3, operator='sobel', magnitude='l1', border_mode='nearest'):
     """
     Searches for edges inside the image in the pixel table.
 
@@ -67,33 +111,24 @@ def run_sobel_edge_detection(value_table, kernel_size=3):
     value_table:
         Pixel Table containing the pixels to manipulate.
     kernel_size:
-        Size of the sobel kernel.
+        Size of the sobel kernel: 3, 5 or 7.
+    operator: str
+        'sobel' or 'scharr'.
+    magnitude: str
+        'hypot' for the exact gradient magnitude, 'l1' for the approximation by the sum of the absolute derivatives.
+    border_mode: str
+        How the image is extended beyond its border: 'reflect', 'nearest' or 'constant'.
 
     Returns
     -------
     None
         Pixels inside the Pixel Table contain the result of the sobel operator.
     """
-    image_pixels = value_table.pixels
-    height, width = image_pixels.shape
-    kernel_radius = kernel_size // 2
-    # Kernel_min_one is calculated here so it doesn't have to be computed for every element within the loop.
-    kernel_min_one = kernel_size - 1
-    for row_index in range(kernel_radius, height - kernel_radius):
-        for column_index in range(kernel_radius, width - kernel_radius):
-            local_neighborhood = select.get_sub_matrix(image_pixels,
-                                                       row_index - kernel_radius,
-                                                       column_index - kernel_radius,
-                                                       size=kernel_size)
-
-            horizontal_strength, vertical_strength = sobel_calculation(local_neighborhood,
-                                                                       kernel_radius=kernel_radius,
-                                                                       adjusted_size=kernel_min_one)
-
-            total_strength = trig.approximate_hypotenuse(horizontal_strength, vertical_strength)
-            image_pixels[row_index][column_index].cache = total_strength
-
-            gradient_orientation = trig.calculate_gradient_angle(vertical_strength, horizontal_strength)
-            image_pixels[row_index][column_index].orientation = gradient_orientation
+    strength, orientation = sobel_gradients(value_table.values, kernel_size, operator, magnitude, border_mode)
 
+    value_table.cache[...] = strength
+    value_table.orientation[...] = orientation
     value_table.set_new_pixel_values()
+    if instrumentation.enabled():
+        instrumentation.annotate(kernel_size=kernel_size, operator=operator, magnitude=magnitude,
+                                 edge_pixels=int(np.count_nonzero(value_table.on)))
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+
+# Default maximum size of all cached stages together, in bytes.
+default_cache_size = 2 ** 30
+
+
+def image_key(image):
+    """
+    Computes the key of an image from its content.
+
+    The key only depends on the mode, the size and the pixels of the image, so the same picture loaded twice, or from
+    another file, gets the same key.
+
+    Parameters
+    ----------
+    image: pillow.Image
+        The image.
+
+    Returns
+    -------
+    str
+        Hexadecimal sha256 hash of the image.
+    """
+    image_hash = hashlib.sha256()
+    image_hash.update('{} {} {}'.format(image.mode, image.width, image.height).encode())
+    image_hash.update(image.tobytes())
+    return image_hash.hexdigest()
+
+
+def stage_key(previous_key, stage_name, parameters):
+    """
+    Computes the key of the result of a stage from the key of its input and its parameters.
+
+    Chaining the keys makes the key of every stage depend on the image and on the parameters of all earlier stages.
+
+    Parameters
+    ----------
+    previous_key: str
+        Key of the input of the stage: the key of the image or of the previous stage.
+    stage_name: str
+        Name of the stage.
+    parameters: dict
+        The parameters of the stage. Must be serializable to JSON.
+
+    Returns
+    -------
+    str
+        Hexadecimal sha256 hash of the stage.
+    """
+    description = json.dumps([previous_key, stage_name, parameters], sort_keys=True)
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+class StageCache:
+    """
+    A content-addressed cache of the results of pipeline stages on disk.
+
+    Every result is a set of arrays stored as one compressed .npz file named after its key, see ``stage_key``. When
+    the files together grow larger than the maximum size, the least recently used files are removed. Reading a file
+    marks it as used by updating its modification time.
+
+    The files are written atomically, so several processes can share a cache directory.
+    """
+    def __init__(self, directory, max_size=default_cache_size):
+        """
+        Creates a Stage Cache object.
+
+        Parameters
+        ----------
+        directory: str
+            Directory to store the cached stages in. Created when it does not exist.
+        max_size: int
+            Maximum size of all cached stages together, in bytes.
+
+        Returns
+        -------
+        StageCache
+            The created Stage Cache object.
+        """
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        """The path of the file of a key."""
+        return os.path.join(self.directory, key + '.npz')
+
+    def __contains__(self, key):
+        return os.path.isfile(self.path(key))
+
+    def load(self, key):
+        """
+        Loads the arrays of a cached stage.
+
+        Parameters
+        ----------
+        key: str
+            Key of the stage.
+
+        Returns
+        -------
+        dict: {str: numpy.ndarray}
+            The arrays of the stage, or None when the stage is not cached (or was removed while reading it).
+        """
+        try:
+            with np.load(self.path(key)) as stage_file:
+                arrays = {name: stage_file[name] for name in stage_file.files}
+            os.utime(self.path(key))
+        except (OSError, ValueError, zipfile.BadZipFile):
+            return None
+        return arrays
+
+    def store(self, key, arrays):
+        """
+        Stores the arrays of a stage and removes the least recently used stages when the cache is too large.
+
+        Parameters
+        ----------
+        key: str
+            Key of the stage.
+        arrays: dict {str: numpy.ndarray}
+            The arrays of the stage.
+
+        Returns
+        -------
+        None
+            The stage is stored in the cache directory.
+        """
+        file_descriptor, temporary_path = tempfile.mkstemp(suffix='.npz.tmp', dir=self.directory)
+        try:
+            with os.fdopen(file_descriptor, 'wb') as stage_file:
+                np.savez_compressed(stage_file, **arrays)
+            os.replace(temporary_path, self.path(key))
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used stages until the cache fits within its maximum size."""
+        stage_files = list()
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith('.npz'):
+                continue
+            try:
+                file_status = os.stat(os.path.join(self.directory, file_name))
+            except OSError:
+                continue
+            stage_files.append((file_status.st_mtime, file_status.st_size, file_name))
+
+        total_size = sum(file_size for _, file_size, _ in stage_files)
+        for _, file_size, file_name in sorted(stage_files):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.directory, file_name))
+            except OSError:
+                pass
+            total_size -= file_size
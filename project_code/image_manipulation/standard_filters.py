@@ -1,11 +1,15 @@
 import project_code.image_manipulation.kernels.blurs as blur
+from project_code.image_manipulation import instrumentation
 
-from project_code.my_maths import \
-    lineair_algebra as lin_alg, \
-    select_from_matrix as select
+from project_code.my_maths import lineair_algebra as lin_alg
 
 import numpy as np
 
+# Border modes of the filters and the numpy pad mode that implements them.
+border_modes = {'reflect': 'symmetric',
+                'nearest': 'edge',
+                'constant': 'constant'}
+
 
 def apply_kernel(sub_image, kernel):
     """
@@ -33,36 +37,104 @@ def apply_kernel(sub_image, kernel):
     return lin_alg.inner_product(sub_image, kernel)
 
 
-def gauss_blur(value_table, kernel_size):
+def correlate_1d(plane, kernel, axis, border_mode='reflect', constant=0):
+    """
+    Applies a 1d kernel along one axis of a plane.
+
+    The plane is padded along ``axis`` by the kernel radius and the kernel is applied as a sum of shifted copies of
+    the whole plane, so every pixel, including the border pixels, is filtered.
+
+    Parameters
+    ----------
+    plane: numpy.ndarray
+        2d array to filter.
+    kernel: numpy.ndarray
+        1d kernel with an uneven length.
+    axis: int
+        0 to apply the kernel along the columns (vertically), 1 to apply it along the rows (horizontally).
+    border_mode: str
+        How the plane is extended beyond its border: 'reflect' (d c b a | a b c d), 'nearest' (a a a a | a b c d) or
+        'constant' (k k k k | a b c d).
+    constant: float
+        Value used outside the plane when ``border_mode`` is 'constant'.
+
+    Returns
+    -------
+    numpy.ndarray
+        The filtered float32 plane.
+    """
+    if border_mode not in border_modes:
+        raise ValueError("Unknown border mode '{}', use one of {}.".format(border_mode, list(border_modes)))
+
+    kernel = np.asarray(kernel, dtype=np.float32)
+    kernel_radius = len(kernel) // 2
+    pad_width = [(0, 0), (0, 0)]
+    pad_width[axis] = (kernel_radius, kernel_radius)
+    if border_mode == 'constant':
+        padded = np.pad(plane.astype(np.float32, copy=False), pad_width, mode='constant', constant_values=constant)
+    else:
+        padded = np.pad(plane.astype(np.float32, copy=False), pad_width, mode=border_modes[border_mode])
+
+    length = plane.shape[axis]
+    filtered = np.zeros(plane.shape, dtype=np.float32)
+    for shift, weight in enumerate(kernel):
+        if weight == 0:
+            continue
+        shifted = padded[shift:shift + length] if axis == 0 else padded[:, shift:shift + length]
+        filtered += weight * shifted
+
+    return filtered
+
+
+def correlate_separable(plane, column_kernel, row_kernel, border_mode='reflect', constant=0):
+    """
+    Applies a separable 2d kernel, the outer product of ``column_kernel`` and ``row_kernel``, as two 1d passes.
+
+    Parameters
+    ----------
+    plane: numpy.ndarray
+        2d array to filter.
+    column_kernel: numpy.ndarray
+        1d kernel applied vertically.
+    row_kernel: numpy.ndarray
+        1d kernel applied horizontally.
+    border_mode: str
+        How the plane is extended beyond its border, see ``correlate_1d``.
+    constant: float
+        Value used outside the plane when ``border_mode`` is 'constant'.
+
+    Returns
+    -------
+    numpy.ndarray
+        The filtered float32 plane.
+    """
+    filtered = correlate_1d(plane, column_kernel, 0, border_mode, constant)
+    return correlate_1d(filtered, row_kernel, 1, border_mode, constant)
+
+
+@instrumentation.stage('gauss_blur')
+def gauss_blur(value_table, kernel_size, border_mode='reflect'):
     """
     Applies a Gaussian blur to a pixel table.
 
+    The gaussian kernel is separable, so it is applied as a vertical and a horizontal 1d pass over the whole image.
+
     Parameters
     ----------
     value_table: PixelTable
         Pixel Table containing pixels to blur.
     kernel_size: int
         Length and width of the gaussian kernel.
+    border_mode: str
+        How the image is extended beyond its border: 'reflect', 'nearest' or 'constant' (black).
 
     Returns
     -------
     None
         Pixels inside the Pixel table have been blurred.
     """
-    image_pixels = value_table.pixels
-
-    gaussian_kernel = blur.gaussian_kernel(kernel_size)
-    kernel_radius = kernel_size // 2
-    height, width = image_pixels.shape
-
-    for row_index in range(kernel_radius, height - kernel_radius):
-        for column_index in range(kernel_radius, width - kernel_radius):
-            pixel_and_surrounding = select.get_sub_matrix(image_pixels,
-                                                          row_index - kernel_radius,
-                                                          column_index - kernel_radius,
-                                                          size=kernel_size)
-
-            new_pixel_value = apply_kernel(pixel_and_surrounding, gaussian_kernel)
-            image_pixels[row_index][column_index].cache = new_pixel_value
+    instrumentation.annotate(kernel_size=kernel_size, border_mode=border_mode)
+    gaussian_kernel = blur.gaussian_kernel_1d(kernel_size)
 
+    value_table.cache[...] = correlate_separable(value_table.values, gaussian_kernel, gaussian_kernel, border_mode)
     value_table.set_new_pixel_values()
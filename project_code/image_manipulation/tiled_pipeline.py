@@ -0,0 +1,189 @@
+from project_code.image_manipulation import \
+    standard_filters as apply_filter, \
+    sobel_edge_detector as sobel, \
+    canny_edge_detector as canny, \
+    hough_circle_transform as hough, \
+    scratch_memory as scratch, \
+    instrumentation
+
+from project_code.image_manipulation.classes import pixel_table as tables
+
+from concurrent import futures
+import os
+
+import numpy as np
+
+# Length of the sides of the tiles, without their halo.
+default_tile_size = 1024
+
+
+def edge_halo(kernel_size):
+    """
+    Computes how far the edges found in a pixel depend on the pixels around it.
+
+    The blur, the sobel operator and the non-maximum suppression each look ``kernel_size // 2`` (the sobel operator
+    one) pixels further.
+
+    Parameters
+    ----------
+    kernel_size: int
+        Size of the blur kernel and the non-maximum suppression, see ``TransformImage.apply_canny``.
+
+    Returns
+    -------
+    int
+        The width of the border around a tile that is needed to find its edges.
+    """
+    return 2 * (kernel_size // 2) + 1
+
+
+def tile_boxes(width, height, tile_size, halo):
+    """
+    Splits an image into tiles with an overlapping halo.
+
+    The cores of the tiles cover the image without overlapping. Every tile is extended with the halo on all sides,
+    as far as the image reaches.
+
+    Parameters
+    ----------
+    width: int
+        Width of the image.
+    height: int
+        Height of the image.
+    tile_size: int
+        Length of the sides of the cores of the tiles.
+    halo: int
+        Width of the border around the core of every tile.
+
+    Returns
+    -------
+    list: [((int, int, int, int), (int, int, int, int))]
+        The (left, top, right, bottom) box of the core and the box of the tile with its halo, for every tile.
+    """
+    boxes = list()
+    for top in range(0, height, tile_size):
+        for left in range(0, width, tile_size):
+            core = (left, top, min(left + tile_size, width), min(top + tile_size, height))
+            tile = (max(left - halo, 0), max(top - halo, 0), min(core[2] + halo, width), min(core[3] + halo, height))
+            boxes.append((core, tile))
+    return boxes
+
+
+@instrumentation.stage('tile')
+def find_circles_in_tile(tile_image, core, tile, radii, kernel_size=5, noise=2, engine='auto',
+                         angular_tolerance=hough.default_angular_tolerance):
+    """
+    Runs the whole pipeline on one tile and keeps the circles whose center lies in the core of the tile.
+
+    The tile is blurred, its edges are found with canny edge detection and it is searched for circles, like
+    ``TransformImage.apply_canny`` and ``TransformImage.find_circles``. The hysteresis thresholds are computed from the
+    tile, so they adapt to the brightness of every part of the image.
+
+    Parameters
+    ----------
+    tile_image: pillow.Image
+        The part of the image inside the tile box.
+    core: tuple (int, int, int, int)
+        (left, top, right, bottom) box of the core of the tile inside the image.
+    tile: tuple (int, int, int, int)
+        (left, top, right, bottom) box of the tile inside the image.
+    radii: range
+        The radii to look for.
+    kernel_size: int
+        Size of the blur kernel and the non-maximum suppression.
+    noise: int
+        Approximate amount of noise in the image.
+    engine: str
+        How the edge pixels vote, see ``hough.accumulate_radius_range``.
+    angular_tolerance: float
+        Maximum deviation from the gradient in radians at which the 'gradient' engine votes.
+
+    Returns
+    -------
+    tuple: (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        x, y (inside the image), radius and score of every found circle.
+    """
+    tile_table = tables.PixelTable(tile_image.width, tile_image.height)
+    tile_table.fill_with_image(tile_image)
+    apply_filter.gauss_blur(tile_table, kernel_size)
+    sobel.run_sobel_edge_detection(tile_table)
+    canny.canny_detector(tile_table, kernel_size, noise)
+
+    x, y, found_radii, scores = hough.find_circles_radius_range(tile_table, radii, engine=engine,
+                                                                angular_tolerance=angular_tolerance)
+    x = x + tile[0]
+    y = y + tile[1]
+    in_core = (x >= core[0]) & (x < core[2]) & (y >= core[1]) & (y < core[3])
+    instrumentation.annotate(core=core, tile=tile, circles=int(np.count_nonzero(in_core)))
+    return x[in_core], y[in_core], found_radii[in_core], scores[in_core]
+
+
+@instrumentation.stage('tiled_search')
+def find_circles_tiled(image, radii, tile_size=default_tile_size, kernel_size=5, noise=2, engine='auto',
+                       angular_tolerance=hough.default_angular_tolerance, workers=1):
+    """
+    Searches a full resolution image for circles, one overlapping tile at a time.
+
+    Every tile is extended with a halo that holds the pixels its edges depend on, the largest radius, and the window
+    in which only one circle is found. A circle whose center lies in the core of a tile is therefore found as if the
+    whole image was searched, apart from the hysteresis thresholds which are computed per tile. The memory use is
+    bounded by the size of a tile with its halo, times the amount of workers. The circles of all tiles are stitched
+    together, and circles that are found twice near the border of two cores are merged, see ``hough.merge_circles``.
+
+    Parameters
+    ----------
+    image: pillow.Image
+        The image to search.
+    radii: range
+        The radii to look for.
+    tile_size: int
+        Length of the sides of the cores of the tiles.
+    kernel_size: int
+        Size of the blur kernel and the non-maximum suppression.
+    noise: int
+        Approximate amount of noise in the image.
+    engine: str
+        How the edge pixels vote, see ``hough.accumulate_radius_range``.
+    angular_tolerance: float
+        Maximum deviation from the gradient in radians at which the 'gradient' engine votes.
+    workers: int
+        Amount of processes that search tiles at the same time. All cpus are used when None.
+
+    Returns
+    -------
+    tuple: (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        x, y, radius and score of every found circle.
+    """
+    spatial_radius, radius_radius = hough.peak_windows(radii)
+    halo = edge_halo(kernel_size) + max(radii) + spatial_radius
+    boxes = tile_boxes(image.width, image.height, tile_size, halo)
+    tile_arguments = (radii, kernel_size, noise, engine, angular_tolerance)
+
+    if workers == 1:
+        tile_circles = [find_circles_in_tile(image.crop(tile), core, tile, *tile_arguments) for core, tile in boxes]
+    else:
+        if workers is None:
+            workers = os.cpu_count() or 1
+        tile_circles = [None] * len(boxes)
+        with futures.ProcessPoolExecutor(max_workers=workers, initializer=scratch.configure,
+                                         initargs=scratch.settings()) as pool:
+            # Only one tile per worker is cropped and in flight at a time, so the memory stays bounded by the tiles.
+            searching = dict()
+            for box_index, (core, tile) in enumerate(boxes):
+                if len(searching) >= workers:
+                    searched_tiles, _ = futures.wait(searching, return_when=futures.FIRST_COMPLETED)
+                    for searched_tile in searched_tiles:
+                        tile_circles[searching.pop(searched_tile)] = searched_tile.result()
+                searching[pool.submit(find_circles_in_tile, image.crop(tile), core, tile, *tile_arguments)] = box_index
+            for searched_tile in futures.as_completed(searching):
+                tile_circles[searching[searched_tile]] = searched_tile.result()
+
+    if tile_circles:
+        x, y, found_radii, scores = (np.concatenate(values) for values in zip(*tile_circles))
+        found_circles = hough.merge_circles(x, y, found_radii, scores, spatial_radius, radius_radius)
+    else:
+        # An empty image has no tiles.
+        found_circles = (np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp),
+                         np.zeros(0, dtype=np.float32))
+    instrumentation.annotate(tiles=len(boxes), halo=halo, workers=workers, circles=len(found_circles[0]))
+    return found_circles
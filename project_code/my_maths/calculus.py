@@ -1,3 +1,5 @@
+import itertools
+
 import numpy as np
 
 
@@ -27,64 +29,134 @@ def local_maximum_1d(local_vector: np.ndarray) -> tuple:
     return current_index, maximum
 
 
-def local_maximum_2d_cache(local_matrix):
+def sliding_maximum(matrix, radius, axis=0):
     """
-    Calculates the index of the local maximum inside a 2d matrix.
+    Calculates the maximum inside a sliding window along one axis of a matrix.
 
-    The matrix has to contain a datatype containing a cache attribute, like a Grey Pixel.
-    The local maximum pixel, when comparing their cache attribute, is calculated and so is its index.
+    Uses the van Herk/Gil-Werman algorithm: the axis is split into blocks as long as the window, and the maximum of a
+    window is the maximum of the suffix maximum of one block and the prefix maximum of the next block. The cost per
+    value is constant, independent of the size of the window. Values outside the matrix are ignored.
 
     Parameters
     ----------
-    local_matrix: np.ndarray
-        The 2d array with strengths.
+    matrix: numpy.ndarray
+        Array of floats.
+    radius: int
+        The window contains ``radius`` values on both sides of the center value.
+    axis: int
+        Axis along which the window slides.
 
     Returns
     -------
-    tuple: ((int, int), int)
-        Index of the local maximum (x, y).
-        Strength of the local maximum.
+    numpy.ndarray
+        Array with the same shape as ``matrix``, containing the maximum of the window around every value.
     """
-    current_index = (0, 0)
-    maximum = local_matrix[0, 0].cache
-    for row_index, row in enumerate(local_matrix):
-        for column_index, current_value in enumerate(row):
-            current_value_cache = current_value.cache
-            if current_value_cache is None:
-                continue
-            if current_value_cache > maximum:
-                current_index = (column_index, row_index)
-                maximum = current_value_cache
-            current_value.cache = None
-
-    return current_index, maximum
+    if radius == 0:
+        return matrix.copy()
+
+    window = 2 * radius + 1
+    length = matrix.shape[axis]
+    block_count = -(-(length + 2 * radius) // window)
+    pad_width = [(0, 0)] * matrix.ndim
+    pad_width[0] = (radius, block_count * window - length - radius)
+    # Moving the axis to the front first makes the padded copy contiguous along the sliding axis.
+    padded = np.pad(np.moveaxis(matrix, axis, 0), pad_width, mode='constant', constant_values=-np.inf)
+
+    blocks = padded.reshape((block_count, window) + padded.shape[1:])
+    prefix_maximum = np.empty_like(blocks)
+    suffix_maximum = np.empty_like(blocks)
+    prefix_maximum[:, 0] = blocks[:, 0]
+    suffix_maximum[:, -1] = blocks[:, -1]
+    for position in range(1, window):
+        np.maximum(prefix_maximum[:, position - 1], blocks[:, position], out=prefix_maximum[:, position])
+        np.maximum(suffix_maximum[:, -position], blocks[:, -position - 1], out=suffix_maximum[:, -position - 1])
+    prefix_maximum = prefix_maximum.reshape(padded.shape)
+    suffix_maximum = suffix_maximum.reshape(padded.shape)
+
+    # The window starting at i ends at i + window - 1, which lies in the block after the block of i.
+    maximum = np.maximum(suffix_maximum[:length], prefix_maximum[window - 1:window - 1 + length])
+    return np.moveaxis(maximum, 0, axis)
+
+
+def _maximum_of(first, second):
+    """The elementwise maximum of two arrays, where None stands for an array of -inf."""
+    if first is None:
+        return second
+    if second is None:
+        return first
+    return np.maximum(first, second)
+
+
+def sliding_maximum_stream(layers, radius):
+    """
+    Calculates the maximum inside a sliding window over a stream of arrays of the same shape.
 
+    Streaming version of ``sliding_maximum`` along the first axis. The layers are read one at a time, and the maximum
+    of the window around a layer is yielded as soon as the layer ``radius`` places further has been read. The same
+    van Herk/Gil-Werman blocks are used, so the cost per layer is constant, and only the layers of the current block
+    and the suffix maxima of the previous block are kept.
 
-def local_maximum_3d(local_3d_matrix):
+    Parameters
+    ----------
+    layers: iterable [numpy.ndarray]
+        The layers, in order.
+    radius: int
+        The window contains ``radius`` layers on both sides of the center layer.
+
+    Yields
+    ------
+    numpy.ndarray
+        The maximum of the window around the next layer, for every layer. Layers outside the stream are ignored.
+        Can be one of the layers, so it must not be changed.
+    """
+    window = 2 * radius + 1
+    block = list()
+    prefix_maximum = None
+    suffix_maximum = list()
+    # Empty places before and after the layers center the window on the first and the last layer.
+    padded_layers = itertools.chain(itertools.repeat(None, radius), layers, itertools.repeat(None, radius))
+    for position, layer in enumerate(padded_layers):
+        if position % window == 0:
+            # The previous block is complete, its suffix maxima serve the windows that start inside it.
+            suffix_maximum = [None] * len(block)
+            running_maximum = None
+            for block_position in reversed(range(len(block))):
+                running_maximum = _maximum_of(running_maximum, block[block_position])
+                suffix_maximum[block_position] = running_maximum
+            block = list()
+            prefix_maximum = None
+        block.append(layer)
+        prefix_maximum = _maximum_of(prefix_maximum, layer)
+
+        if position >= window - 1:
+            # The window ending at this position starts in the previous block, unless it is exactly this block.
+            window_start = (position + 1) % window
+            yield prefix_maximum if window_start == 0 else _maximum_of(suffix_maximum[window_start], prefix_maximum)
+
+
+def maximum_filter(matrix, radius):
     """
-    Calculates the index of the local maximum in a 2d matrix.
-    The matrix has to contain a datatype containing a cache attribute, like Grey Pixel.
-    The local maximum pixel when comparing their cache attribute is calculated and so is its index.
+    Calculates the maximum inside the window around every value of a matrix.
+
+    The window is a box with ``radius`` values on both sides of the center value along every axis. The box is
+    separable, so the filter is applied as one sliding maximum per axis.
 
     Parameters
     ----------
-    local_3d_matrix: np.ndarray
-        The 3d array with strengths.
+    matrix: numpy.ndarray
+        Array of floats.
+    radius: int or tuple
+        Radius of the window, or a radius for every axis.
 
     Returns
     -------
-    tuple: ((int, int), int)
-        Index of the local maximum (x, y, z).
-        Strength of the local maximum.
+    numpy.ndarray
+        Array with the same shape as ``matrix``, containing the local maximum around every value.
     """
-    z, y, x = local_3d_matrix.shape
-    current_index = (0, 0, 0)
-    current_maximum = local_3d_matrix[0][0][0]
-    for height_index in range(z):
-        for row_index in range(y):
-            column_index, row_maximum = local_maximum_1d(local_3d_matrix[height_index][row_index])
-            if row_maximum > current_maximum:
-                current_maximum = row_maximum
-                current_index = (column_index, row_index, height_index)
-
-    return current_index, current_maximum
+    if isinstance(radius, int):
+        radius = (radius,) * matrix.ndim
+
+    maximum = matrix
+    for axis, axis_radius in enumerate(radius):
+        maximum = sliding_maximum(maximum, axis_radius, axis)
+    return maximum
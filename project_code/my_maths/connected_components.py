@@ -0,0 +1,127 @@
+import numpy as np
+
+
+def find_runs(mask):
+    """
+    Finds the horizontal runs of True values inside a boolean matrix.
+
+    A run is a sequence of adjacent True values inside a row. The runs are ordered by row and then by column, which is
+    the order of ``numpy.nonzero``.
+
+    Parameters
+    ----------
+    mask: numpy.ndarray
+        2d boolean matrix.
+
+    Returns
+    -------
+    tuple: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        Row index of every run.
+        Column index of the first value of every run.
+        Column index of the last value of every run.
+    """
+    height, width = mask.shape
+    padded_mask = np.zeros((height, width + 2), dtype=np.int8)
+    padded_mask[:, 1:-1] = mask
+    changes = np.diff(padded_mask, axis=1)
+
+    run_rows, run_starts = np.nonzero(changes == 1)
+    run_ends = np.nonzero(changes == -1)[1] - 1
+
+    return run_rows, run_starts, run_ends
+
+
+def _find_root(parents, index):
+    """Finds the root of a set in the union-find forest, halving the path on the way."""
+    while parents[index] != index:
+        parents[index] = parents[parents[index]]
+        index = parents[index]
+    return index
+
+
+def _touching_runs(run_rows, run_starts, run_ends, width, row_distance, column_tolerance):
+    """
+    Finds all pairs of runs that are ``row_distance`` rows apart and at most ``column_tolerance`` columns apart.
+
+    Runs are sorted by row and column, and runs inside a row do not overlap, so both their starts and their ends are
+    sorted. Keying the runs by (row, column) therefore allows finding all partners of a run with two binary searches.
+    """
+    row_length = width + 2 * column_tolerance + 1
+    start_keys = run_rows * row_length + run_starts + column_tolerance
+    end_keys = run_rows * row_length + run_ends + column_tolerance
+    partner_row_keys = (run_rows + row_distance) * row_length
+
+    first_partners = np.searchsorted(end_keys, partner_row_keys + run_starts, side='left')
+    last_partners = np.searchsorted(start_keys, partner_row_keys + run_ends + 2 * column_tolerance, side='right')
+
+    partner_counts = np.maximum(last_partners - first_partners, 0)
+    runs = np.repeat(np.arange(len(run_rows)), partner_counts)
+    # Position of every pair inside the partners of its run.
+    pair_offsets = np.arange(partner_counts.sum()) - np.repeat(np.cumsum(partner_counts) - partner_counts,
+                                                               partner_counts)
+    partners = np.repeat(first_partners, partner_counts) + pair_offsets
+
+    return runs, partners
+
+
+def label_components(mask, connectivity=8, gap=0):
+    """
+    Labels the connected components of a boolean matrix.
+
+    The True values of the mask are grouped into horizontal runs. Runs that touch are merged with a union-find forest,
+    so the labelling takes linear time in the amount of runs and handles branching components.
+
+    Two values are connected when they are neighbours: with ``connectivity`` 8 also diagonally, with ``connectivity``
+    4 only horizontally and vertically. ``gap`` allows up to ``gap`` missing values between connected values: the
+    Chebyshev (8) or Manhattan (4) distance between connected values is at most ``gap + 1``.
+
+    Parameters
+    ----------
+    mask: numpy.ndarray
+        2d boolean matrix.
+    connectivity: int
+        4 or 8.
+    gap: int
+        Amount of missing values that is tolerated between connected values.
+
+    Returns
+    -------
+    tuple: (numpy.ndarray, int)
+        int32 matrix with the label of the component of every True value, and 0 for every False value.
+        Amount of components found. The labels run from 1 up to and including this amount.
+    """
+    if connectivity not in (4, 8):
+        raise ValueError("Connectivity must be 4 or 8.")
+
+    height, width = mask.shape
+    labels = np.zeros((height, width), dtype=np.int32)
+    run_rows, run_starts, run_ends = find_runs(mask)
+    if len(run_rows) == 0:
+        return labels, 0
+
+    reach = gap + 1
+    # Runs on the same row are separated by at least one value.
+    same_row = (run_rows[1:] == run_rows[:-1]) & (run_starts[1:] - run_ends[:-1] <= reach)
+    first_runs = [np.nonzero(same_row)[0]]
+    second_runs = [first_runs[0] + 1]
+
+    for row_distance in range(1, reach + 1):
+        column_tolerance = reach if connectivity == 8 else reach - row_distance
+        runs, partners = _touching_runs(run_rows, run_starts, run_ends, width, row_distance, column_tolerance)
+        first_runs.append(runs)
+        second_runs.append(partners)
+
+    parents = list(range(len(run_rows)))
+    for first_run, second_run in zip(np.concatenate(first_runs).tolist(), np.concatenate(second_runs).tolist()):
+        first_root = _find_root(parents, first_run)
+        second_root = _find_root(parents, second_run)
+        if first_root != second_root:
+            parents[max(first_root, second_root)] = min(first_root, second_root)
+
+    run_roots = np.array([_find_root(parents, run) for run in range(len(parents))])
+    component_roots, run_labels = np.unique(run_roots, return_inverse=True)
+
+    # np.nonzero walks the mask in the same order as the runs.
+    labels[np.nonzero(mask)] = np.repeat(run_labels + 1, run_ends - run_starts + 1)
+
+    return labels, len(component_roots)
@@ -0,0 +1,322 @@
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+radius_distributions = ('uniform', 'normal', 'lognormal')
+particle_styles = ('outline', 'filled')
+
+
+def draw_radii(random, count, radii=(10, 30), distribution='uniform'):
+    """
+    Draws the radii of particles.
+
+    Parameters
+    ----------
+    random: numpy.random.Generator
+        The random generator.
+    count: int
+        Amount of radii.
+    radii: tuple (int, int)
+        Smallest and largest radius.
+    distribution: str
+        'uniform' over the range, or 'normal' or 'lognormal' around the middle of the range, with 99.7% of the radii
+        inside the range. The radii are rounded and clipped to the range.
+
+    Returns
+    -------
+    numpy.ndarray
+        The radii.
+    """
+    smallest_radius, largest_radius = radii
+    if distribution == 'uniform':
+        drawn_radii = random.uniform(smallest_radius, largest_radius, count)
+    elif distribution == 'normal':
+        drawn_radii = random.normal((smallest_radius + largest_radius) / 2, (largest_radius - smallest_radius) / 6,
+                                    count)
+    elif distribution == 'lognormal':
+        log_radii = np.log([smallest_radius, largest_radius])
+        drawn_radii = np.exp(random.normal(log_radii.mean(), (log_radii[1] - log_radii[0]) / 6, count))
+    else:
+        raise ValueError("Unknown radius distribution '{}', use one of {}.".format(
+            distribution, ', '.join(radius_distributions)))
+    return np.clip(np.rint(drawn_radii), smallest_radius, largest_radius).astype(int)
+
+
+def place_circles(random, width, height, radii, overlap=0.0, attempts=100):
+    """
+    Places circles with the given radii inside an image, at random positions.
+
+    Every circle lies completely inside the image. Two circles may overlap by at most a fraction of the sum of their
+    radii: their centers are at least ``(1 - overlap)`` times that sum apart. A circle that does not fit after the
+    attempts is skipped, so crowded images get fewer circles.
+
+    Parameters
+    ----------
+    random: numpy.random.Generator
+        The random generator.
+    width: int
+        Width of the image.
+    height: int
+        Height of the image.
+    radii: numpy.ndarray
+        The radius of every circle, placed from the first to the last.
+    overlap: float
+        0 for circles that do not touch, up to 1 for circles anywhere.
+    attempts: int
+        Amount of positions tried per circle.
+
+    Returns
+    -------
+    list: [(int, int, int)]
+        (x, y, radius) of every placed circle.
+    """
+    placed_x = np.zeros(len(radii), dtype=int)
+    placed_y = np.zeros(len(radii), dtype=int)
+    placed_radii = np.zeros(len(radii), dtype=int)
+    placed_count = 0
+
+    for radius in radii.tolist():
+        if 2 * radius >= width or 2 * radius >= height:
+            continue
+        candidate_x = random.integers(radius, width - radius, attempts)
+        candidate_y = random.integers(radius, height - radius, attempts)
+        if overlap < 1 and placed_count:
+            distances = np.hypot(candidate_x[:, np.newaxis] - placed_x[:placed_count],
+                                 candidate_y[:, np.newaxis] - placed_y[:placed_count])
+            fits = np.all(distances >= (1 - overlap) * (radius + placed_radii[:placed_count]), axis=1)
+            fitting_attempts = np.flatnonzero(fits)
+            if not len(fitting_attempts):
+                continue
+            attempt = fitting_attempts[0]
+        else:
+            attempt = 0
+        placed_x[placed_count] = candidate_x[attempt]
+        placed_y[placed_count] = candidate_y[attempt]
+        placed_radii[placed_count] = radius
+        placed_count += 1
+
+    return list(zip(placed_x[:placed_count].tolist(), placed_y[:placed_count].tolist(),
+                    placed_radii[:placed_count].tolist()))
+
+
+def render_circles(circles, width, height, style='outline', outline_width=2, background=40, foreground=220,
+                   gradient=0.0, blur=0.0, gaussian_noise=0.0, photons=None, random=None):
+    """
+    Renders circles as a greyscale micrograph.
+
+    Parameters
+    ----------
+    circles: list [(int, int, int)]
+        (x, y, radius) of every circle.
+    width: int
+        Width of the image.
+    height: int
+        Height of the image.
+    style: str
+        'outline' to draw rings, 'filled' to draw discs.
+    outline_width: int
+        Width of the rings in pixels.
+    background: float
+        Grey value of the background.
+    foreground: float
+        Grey value of the particles.
+    gradient: float
+        Grey value the background rises over the image, along a random direction.
+    blur: float
+        Standard deviation of the gaussian blur in pixels.
+    gaussian_noise: float
+        Standard deviation of the added gaussian noise in grey values.
+    photons: float
+        Amount of photons of a white pixel, for shot (poisson) noise. Fewer photons give more noise. No shot noise
+        when None.
+    random: numpy.random.Generator
+        The random generator of the gradient and the noise.
+
+    Returns
+    -------
+    pillow.Image
+        The greyscale image.
+    """
+    if style not in particle_styles:
+        raise ValueError("Unknown particle style '{}', use one of {}.".format(style, ', '.join(particle_styles)))
+    if random is None:
+        random = np.random.default_rng()
+
+    mask = Image.new('L', (width, height), 0)
+    drawing = ImageDraw.Draw(mask)
+    for x, y, radius in circles:
+        box = (x - radius, y - radius, x + radius, y + radius)
+        if style == 'filled':
+            drawing.ellipse(box, fill=255)
+        else:
+            drawing.ellipse(box, outline=255, width=outline_width)
+    if blur > 0:
+        mask = mask.filter(ImageFilter.GaussianBlur(blur))
+
+    coverage = np.asarray(mask, dtype=np.float32) / 255
+    background_plane = np.full((height, width), background, dtype=np.float32)
+    if gradient:
+        angle = random.uniform(0, 2 * np.pi)
+        rows, columns = np.ogrid[:height, :width]
+        slope = (np.cos(angle) * columns / max(width - 1, 1) + np.sin(angle) * rows / max(height - 1, 1))
+        background_plane += gradient * (slope - slope.min()) / max(np.ptp(slope), 1e-9)
+    plane = background_plane + coverage * (foreground - background_plane)
+
+    if photons is not None:
+        plane = (random.poisson(np.clip(plane, 0, 255) * (photons / 255)) * (255 / photons)).astype(np.float32)
+    if gaussian_noise > 0:
+        plane += gaussian_noise * random.standard_normal(plane.shape, dtype=np.float32)
+    return Image.fromarray(np.clip(np.rint(plane), 0, 255).astype(np.uint8), 'L')
+
+
+def generate_image(seed=0, width=1000, height=None, count=50, radii=(10, 30), distribution='uniform', overlap=0.0,
+                   style='outline', outline_width=2, background=40, foreground=220, gradient=0.0, blur=0.0,
+                   gaussian_noise=0.0, photons=None):
+    """
+    Generates a synthetic micrograph and its ground truth.
+
+    The same seed and settings always give the same image. See ``draw_radii``, ``place_circles`` and
+    ``render_circles`` for the settings.
+
+    Parameters
+    ----------
+    seed: int or tuple (int)
+        Seed of the random generator.
+    width: int
+        Width of the image.
+    height: int
+        Height of the image. The width when not given.
+    count: int
+        Amount of particles to place. Fewer particles are placed when they do not fit.
+
+    Returns
+    -------
+    tuple: (pillow.Image, list [(int, int, int)])
+        The image, and (x, y, radius) of every particle in it.
+    """
+    height = width if height is None else height
+    random = np.random.default_rng(seed)
+    circles = place_circles(random, width, height, draw_radii(random, count, radii, distribution), overlap)
+    image = render_circles(circles, width, height, style, outline_width, background, foreground, gradient, blur,
+                           gaussian_noise, photons, random)
+    return image, circles
+
+
+def save_image_set(directory, image_count, seed=0, **settings):
+    """
+    Generates a labelled set of images and writes it to a directory.
+
+    Image ``i`` is generated with the seed ``(seed, i)``, so every image of a set differs and sets can be extended.
+
+    Parameters
+    ----------
+    directory: str
+        Directory to write the images to. Created when it does not exist.
+    image_count: int
+        Amount of images.
+    seed: int
+        Seed of the set.
+    settings:
+        The settings of ``generate_image``.
+
+    Returns
+    -------
+    list: [str]
+        The paths to the images. The ground truth of ``name.png`` is saved in ``name.json``, see ``load_ground_truth``.
+    """
+    os.makedirs(directory, exist_ok=True)
+    image_paths = list()
+    for index in range(image_count):
+        image, circles = generate_image((seed, index), **settings)
+        base_name = os.path.join(directory, 'synthetic_{}_{:05d}'.format(seed, index))
+        image.save(base_name + '.png')
+        with open(base_name + '.json', 'w') as truth_file:
+            json.dump({'seed': [seed, index], 'settings': settings,
+                       'circles': [{'x': x, 'y': y, 'radius': radius} for x, y, radius in circles]}, truth_file)
+        image_paths.append(base_name + '.png')
+    return image_paths
+
+
+def load_ground_truth(image_path):
+    """
+    Loads the ground truth saved next to an image by ``save_image_set``.
+
+    Parameters
+    ----------
+    image_path: str
+        Path to the image.
+
+    Returns
+    -------
+    list: [(int, int, int)]
+        (x, y, radius) of every circle in the image.
+    """
+    with open(os.path.splitext(image_path)[0] + '.json') as truth_file:
+        return [(circle['x'], circle['y'], circle['radius']) for circle in json.load(truth_file)['circles']]
+
+
+def build_parser():
+    """Builds the parser of the command line arguments."""
+    parser = argparse.ArgumentParser(prog='python -m project_code.synthetic_images',
+                                     description='Generates synthetic micrographs with their ground truth.')
+    parser.add_argument('output', help='directory to write the images to')
+    parser.add_argument('--count', type=int, default=10, help='amount of images (default 10)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the image set (default 0)')
+    parser.add_argument('--width', type=int, default=1000, help='width of the images (default 1000)')
+    parser.add_argument('--height', type=int, help='height of the images (default the width)')
+    parser.add_argument('--particles', type=int, default=50, help='amount of particles per image (default 50)')
+    parser.add_argument('--radii', type=int, nargs=2, default=(10, 30), metavar=('SMALLEST', 'LARGEST'),
+                        help='range of the radii of the particles (default 10 30)')
+    parser.add_argument('--distribution', default='uniform', choices=radius_distributions,
+                        help='distribution of the radii (default uniform)')
+    parser.add_argument('--overlap', type=float, default=0.0,
+                        help='fraction particles may overlap, 0 (apart) to 1 (anywhere) (default 0)')
+    parser.add_argument('--style', default='outline', choices=particle_styles, help='rings or discs')
+    parser.add_argument('--outline-width', type=int, default=2, help='width of the rings (default 2)')
+    parser.add_argument('--background', type=float, default=40, help='grey value of the background (default 40)')
+    parser.add_argument('--foreground', type=float, default=220, help='grey value of the particles (default 220)')
+    parser.add_argument('--gradient', type=float, default=0.0, help='rise of the background over the image')
+    parser.add_argument('--blur', type=float, default=0.0, help='standard deviation of the blur in pixels')
+    parser.add_argument('--gaussian-noise', type=float, default=0.0, help='standard deviation of the noise')
+    parser.add_argument('--photons', type=float, help='photons of a white pixel, for shot noise')
+    return parser
+
+
+def main(arguments=None):
+    """
+    Writes a labelled set of synthetic images.
+
+    Renders particles as rings or discs on a background, optionally with blur, a background gradient, gaussian noise
+    and shot noise:
+
+        python -m project_code.synthetic_images images --count 100 --width 1000 --radii 15 30 --style filled
+
+    Every image is saved as PNG, next to a JSON file with the same name that holds its circles and settings.
+
+    Parameters
+    ----------
+    arguments: list [str]
+        The command line arguments. Read from ``sys.argv`` when not given.
+
+    Returns
+    -------
+    int
+        The exit status, 0.
+    """
+    options = build_parser().parse_args(arguments)
+    settings = {'width': options.width, 'height': options.height, 'count': options.particles,
+                'radii': tuple(options.radii), 'distribution': options.distribution, 'overlap': options.overlap,
+                'style': options.style, 'outline_width': options.outline_width, 'background': options.background,
+                'foreground': options.foreground, 'gradient': options.gradient, 'blur': options.blur,
+                'gaussian_noise': options.gaussian_noise, 'photons': options.photons}
+    image_paths = save_image_set(options.output, options.count, options.seed, **settings)
+    print('Wrote {} images to {}.'.format(len(image_paths), options.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+from project_code import \
+    analysis_worker as worker, \
+    synthetic_images as synthetic
+from project_code.image_manipulation.classes.wrapper import image_transform as transform
+
+import unittest
+import os
+import tempfile
+import time
+
+
+def wait_for_worker(analysis, timeout=60):
+    """Polls the worker until it is finished, returning all messages."""
+    messages = list()
+    end_time = time.monotonic() + timeout
+    while not analysis.finished and time.monotonic() < end_time:
+        messages.extend(analysis.poll())
+        time.sleep(0.01)
+    return messages
+
+
+class TestAnalysisWorker(unittest.TestCase):
+    def test_analysis(self):
+        image, circles = synthetic.generate_image(3, 160, 120, count=5, radii=(8, 13), blur=0.8)
+        analysis = worker.AnalysisWorker(image, {'size': 1, 'noise': 2, 'kernel_size': 5})
+        analysis.start()
+        messages = wait_for_worker(analysis)
+
+        self.assertFalse(analysis.process.is_alive())
+        progress = [message[1:3] for message in messages if message[0] == 'progress']
+        self.assertEqual(progress, [(step, 10) for step in range(11)])
+        self.assertEqual(messages[-1][0], 'done')
+
+        working_image = transform.TransformImage(image)
+        working_image.apply_canny(5, 2)
+        expected_circles = working_image.find_circles(1)
+        self.assertEqual(messages[-1][1], {radius: centers for radius, centers in expected_circles.items() if centers})
+
+    def test_prepare(self):
+        image, circles = synthetic.generate_image(4, 160, 120, count=5, radii=(8, 13), blur=0.8)
+        with tempfile.TemporaryDirectory() as directory:
+            image_path = os.path.join(directory, 'image.png')
+            image.save(image_path)
+            prepared_image = worker.AnalysisWorker(image_path, {'size': 1, 'noise': 2}, prepare=True)
+            prepared_image.start()
+
+            messages = list()
+            end_time = time.monotonic() + 60
+            while ('prepared',) not in messages and time.monotonic() < end_time:
+                messages.extend(prepared_image.poll())
+                time.sleep(0.01)
+            self.assertEqual([message[0] for message in messages], ['image', 'prepared'])
+            self.assertTrue(prepared_image.process.is_alive())
+
+            prepared_image.search({'size': 1, 'noise': 3})
+            messages.extend(wait_for_worker(prepared_image))
+
+        opened_image = messages[0][1]
+        self.assertEqual(opened_image.size, (1000, 750))
+        working_image = transform.TransformImage(opened_image)
+        working_image.apply_canny(3, 3)
+        expected_circles = working_image.find_circles(1)
+        self.assertEqual(messages[-1], ('done', {radius: centers for radius, centers in expected_circles.items()
+                                                 if centers}))
+
+    def test_error(self):
+        image, circles = synthetic.generate_image(3, 80, count=2, radii=(8, 13))
+        analysis = worker.AnalysisWorker(image, {'size': 9, 'noise': 2})
+        analysis.start()
+        messages = wait_for_worker(analysis)
+        self.assertEqual(messages[-1][0], 'error')
+        self.assertIn('KeyError', messages[-1][1])
+
+    def test_cancel(self):
+        image, circles = synthetic.generate_image(3, 600, count=20, radii=(30, 90))
+        analysis = worker.AnalysisWorker(image, {'size': 0, 'noise': 2})
+        analysis.start()
+        analysis.cancel()
+        self.assertFalse(analysis.process.is_alive())
+        self.assertTrue(analysis.finished)
+        self.assertEqual(analysis.poll(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
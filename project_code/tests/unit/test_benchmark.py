@@ -0,0 +1,58 @@
+from project_code import benchmark
+
+import unittest
+import json
+import os
+import tempfile
+import numpy as np
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_generated_image(self):
+        image = benchmark.generated_image(120, [6, 8], seed=3)
+        self.assertEqual(image.size, (120, 120))
+        self.assertTrue(np.array_equal(np.asarray(image), np.asarray(benchmark.generated_image(120, [6, 8], seed=3))))
+        self.assertFalse(np.array_equal(np.asarray(image), np.asarray(benchmark.generated_image(120, [6, 8], seed=4))))
+
+    def test_compare_results(self):
+        baseline = [{'image': 'a', 'width': 250, 'preset': None, 'stage': 'sobel', 'best': 0.1},
+                    {'image': 'a', 'width': 250, 'preset': 1, 'stage': 'hough', 'best': 1.0},
+                    {'image': 'a', 'width': 250, 'preset': 1, 'stage': 'pipeline', 'best': 0.001}]
+        results = [{'image': 'a', 'width': 250, 'preset': None, 'stage': 'sobel', 'best': 0.11},
+                   {'image': 'a', 'width': 250, 'preset': 1, 'stage': 'hough', 'best': 1.5},
+                   {'image': 'a', 'width': 250, 'preset': 1, 'stage': 'pipeline', 'best': 0.002},
+                   {'image': 'a', 'width': 500, 'preset': 1, 'stage': 'hough', 'best': 4.0}]
+
+        comparisons = benchmark.compare_results(results, baseline, threshold=0.2)
+        self.assertEqual([(comparison['stage'], comparison['regressed']) for comparison in comparisons],
+                         [('sobel', False), ('hough', True), ('pipeline', False)])
+        self.assertAlmostEqual(comparisons[1]['ratio'], 1.5)
+
+    def test_main(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output_name = os.path.join(directory, 'benchmark.json')
+            self.assertEqual(benchmark.main(['--sizes', '100', '--presets', '1', '--repeats', '1', '--images',
+                                             '--output', output_name]), 0)
+            with open(output_name) as output_file:
+                results = json.load(output_file)['results']
+
+            self.assertEqual([(result['stage'], result['preset']) for result in results],
+                             [('greyscale', None), ('gauss_blur', None), ('sobel', None), ('canny', None),
+                              ('hough', 1), ('pipeline', 1)])
+            self.assertEqual(results[-1]['circles'], results[-2]['circles'])
+            self.assertGreater(results[-1]['circles'], 0)
+
+            # Every stage is a lot slower than a baseline that took a microsecond.
+            for result in results:
+                result['best'] = 1e-6
+            baseline_name = os.path.join(directory, 'baseline.json')
+            with open(baseline_name, 'w') as baseline_file:
+                json.dump({'results': results}, baseline_file)
+            benchmark.minimum_difference, minimum_difference = -1, benchmark.minimum_difference
+            self.addCleanup(setattr, benchmark, 'minimum_difference', minimum_difference)
+            self.assertEqual(benchmark.main(['--sizes', '100', '--presets', '1', '--repeats', '1', '--images',
+                                             '--output', output_name, '--baseline', baseline_name]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
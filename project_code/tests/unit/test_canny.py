@@ -0,0 +1,101 @@
+from project_code.image_manipulation.classes import pixel_table as tables
+from project_code.image_manipulation import canny_edge_detector as canny
+
+import unittest
+import numpy as np
+
+
+def edge_table(values, orientation):
+    """Creates a pixel table that looks like the output of the sobel edge detector."""
+    a_pixel_table = tables.PixelTable(values.shape[1], values.shape[0])
+    a_pixel_table.values[...] = values
+    a_pixel_table.orientation[...] = orientation
+    a_pixel_table.update_on_mask()
+    return a_pixel_table
+
+
+class TestNonMaximumSuppression(unittest.TestCase):
+    def test_quantize_orientation(self):
+        orientation = np.array([0, 0.3, 0.5, 1.1, 1.3, np.pi / 2, -0.3, -0.5, -1.1, -1.3, np.nan])
+        self.assertEqual(list(canny.quantize_orientation(orientation)), [0, 0, 1, 1, 2, 2, 0, 3, 3, 2, 0])
+
+    def test_thins_vertical_edge(self):
+        values = np.tile(np.array([0, 10, 30, 50, 30, 10, 0], dtype=np.float32), (7, 1))
+        a_pixel_table = edge_table(values, np.zeros((7, 7)))
+
+        canny.non_maximum_suppressor(a_pixel_table, kernel_size=3)
+
+        self.assertTrue(a_pixel_table.on[:, 3].all())
+        self.assertEqual(a_pixel_table.on.sum(), 7)
+        self.assertEqual(a_pixel_table.values[:, 3].tolist(), [50] * 7)
+        self.assertTrue(np.isnan(a_pixel_table.orientation[:, 2]).all())
+
+    def test_thins_along_gradient(self):
+        values = np.zeros((7, 7), dtype=np.float32)
+        values[3, 3] = 50
+        values[2, 4] = 40
+        values[4, 2] = 40
+        values[2, 2] = 45
+
+        # Anti-diagonal gradient: (2, 4) and (4, 2) lie along the gradient of the center pixel.
+        a_pixel_table = edge_table(values, np.full((7, 7), np.pi / 4))
+        canny.non_maximum_suppressor(a_pixel_table, kernel_size=3)
+        self.assertTrue(a_pixel_table.on[3, 3])
+        self.assertFalse(a_pixel_table.on[2, 4])
+        self.assertFalse(a_pixel_table.on[4, 2])
+        self.assertTrue(a_pixel_table.on[2, 2])
+
+        # Main diagonal gradient: (2, 2) now suppresses nothing, because the center is stronger.
+        a_pixel_table = edge_table(values, np.full((7, 7), -np.pi / 4))
+        canny.non_maximum_suppressor(a_pixel_table, kernel_size=3)
+        self.assertTrue(a_pixel_table.on[3, 3])
+        self.assertFalse(a_pixel_table.on[2, 2])
+        self.assertTrue(a_pixel_table.on[2, 4])
+
+    def test_kernel_size_and_ties(self):
+        values = np.array([[0, 30, 20, 30, 0, 5, 5, 0]], dtype=np.float32)
+
+        a_pixel_table = edge_table(values, np.zeros(values.shape))
+        canny.non_maximum_suppressor(a_pixel_table, kernel_size=3)
+        # Equal neighbours keep only the first pixel.
+        self.assertEqual(list(np.nonzero(a_pixel_table.on[0])[0]), [1, 3, 5])
+
+        a_pixel_table = edge_table(values, np.zeros(values.shape))
+        canny.non_maximum_suppressor(a_pixel_table, kernel_size=5)
+        self.assertEqual(list(np.nonzero(a_pixel_table.on[0])[0]), [1])
+
+    def test_order_independent(self):
+        values = np.random.default_rng(2).uniform(0, 100, (30, 30)).astype(np.float32)
+        orientation = np.random.default_rng(3).uniform(-np.pi / 2, np.pi / 2, (30, 30))
+
+        a_pixel_table = edge_table(values, orientation)
+        canny.non_maximum_suppressor(a_pixel_table, kernel_size=5)
+
+        flipped_table = edge_table(values[::-1, ::-1].copy(), orientation[::-1, ::-1])
+        canny.non_maximum_suppressor(flipped_table, kernel_size=5)
+
+        self.assertTrue(np.array_equal(a_pixel_table.on, flipped_table.on[::-1, ::-1]))
+
+
+class TestHysteresisThresholding(unittest.TestCase):
+    def test_keeps_edges_with_strong_pixel(self):
+        values = np.zeros((12, 12), dtype=np.float32)
+        # A weak branching edge with one strong pixel.
+        values[3, 2:9] = 20
+        values[4:9, 5] = 20
+        values[4:9, 8] = 20
+        values[8, 8] = 100
+        # A weak edge without a strong pixel.
+        values[10, 2:9] = 20
+        # A very weak pixel inside the strong edge.
+        values[3, 3] = 1
+        a_pixel_table = edge_table(values, np.zeros((12, 12)))
+        a_pixel_table.turn_off(values == 0)
+
+        canny.hysteresis_thresholding(a_pixel_table, kernel_radius=1, noise=1)
+
+        self.assertTrue(a_pixel_table.on[3, 4:9].all())
+        self.assertTrue(a_pixel_table.on[4:9, 5].all())
+        self.assertTrue(a_pixel_table.on[4:9, 8].all())
+        self.assertFalse(a_pixel_table.on[3, 3])
+        self.assertFalse(a_pixel_table.on[10].any())
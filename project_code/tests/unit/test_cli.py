@@ -0,0 +1,92 @@
+from project_code import cli
+
+import unittest
+import json
+import os
+import tempfile
+from PIL import Image, ImageDraw
+
+
+def save_ring_image(file_name, circles, width=1000, height=400):
+    """Saves an image with a light ring for every (x, y, radius) circle on a dark background."""
+    image = Image.new('RGB', (width, height), (30, 30, 30))
+    drawing = ImageDraw.Draw(image)
+    for center_x, center_y, radius in circles:
+        drawing.ellipse((center_x - radius, center_y - radius, center_x + radius, center_y + radius),
+                        outline=(230, 230, 230), width=2)
+    image.save(file_name)
+
+
+class TestCommandLineInterface(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, *names):
+        return os.path.join(self.directory.name, *names)
+
+    def test_expand_image_paths(self):
+        os.makedirs(self.path('images', 'nested'))
+        for name in ('b.png', 'a.JPG', 'notes.txt', os.path.join('nested', 'c.tif')):
+            open(self.path('images', name), 'w').close()
+
+        self.assertEqual(cli.expand_image_paths([self.path('images')]),
+                         [self.path('images', 'a.JPG'), self.path('images', 'b.png')])
+        self.assertEqual(cli.expand_image_paths([self.path('images')], recursive=True),
+                         [self.path('images', 'a.JPG'), self.path('images', 'b.png'),
+                          self.path('images', 'nested', 'c.tif')])
+        self.assertEqual(cli.expand_image_paths([self.path('images', '*.png'), self.path('images', 'b.png'),
+                                                 self.path('missing.png')]),
+                         [self.path('images', 'b.png'), self.path('missing.png')])
+
+    def test_output_names(self):
+        self.assertEqual(cli.output_names(['a/x.png', 'b/x.png', 'c/y.tif'], 'out'),
+                         [os.path.join('out', 'x'), os.path.join('out', 'x_2'), os.path.join('out', 'y')])
+
+    def test_main(self):
+        circles = [(100, 80, 10), (500, 200, 12), (800, 300, 9)]
+        save_ring_image(self.path('rings.png'), circles)
+
+        exit_status = cli.main([self.path('rings.png'), self.path('missing.png'), '--size', '1', '--noise', '2',
+                                '--zoom', '0.5', '--output', self.path('results'), '--annotate'])
+
+        self.assertEqual(exit_status, 1)
+        with open(self.path('results', 'rings.json')) as result_file:
+            result = json.load(result_file)
+        self.assertEqual(result['circle_count'], 3)
+        self.assertEqual(sorted((circle['x'], circle['y']) for circle in result['circles']),
+                         sorted((center_x, center_y) for center_x, center_y, _ in circles))
+        self.assertAlmostEqual(result['mean_diameter'],
+                               sum(circle['diameter'] for circle in result['circles']) / 3)
+        with open(self.path('results', 'summary.json')) as summary_file:
+            self.assertEqual([summary['file'] for summary in json.load(summary_file)], [self.path('rings.png')])
+        self.assertEqual(Image.open(self.path('results', 'rings_circles.png')).size, (1000, 400))
+
+    def test_gradient_engine(self):
+        circles = [(100, 80, 10), (500, 200, 12), (800, 300, 9)]
+        save_ring_image(self.path('rings.png'), circles)
+
+        for tolerance_arguments in ([], ['--angular-tolerance', '0.3']):
+            self.assertEqual(cli.main([self.path('rings.png'), '--size', '1', '--noise', '2', '--engine', 'gradient',
+                                       '--output', self.path('results')] + tolerance_arguments), 0)
+            with open(self.path('results', 'rings.json')) as result_file:
+                result = json.load(result_file)
+            self.assertEqual(sorted((circle['x'], circle['y']) for circle in result['circles']),
+                             sorted((center_x, center_y) for center_x, center_y, _ in circles))
+
+    def test_events_of_workers(self):
+        for name in ('first.png', 'second.png'):
+            save_ring_image(self.path(name), [(100, 80, 10), (500, 200, 12)])
+
+        self.assertEqual(cli.main([self.path('first.png'), self.path('second.png'), '--size', '1', '--noise', '2',
+                                   '--output', self.path('results'), '--events', self.path('events.jsonl'),
+                                   '--workers', '2']), 0)
+
+        # The workers send their events to the main process, which writes every event on its own line.
+        with open(self.path('events.jsonl')) as event_file:
+            events = [json.loads(line) for line in event_file]
+        self.assertEqual(sorted(event['file'] for event in events if event['event'] == 'analyse_file'),
+                         [self.path('first.png'), self.path('second.png')])
+        self.assertEqual(sum(event['event'] == 'hough' for event in events), 2)
+        with open(self.path('results', 'first.json')) as result_file:
+            self.assertNotIn('events', json.load(result_file))
@@ -0,0 +1,79 @@
+from project_code import \
+    evaluation, \
+    synthetic_images as synthetic
+
+import unittest
+import json
+import os
+import tempfile
+
+
+class TestEvaluation(unittest.TestCase):
+    def test_match_circles(self):
+        true_circles = [(20, 20, 10), (50, 20, 12), (80, 60, 15)]
+        found_circles = [(51, 21, 13), (21, 20, 10), (20, 22, 11), (80, 60, 20), (5, 5, 8)]
+
+        matches = evaluation.match_circles(found_circles, true_circles, center_tolerance=3, radius_tolerance=2)
+        self.assertEqual(sorted(matches), [(0, 1), (1, 0)])
+        self.assertEqual(evaluation.match_circles([], true_circles), [])
+
+        scores = evaluation.score_matches(found_circles, true_circles, matches)
+        self.assertEqual((scores['true_positives'], scores['false_positives'], scores['false_negatives']), (2, 3, 1))
+        self.assertAlmostEqual(scores['precision'], 2 / 5)
+        self.assertAlmostEqual(scores['recall'], 2 / 3)
+        self.assertAlmostEqual(scores['radius_error'], 0.5)
+        self.assertAlmostEqual(scores['radius_bias'], 0.5)
+        self.assertAlmostEqual(scores['center_error'], (2 ** 0.5 + 1) / 2)
+        self.assertIsNone(evaluation.score_matches([], true_circles, [])['radius_error'])
+
+    def test_cheapest_configuration(self):
+        reports = [{'configuration': {'name': 'slow'}, 'precision': 1.0, 'recall': 0.95, 'seconds_per_image': 2.0},
+                   {'configuration': {'name': 'fast'}, 'precision': 1.0, 'recall': 0.85, 'seconds_per_image': 0.5},
+                   {'configuration': {'name': 'medium'}, 'precision': 0.9, 'recall': 0.9, 'seconds_per_image': 1.0}]
+        self.assertEqual(evaluation.cheapest_configuration(reports)['configuration']['name'], 'fast')
+        self.assertEqual(evaluation.cheapest_configuration(reports, 0.9, 0.9)['configuration']['name'], 'medium')
+        self.assertEqual(evaluation.cheapest_configuration(reports, 0.95, 0.9)['configuration']['name'], 'slow')
+        self.assertIsNone(evaluation.cheapest_configuration(reports, 1.0, 1.0))
+
+    def test_tiled_stage_times(self):
+        image, true_circles = synthetic.generate_image(3, width=160, height=120, count=5, radii=(8, 13), blur=0.8)
+
+        _, serial_times = evaluation.run_configuration(image, {'size': 1, 'tile_size': 64})
+        _, parallel_times = evaluation.run_configuration(image, {'size': 1, 'tile_size': 64, 'workers': 2})
+
+        # The tiles of the parallel search run in other processes, so its edge detection is not charged to 'hough'.
+        self.assertGreater(serial_times['hough'], 0)
+        self.assertNotIn('hough', parallel_times)
+        for stage_times in (serial_times, parallel_times):
+            self.assertGreater(stage_times[evaluation.tiled_stage], 0)
+        table = evaluation.format_table([{'configuration': {'name': 'tiled'}, 'precision': 1.0, 'recall': 1.0,
+                                          'radius_error': None, 'radius_bias': None, 'center_error': None,
+                                          'stage_times': parallel_times, 'images': [{}]}])
+        row = table.splitlines()[1].split()
+        # The name and the five scores come before the stages.
+        self.assertEqual(row[6 + evaluation.reported_stages.index('hough')], '-')
+        self.assertNotEqual(row[6 + len(evaluation.reported_stages)], '-')
+
+    def test_main(self):
+        with tempfile.TemporaryDirectory() as directory:
+            synthetic.save_image_set(directory, 2, width=160, height=120, count=5, radii=(8, 13), blur=0.8,
+                                     gaussian_noise=3)
+            report_name = os.path.join(directory, 'report.json')
+            self.assertEqual(evaluation.main([directory, '--config', '{"name": "full", "size": 1}',
+                                              '--config', '{"size": 1, "engine": "fft"}', '--min-recall', '0.8',
+                                              '--output', report_name]), 0)
+            with open(report_name) as report_file:
+                reports = json.load(report_file)
+
+        full_report, fft_report = reports
+        self.assertEqual(len(full_report['images']), 2)
+        self.assertGreaterEqual(full_report['recall'], 0.8)
+        for score_name in ('true_positives', 'false_positives', 'false_negatives', 'radius_error'):
+            self.assertEqual(full_report[score_name], fft_report[score_name])
+        for stage_name in evaluation.reported_stages + ('total',):
+            self.assertGreater(full_report['stage_times'][stage_name], 0)
+        self.assertEqual(evaluation.configuration_name(fft_report['configuration']), 'engine=fft size=1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,328 @@
-from project_code.image_manipulation import hough_circle_transform as hough
+from project_code.image_manipulation import \
+    hough_circle_transform as hough, \
+    scratch_memory as scratch
+from project_code.image_manipulation.classes import \
+    basic_shapes as shapes, \
+    pixel_table as tables
+from project_code.my_maths import calculus as calc
 
 import unittest
+from unittest import mock
+import os
+import tempfile
+import numpy as np
+
+
+def circle_edge_table(circles, width=80, height=60):
+    """Creates a pixel table with the circumference of every (x, y, radius) circle turned on."""
+    a_pixel_table = tables.PixelTable(width, height)
+    for center_x, center_y, radius in circles:
+        for x, y in shapes.Circle(radius, center_x, center_y).circumference_indexes():
+            if 0 <= x < width and 0 <= y < height:
+                a_pixel_table.values[y, x] = 255
+    a_pixel_table.update_on_mask()
+    return a_pixel_table
+
+
+def ring_edge_table(circles, width=80, height=60):
+    """Creates a pixel table with every pixel at a rounded distance of the radius of a (x, y, radius) circle turned on
+    and oriented towards the center of the circle."""
+    a_pixel_table = tables.PixelTable(width, height)
+    rows, columns = np.indices((height, width))
+    for center_x, center_y, radius in circles:
+        ring = np.rint(np.hypot(columns - center_x, rows - center_y)) == radius
+        # The y-axis points up, the orientation is folded into (-pi/2, pi/2].
+        orientation = np.arctan(-(rows - center_y) / np.where(columns == center_x, 1e-9, columns - center_x))
+        a_pixel_table.values[ring] = 255
+        a_pixel_table.orientation[ring] = orientation[ring]
+    a_pixel_table.update_on_mask()
+    return a_pixel_table
 
 
 class TestHoughCircleTransform(unittest.TestCase):
-    def test_construct_3d_space(self):
-        a_dict = {2: [(2, 3, 2), (5, 1, 6), (3, 6, 4)], 3: [(3, 3, 1), (2, 3, 5), (6, 5, 9)], 4: [3, 3, 100]}
+    def test_draw_around_pixels(self):
+        x_shifts, y_shifts = shapes.circle_stencil(3)
+        edge_indexes = (np.array([5, 0]), np.array([5, 0]))
+
+        accumulator = hough.draw_around_pixels(edge_indexes, (x_shifts, y_shifts), (11, 11))
+
+        self.assertEqual(accumulator.dtype, np.float32)
+        votes_inside = len(x_shifts) + np.count_nonzero((x_shifts >= 0) & (y_shifts >= 0))
+        self.assertAlmostEqual(accumulator.sum() * len(x_shifts), votes_inside, places=3)
+        for x_shift, y_shift in zip(x_shifts, y_shifts):
+            self.assertGreater(accumulator[5 + y_shift, 5 + x_shift], 0)
+        self.assertEqual(accumulator[5, 5], 0)
+
+    def test_find_circles_set_radius(self):
+        a_pixel_table = circle_edge_table([(30, 25, 12), (60, 35, 15)])
+
+        x, y, magnitudes = hough.find_circles_set_radius(a_pixel_table, 12)
+
+        self.assertEqual((x.tolist(), y.tolist()), ([30], [25]))
+        self.assertAlmostEqual(magnitudes[0], 1, places=5)
+        # The pixel table is left untouched.
+        self.assertTrue(np.isnan(a_pixel_table.cache).all())
+
+    def test_draw_along_gradients(self):
+        # A vertical edge pixel at (x=10, y=10) and a diagonal edge pixel at (x=20, y=20).
+        edge_indexes = (np.array([10, 20, 5]), np.array([10, 20, 5]))
+        orientations = np.array([0, np.pi / 4, np.nan], dtype=np.float32)
+
+        accumulator = hough.draw_along_gradients(edge_indexes, orientations, 4, (30, 30), angular_tolerance=0.0)
+
+        votes = accumulator * len(shapes.circle_stencil(4)[0])
+        self.assertEqual(np.rint(votes).sum(), 4)
+        for y, x in ((10, 6), (10, 14), (17, 23), (23, 17)):
+            self.assertAlmostEqual(votes[y, x], 1, places=4)
+
+        spread_accumulator = hough.draw_along_gradients(edge_indexes, orientations, 4, (30, 30), angular_tolerance=0.5)
+        spread_votes = np.rint(spread_accumulator * len(shapes.circle_stencil(4)[0]))
+        # Every edge pixel votes at most once per pixel, on both sides of its gradient.
+        self.assertEqual(spread_votes.max(), 1)
+        self.assertEqual(spread_votes[10, 6], 1)
+        self.assertGreater(spread_votes.sum(), 4)
+        self.assertEqual(spread_votes[5, 5], 0)
+
+    def test_gradient_engine(self):
+        a_pixel_table = ring_edge_table([(20, 20, 8), (55, 30, 14)])
+
+        x, y, radii, scores = hough.find_circles_radius_range(a_pixel_table, range(6, 17), engine='gradient',
+                                                              angular_tolerance=0.1)
+
+        self.assertEqual(sorted(zip(x.tolist(), y.tolist(), radii.tolist())), [(20, 20, 8), (55, 30, 14)])
+        self.assertTrue((scores > 0.5).all())
+
+        with self.assertRaises(ValueError):
+            hough.find_circles_radius_range(a_pixel_table, range(6, 17), engine='unknown')
+
+    def test_fft_engine(self):
+        edge_mask = np.random.default_rng(3).random((40, 50)) > 0.9
+        edge_indexes = np.nonzero(edge_mask)
+
+        circle_volume = hough.accumulate_radius_range(edge_indexes, edge_mask.shape, range(2, 30, 3))
+        fft_volume = hough.accumulate_radius_range(edge_indexes, edge_mask.shape, range(2, 30, 3), engine='fft')
+
+        self.assertEqual(fft_volume.dtype, np.float32)
+        self.assertTrue(np.array_equal(fft_volume, circle_volume))
+
+        a_pixel_table = circle_edge_table([(30, 25, 12), (60, 35, 15)])
+        for fft_result, circle_result in zip(hough.find_circles_set_radius(a_pixel_table, 12, engine='fft'),
+                                             hough.find_circles_set_radius(a_pixel_table, 12)):
+            self.assertTrue(np.array_equal(fft_result, circle_result))
+
+    def test_auto_engine(self):
+        edge_mask = np.random.default_rng(4).random((40, 50)) > 0.7
+        edge_indexes = np.nonzero(edge_mask)
+        radii = range(2, 30, 3)
+
+        circle_volume = hough.accumulate_radius_range(edge_indexes, edge_mask.shape, radii)
+        auto_volume = hough.accumulate_radius_range(edge_indexes, edge_mask.shape, radii, engine='auto')
+
+        self.assertTrue(np.array_equal(auto_volume, circle_volume))
+        # The small radii are drawn and the large radii convolved.
+        with mock.patch.object(hough, 'draw_around_pixels', wraps=hough.draw_around_pixels) as draw, \
+                mock.patch.object(hough, 'convolve_ring', wraps=hough.convolve_ring) as convolve:
+            hough.accumulate_radius_range(edge_indexes, edge_mask.shape, radii, engine='auto')
+        self.assertGreater(draw.call_count, 0)
+        self.assertGreater(convolve.call_count, 0)
+        self.assertEqual(draw.call_count + convolve.call_count, len(radii))
+
+    def test_find_accumulator_peaks(self):
+        accumulator = np.zeros((20, 30), dtype=np.float32)
+        accumulator[5, 5] = 0.6
+        accumulator[6, 7] = 0.55
+        # A plateau: only its first value is a peak.
+        accumulator[12, 20:23] = 0.8
+        accumulator[15, 10] = 0.7
+        # Too weak.
+        accumulator[15, 25] = 0.4
+        # On the border.
+        accumulator[0, 15] = 0.9
+
+        x, y, magnitudes = hough.find_accumulator_peaks(accumulator, 0.5, 2, border=1)
+
+        self.assertEqual(list(zip(x.tolist(), y.tolist())), [(20, 12), (10, 15), (5, 5)])
+        self.assertTrue(np.allclose(magnitudes, [0.8, 0.7, 0.6]))
+
+        # A smaller footprint separates the two nearby peaks.
+        x, y, magnitudes = hough.find_accumulator_peaks(accumulator, 0.5, 1, border=1)
+        self.assertEqual(list(zip(x.tolist(), y.tolist())), [(20, 12), (10, 15), (5, 5), (7, 6)])
+
+        x, y, magnitudes = hough.find_accumulator_peaks(accumulator, 0.5, (0, 1), top_k=2)
+        self.assertEqual(list(zip(x.tolist(), y.tolist())), [(15, 0), (20, 12)])
+
+    def test_find_circles_parallel(self):
+        a_pixel_table = ring_edge_table([(20, 20, 8), (55, 30, 14), (58, 16, 6), (40, 45, 9)])
+
+        for engine in ('circle', 'gradient'):
+            serial_circles = hough.find_circles_radius_range(a_pixel_table, range(4, 17), engine=engine,
+                                                             angular_tolerance=0.1, radius_radius=2)
+            parallel_circles = hough.find_circles_radius_range(a_pixel_table, range(4, 17), engine=engine,
+                                                               angular_tolerance=0.1, radius_radius=2, workers=3)
+            self.assertGreater(len(serial_circles[0]), 2)
+            for serial_result, parallel_result in zip(serial_circles, parallel_circles):
+                self.assertTrue(np.array_equal(serial_result, parallel_result))
+
+    @unittest.skipUnless(os.path.isdir('/dev/shm'), 'needs the shared memory directory of linux')
+    def test_find_circles_parallel_cleanup(self):
+        a_pixel_table = ring_edge_table([(20, 20, 8), (55, 30, 14)])
+        shared_blocks = set(os.listdir('/dev/shm'))
+
+        close = hough.shared_memory.SharedMemory.close
+
+        def close_in_use(block):
+            """Closes the block, but the first time fails as if an array still used it."""
+            first_close = block.buf is not None
+            close(block)
+            if first_close:
+                raise BufferError('cannot close exported pointers exist')
+
+        # Neither the failing blocks nor the failing search may keep the blocks from being unlinked or hide the error.
+        with mock.patch.object(hough, '_select_volume_peaks', side_effect=RuntimeError('selection failed')), \
+                mock.patch.object(hough.shared_memory.SharedMemory, 'close', close_in_use):
+            with self.assertRaisesRegex(RuntimeError, 'selection failed'):
+                hough.find_circles_parallel(a_pixel_table, range(4, 17), 2)
+
+        self.assertEqual(set(os.listdir('/dev/shm')), shared_blocks)
+
+    def test_find_circles_spilled_to_disk(self):
+        a_pixel_table = ring_edge_table([(20, 20, 8), (55, 30, 14), (58, 16, 6), (40, 45, 9)])
+        expected_circles = hough.find_circles_radius_range(a_pixel_table, range(4, 17), radius_radius=2)
+
+        with tempfile.TemporaryDirectory() as scratch_directory:
+            self.addCleanup(scratch.configure, *scratch.settings())
+            scratch.configure(0, scratch_directory)
+            volume = hough.accumulate_radius_range(hough.edge_points(a_pixel_table), a_pixel_table.shape, range(4, 17))
+            self.assertIsInstance(volume, np.memmap)
+            del volume
+
+            for workers in (1, 2):
+                spilled_circles = hough.find_circles_radius_range(a_pixel_table, range(4, 17), radius_radius=2,
+                                                                  workers=workers)
+                for expected_result, spilled_result in zip(expected_circles, spilled_circles):
+                    self.assertTrue(np.array_equal(expected_result, spilled_result))
+            self.assertEqual(os.listdir(scratch_directory), [])
+
+    def test_accumulate_shard(self):
+        a_pixel_table = ring_edge_table([(20, 20, 8), (55, 30, 14)])
+        radii = list(range(4, 17))
+        expected_volume = hough.accumulate_radius_range(hough.edge_points(a_pixel_table), a_pixel_table.shape, radii)
+        shared_volume = np.zeros_like(expected_volume)
+        shared_maximum = np.zeros_like(expected_volume)
+        planes = {'edge_map': (None, a_pixel_table.on), 'orientation': (None, a_pixel_table.orientation),
+                  'accumulator_volume': (None, shared_volume), 'spatial_maximum': (None, shared_maximum)}
+
+        # The layers are written into the shared volume one at a time, without a private volume of the shard.
+        with mock.patch.dict(hough._shared_planes, planes), \
+                mock.patch.object(scratch, 'empty', side_effect=AssertionError('private volume')):
+            hough._accumulate_shard([1, 4, 7], radii, 'circle', 0.2, 3)
+
+        self.assertTrue(np.array_equal(shared_volume[[1, 4, 7]], expected_volume[[1, 4, 7]]))
+        self.assertFalse(shared_volume[[0, 2, 3, 5, 6, 8]].any())
+        self.assertTrue(np.array_equal(shared_maximum[4], calc.maximum_filter(expected_volume[4], 3)))
+
+    def test_first_of_ties(self):
+        random = np.random.default_rng(4)
+        for window_radius in ((2, 3, 3), (0, 1, 5)):
+            peak_indexes = np.stack((random.integers(0, 12, 600), random.integers(-20, 60, 600),
+                                     random.integers(0, 90, 600)), axis=1)
+
+            keep = hough._first_of_ties(peak_indexes, window_radius)
+
+            # Every peak compared with all earlier peaks.
+            within_window = np.all(np.abs(peak_indexes[:, np.newaxis] - peak_indexes) <= window_radius, axis=2)
+            expected_keep = ~np.tril(within_window, -1).any(axis=1)
+            self.assertTrue(np.array_equal(keep, expected_keep))
+            self.assertTrue(0 < np.count_nonzero(keep) < 600)
+        self.assertEqual(hough._first_of_ties(np.zeros((0, 2), dtype=np.intp), (1, 1)).tolist(), [])
+
+    def test_merge_circles(self):
+        x = np.array([10, 11, 40, 10, 60])
+        y = np.array([10, 10, 40, 30, 60])
+        radii = np.array([8, 9, 8, 8, 20])
+        scores = np.array([0.6, 0.7, 0.6, 0.6, 0.9], dtype=np.float32)
+
+        merged_x, merged_y, merged_radii, merged_scores = hough.merge_circles(x, y, radii, scores, 3, 2)
+
+        self.assertEqual(list(zip(merged_x.tolist(), merged_y.tolist(), merged_radii.tolist())),
+                         [(10, 30, 8), (40, 40, 8), (11, 10, 9), (60, 60, 20)])
+        self.assertTrue(np.allclose(merged_scores, [0.6, 0.6, 0.7, 0.9]))
+
+    def test_downsample_edges(self):
+        edge_map = np.zeros((5, 7), dtype=bool)
+        edge_map[0, 0] = edge_map[3, 3] = edge_map[4, 6] = True
+
+        self.assertEqual(hough.downsample_edges(edge_map, 2).tolist(), [[True, False, False, False],
+                                                                        [False, True, False, False],
+                                                                        [False, False, False, True]])
+        self.assertEqual(hough.pyramid_factor(range(10, 20)), 1)
+        self.assertEqual(hough.pyramid_factor(range(30, 101)), 2)
+        self.assertEqual(hough.pyramid_factor(range(100, 201)), 8)
+
+    def test_find_circles_pyramid(self):
+        a_pixel_table = ring_edge_table([(40, 40, 21), (110, 50, 30), (60, 100, 25)], width=160, height=140)
+
+        full_circles = hough.find_circles_radius_range(a_pixel_table, range(18, 35))
+        pyramid_circles = hough.find_circles_pyramid(a_pixel_table, range(18, 35), factor=2)
+
+        self.assertEqual(len(full_circles[0]), 3)
+        for full_result, pyramid_result in zip(full_circles, pyramid_circles):
+            self.assertTrue(np.array_equal(full_result, pyramid_result))
+        with self.assertRaises(ValueError):
+            hough.find_circles_pyramid(a_pixel_table, range(18, 35), engine='gradient')
+
+    def test_stream_circles_radius_range(self):
+        a_pixel_table = ring_edge_table([(20, 20, 8), (55, 30, 14), (58, 16, 6), (40, 45, 9), (22, 40, 9)])
+
+        for engine in ('circle', 'fft'):
+            for radius_radius in (1, 3, 6):
+                batch_circles = hough.find_circles_radius_range(a_pixel_table, range(4, 17), engine=engine,
+                                                                radius_radius=radius_radius)
+                streamed_batches = list(hough.stream_circles_radius_range(a_pixel_table, range(4, 17), engine=engine,
+                                                                          radius_radius=radius_radius))
+
+                self.assertEqual(len(streamed_batches), 13)
+                for radius, (x, y, radii, scores) in zip(range(4, 17), streamed_batches):
+                    self.assertTrue((radii == radius).all())
+                self.assertGreater(len(batch_circles[0]), 2)
+                for batch_result, streamed_result in zip(batch_circles, zip(*streamed_batches)):
+                    self.assertTrue(np.array_equal(batch_result, np.concatenate(streamed_result)))
+
+    def test_find_volume_peaks(self):
+        accumulator_volume = np.zeros((5, 30, 30), dtype=np.float32)
+        accumulator_volume[1, 10, 10] = 0.9
+        accumulator_volume[2, 11, 10] = 0.8
+        # A plateau: only the first value is a peak.
+        accumulator_volume[3, 20, 20:23] = 0.7
+        # Too weak.
+        accumulator_volume[4, 10, 20] = 0.4
+        # Too close to the border for its radius.
+        accumulator_volume[0, 2, 15] = 0.9
+
+        x, y, radii, scores = hough.find_volume_peaks(accumulator_volume, range(3, 8), threshold=0.5,
+                                                       spatial_radius=2, radius_radius=1)
+
+        self.assertEqual(list(zip(x, y, radii)), [(10, 10, 4), (20, 20, 6)])
+        self.assertTrue(np.allclose(scores, [0.9, 0.7]))
+
+        # A plateau along the radius: only the smallest radius is kept.
+        accumulator_volume[:, 15, 15] = 0.6
+        x, y, radii, scores = hough.find_volume_peaks(accumulator_volume, range(3, 8), threshold=0.5,
+                                                       spatial_radius=2, radius_radius=1)
+
+        self.assertEqual(list(zip(x, y, radii)), [(15, 15, 3), (10, 10, 4), (20, 20, 6)])
+
+    def test_find_circles_radius_range(self):
+        a_pixel_table = circle_edge_table([(20, 20, 8), (55, 30, 14)])
+
+        x, y, radii, scores = hough.find_circles_radius_range(a_pixel_table, range(6, 17))
+
+        self.assertEqual(sorted(zip(x.tolist(), y.tolist(), radii.tolist())), [(20, 20, 8), (55, 30, 14)])
+        self.assertTrue((scores > 0.5).all())
+
+    def test_find_circles_unset_size(self):
+        a_pixel_table = circle_edge_table([(20, 20, 8), (55, 30, 12), (60, 12, 8)])
+
+        circle_centers = hough.find_circles_unset_size(a_pixel_table, size=1)
 
-        space3d = hough.constructs_magnitudes_in_3d_space(a_dict, 2, 2, 2, 1, True)
-        print(space3d)
-        self.assertEqual(space3d.shape, (2, 2, 2))
-        self.assertEqual(list(space3d[0]), [[0, 0, 0], [0, 0, 0], [0, 0, 0]])
+        self.assertEqual(circle_centers, {8: [(60, 12), (20, 20)], 12: [(55, 30)]})
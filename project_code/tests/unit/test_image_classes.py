@@ -1,6 +1,5 @@
 from project_code.image_manipulation.classes import \
     basic_shapes as shapes, \
-    edge as edges, \
     pixel as pix, \
     pixel_table as tables
 
@@ -19,6 +18,59 @@ class TestBasicShapes(unittest.TestCase):
         self.assertEqual(a_circle.center, (1, 4))
         self.assertEqual(a_circle.radius, 2)
 
+    def test_circle_stencil(self):
+        for radius in (1, 2, 5, 17, 60):
+            x_shifts, y_shifts = shapes.circle_stencil(radius)
+            offsets = set(zip(x_shifts.tolist(), y_shifts.tolist()))
+
+            # Every pixel occurs once and the circle is symmetric in both axes and the diagonal.
+            self.assertEqual(len(offsets), len(x_shifts))
+            self.assertEqual(offsets, {(-x, y) for x, y in offsets})
+            self.assertEqual(offsets, {(x, -y) for x, y in offsets})
+            self.assertEqual(offsets, {(y, x) for x, y in offsets})
+            self.assertTrue((np.abs(np.hypot(x_shifts, y_shifts) - radius) < 0.75).all())
+            # The circumference is closed: every pixel has exactly two 8-connected neighbours on the circle.
+            for x, y in offsets:
+                neighbours = sum((x + dx, y + dy) in offsets for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy)
+                self.assertGreaterEqual(neighbours, 2)
+
+        self.assertEqual(list(zip(*shapes.circle_stencil(0))), [(0, 0)])
+        self.assertEqual(sorted(zip(*shapes.circle_stencil(1))), [(-1, 0), (0, -1), (0, 1), (1, 0)])
+
+    def test_circle_stencil_thickness(self):
+        x_shifts, y_shifts = shapes.circle_stencil(10, 3)
+        distances = np.hypot(x_shifts, y_shifts)
+        offsets = set(zip(x_shifts.tolist(), y_shifts.tolist()))
+
+        # All pixels of the midpoint circles from radius 9 up to and including 11.
+        for radius in (9, 10, 11):
+            self.assertTrue(set(zip(*shapes.circle_stencil(radius))) <= offsets)
+        self.assertTrue((distances > 8).all() and (distances < 12).all())
+        # Without holes between the rings.
+        rows, columns = np.indices((31, 31)) - 15
+        ring = (np.hypot(rows, columns) >= 9.5) & (np.hypot(rows, columns) <= 10.5)
+        self.assertTrue(set(zip(columns[ring].tolist(), rows[ring].tolist())) <= offsets)
+
+    def test_circle_stencil_cache(self):
+        x_shifts, y_shifts = shapes.circle_stencil(12)
+
+        self.assertIs(shapes.circle_stencil(12)[0], x_shifts)
+        self.assertIsNot(shapes.circle_stencil(12, 2)[0], x_shifts)
+        with self.assertRaises(ValueError):
+            x_shifts[0] = 0
+        self.assertLessEqual(shapes.circle_stencil.cache_info().currsize, shapes.stencil_cache_size)
+
+    def test_circumference_indexes(self):
+        a_circle = shapes.Circle(3, 10, 20)
+        x_shifts, y_shifts = shapes.circle_stencil(3)
+
+        self.assertEqual(a_circle.circumference_indexes(),
+                         [(x + 10, y + 20) for x, y in zip(x_shifts.tolist(), y_shifts.tolist())])
+        self.assertEqual(a_circle.circumference_indexes_fitted(12, 30, 8, 0),
+                         [(x, y) for x, y in a_circle.circumference_indexes() if 8 < x < 12])
+        self.assertEqual(shapes.partial_circle_circumference([(1, 1), (5, 5), (0, 3), (3, 6)], 6, 6, 0, 0),
+                         [(1, 1), (5, 5)])
+
 
 class TestPixel(unittest.TestCase):
     """"""
@@ -138,134 +190,6 @@ class TestPixel(unittest.TestCase):
             self.assertNotEqual(pixel_a.copy_orientation_as_colour(), colour_angle)
 
 
-class TestEdge(unittest.TestCase):
-    """"""
-
-    def test_construction_edge(self):
-        an_edge = edges.ContinuousEdge()
-        self.assertEqual(an_edge.pixels, [])
-
-        a_pixel = pix.GrayPixel(200)
-        an_edge = edges.ContinuousEdge(a_pixel)
-        self.assertEqual(an_edge.pixels, [a_pixel])
-
-        # Other objects than pixels, like integers, can also be given.
-        an_edge = edges.ContinuousEdge(150)
-        self.assertEqual(an_edge.pixels, [150])
-
-        an_edge = edges.ContinuousEdge(15.1)
-        self.assertEqual(an_edge.pixels, [15.1])
-
-    def test_add_pixel(self):
-        an_edge = edges.ContinuousEdge()
-        self.assertEqual(an_edge.pixels, [])
-
-        a_pixel = pix.GrayPixel(200)
-        an_edge.add_pixel(a_pixel)
-        self.assertEqual(an_edge.pixels, [a_pixel])
-
-        another_pixel = pix.GrayPixel(144)
-        an_edge.add_pixel(another_pixel)
-        self.assertEqual(an_edge.pixels, [a_pixel, another_pixel])
-
-    def test_fill_pixels(self):
-        pixel_a = pix.GrayPixel(10)
-        pixel_b = pix.GrayPixel(20)
-        pixel_c = pix.GrayPixel(0)
-        pixel_d = pix.GrayPixel(0)
-        pixel_e = pix.GrayPixel(0)
-        pixel_f = pix.GrayPixel(60)
-        pixel_g = pix.GrayPixel(0)
-        pixel_h = pix.GrayPixel(0)
-        pixel_i = pix.GrayPixel(90)
-
-        a_pixel_matrix = np.array([[pixel_a, pixel_b, pixel_c],
-                                   [pixel_d, pixel_e, pixel_f],
-                                   [pixel_g, pixel_h, pixel_i]])
-
-        an_edge = edges.ContinuousEdge(pixel_a)
-        an_edge.fill_missing_pixels(np.array(a_pixel_matrix), 0, 0, 1)
-
-        self.assertEqual(an_edge.pixels[0], pixel_a)
-        self.assertEqual(an_edge.pixels[0].cache, 1)
-
-        self.assertEqual(an_edge.pixels[1], pixel_b)
-        self.assertEqual(an_edge.pixels[1].cache, 1)
-
-        self.assertEqual(an_edge.pixels[2], pixel_f)
-        self.assertEqual(an_edge.pixels[3], pixel_i)
-
-        # Does not record pixels more than once.
-        a_pixel_matrix = np.array([[pixel_a, pixel_e, pixel_c],
-                                   [pixel_d, pixel_b, pixel_f],
-                                   [pixel_g, pixel_h, pixel_i]])
-
-        another_edge = edges.ContinuousEdge(pixel_f)
-        another_edge.fill_missing_pixels(a_pixel_matrix, 0, 2, 1)
-
-        self.assertEqual(another_edge.pixels[0], pixel_f)
-        self.assertEqual(len(another_edge.pixels), 1)
-
-        for pixel_row in a_pixel_matrix:
-            for pixel in pixel_row:
-                pixel.cache = None
-
-        yet_another_edge = edges.ContinuousEdge(pixel_b)
-        yet_another_edge.fill_missing_pixels(a_pixel_matrix, 1, 1)
-        # Finds the pixels again after the cache has been cleared. Searches left top first and goes up to down.
-        self.assertEqual(yet_another_edge.pixels[0], pixel_b)
-        self.assertEqual(yet_another_edge.pixels[1], pixel_a)
-
-    def test_turn_off(self):
-        pixel_a = pix.GrayPixel(10)
-        pixel_b = pix.GrayPixel(20)
-        pixel_c = pix.GrayPixel(30)
-        pixel_d = pix.GrayPixel(40)
-
-        an_edge = edges.ContinuousEdge(start_pixel=pixel_a)
-        an_edge.add_pixel(pixel_b)
-        an_edge.add_pixel(pixel_c)
-        an_edge.add_pixel(pixel_d)
-
-        self.assertEqual(an_edge.pixels, [10, 20, 30, 40])
-
-        an_edge.turn_off()
-
-        self.assertEqual(an_edge.pixels, [0, 0, 0, 0])
-        self.assertEqual(pixel_a, 0)
-        self.assertEqual(pixel_b, 0)
-        self.assertEqual(pixel_c, 0)
-        self.assertEqual(pixel_d, 0)
-
-        an_edge.turn_off()
-
-        self.assertEqual(an_edge.pixels, [0, 0, 0, 0])
-
-    def validate(self):
-        thresholds = [-30, 0, 11, 20, 39.9, 40]
-
-        pixel_a = pix.GrayPixel(10)
-        pixel_b = pix.GrayPixel(20)
-        pixel_c = pix.GrayPixel(30)
-        pixel_d = pix.GrayPixel(40)
-
-        an_edge = edges.ContinuousEdge(start_pixel=pixel_a)
-        an_edge.add_pixel(pixel_b)
-        an_edge.add_pixel(pixel_c)
-        an_edge.add_pixel(pixel_d)
-
-        for threshold in thresholds:
-            an_edge.validate(threshold)
-            self.assertEqual(an_edge.pixels, [10, 20, 30, 40])
-
-        an_edge.validate(40.1)
-        self.assertEqual(an_edge.pixels, [0, 0, 0, 0])
-        self.assertEqual(pixel_a, 0)
-        self.assertEqual(pixel_b, 0)
-        self.assertEqual(pixel_c, 0)
-        self.assertEqual(pixel_d, 0)
-
-
 class TextPixelTable(unittest.TestCase):
     def test_construction_pixel_table(self):
         with self.assertRaises(ValueError):
@@ -273,23 +197,27 @@ class TextPixelTable(unittest.TestCase):
             tables.PixelTable(1, -1)
 
         a_pixel_table = tables.PixelTable(3, 3)
-        self.assertEqual(a_pixel_table.pixels.shape, (3, 3))
+        self.assertEqual(a_pixel_table.shape, (3, 3))
+        self.assertEqual(a_pixel_table.values.dtype, np.float32)
+        self.assertEqual(a_pixel_table.on.dtype, bool)
+        self.assertTrue(np.isnan(a_pixel_table.cache).all())
+        self.assertTrue(np.isnan(a_pixel_table.orientation).all())
 
         a_pixel_table = tables.PixelTable(30, 60)
-        self.assertEqual(a_pixel_table.pixels.shape, (60, 30))
+        self.assertEqual(a_pixel_table.shape, (60, 30))
+        self.assertEqual(a_pixel_table.values.shape, (60, 30))
 
     def test_fill_with_image(self):
         test_image_edges = "test_image_edges.png"
 
+        an_image = Image.open(test_image_edges)
         a_pixel_table = tables.PixelTable(10, 10)
-        a_pixel_table.fill_with_image(Image.open(test_image_edges))
+        a_pixel_table.fill_with_image(an_image)
 
-        for pixel_row in a_pixel_table.pixels:
-            for pixel in pixel_row:
-                pixel.value = 255
         for i in range(10):
             for j in range(10):
-                self.assertEqual(a_pixel_table.pixels[i][j], 255)
+                self.assertEqual(a_pixel_table.values[i][j], pix.GrayPixel(an_image.getpixel((j, i))).value)
+        self.assertTrue(np.array_equal(a_pixel_table.on, a_pixel_table.values != 0))
 
     def test_set_new_values(self):
         test_image_edges = "test_image_edges.png"
@@ -297,18 +225,22 @@ class TextPixelTable(unittest.TestCase):
         a_pixel_table = tables.PixelTable(10, 10)
         a_pixel_table.fill_with_image(Image.open(test_image_edges))
 
-        for i in range(10):
-            for j in range(10):
-                a_pixel_table.pixels[i][j].cache = 2
-                a_pixel_table.pixels[i][j].orientation = 2
+        a_pixel_table.cache[:] = 2
+        a_pixel_table.orientation[:] = 2
+        a_pixel_table.cache[0][0] = np.nan
+        original_value = a_pixel_table.values[0][0]
 
         a_pixel_table.set_new_pixel_values()
 
+        # An empty cache leaves the value untouched.
+        self.assertEqual(a_pixel_table.values[0][0], original_value)
         for i in range(10):
             for j in range(10):
-                self.assertEqual(a_pixel_table.pixels[i][j], 2)
-                self.assertIsNone(a_pixel_table.pixels[i][j].cache)
-                self.assertEqual(a_pixel_table.pixels[i][j].orientation, 2)
+                if (i, j) != (0, 0):
+                    self.assertEqual(a_pixel_table.values[i][j], 2)
+                self.assertTrue(np.isnan(a_pixel_table.cache[i][j]))
+                self.assertEqual(a_pixel_table.orientation[i][j], 2)
+                self.assertTrue(a_pixel_table.on[i][j])
 
     def test_clear_cache(self):
         test_image_edges = "test_image_edges.png"
@@ -316,41 +248,52 @@ class TextPixelTable(unittest.TestCase):
         a_pixel_table = tables.PixelTable(10, 10)
         a_pixel_table.fill_with_image(Image.open(test_image_edges))
 
-        a_pixel_table.pixels[0][0].cache = 0
-        a_pixel_table.pixels[0][1].cache = -63
-        a_pixel_table.pixels[0][2].cache = 535
-        a_pixel_table.pixels[0][3].cache = "hello"
-        a_pixel_table.pixels[0][4].cache = [1, 2]
-        a_pixel_table.pixels[0][5].cache = {1: (1, 2)}
-        a_pixel_table.pixels[0][6].cache = (1, 1)
+        a_pixel_table.cache[0][0] = 0
+        a_pixel_table.cache[0][1] = -63
+        a_pixel_table.cache[0][2] = 535
 
         a_pixel_table.clear_cache()
 
-        for i in range(7):
-            self.assertIsNone(a_pixel_table.pixels[0][i].cache)
+        self.assertTrue(np.isnan(a_pixel_table.cache).all())
+
+    def test_turn_off(self):
+        a_pixel_table = tables.PixelTable(4, 4)
+        a_pixel_table.values[:] = 10
+        a_pixel_table.orientation[:] = 1
+        a_pixel_table.cache[:] = 3
+        a_pixel_table.update_on_mask()
+
+        a_pixel_table.turn_off(a_pixel_table.values > 5)
+
+        self.assertFalse(a_pixel_table.on.any())
+        self.assertTrue((a_pixel_table.values == 0).all())
+        self.assertTrue(np.isnan(a_pixel_table.orientation).all())
+        # cache is unchanged.
+        self.assertTrue((a_pixel_table.cache == 3).all())
 
     def test_turn_off_border(self):
         test_image_edges = "test_image_edges.png"
 
         a_pixel_table = tables.PixelTable(10, 10)
         a_pixel_table.fill_with_image(Image.open(test_image_edges))
-
-        a_pixel_table.pixels[0][0].orientation = -1
-        a_pixel_table.pixels[0][0].cache = -1
+        a_pixel_table.values[:] = 100
+        a_pixel_table.orientation[:] = -1
+        a_pixel_table.update_on_mask()
+        a_pixel_table.cache[0][0] = -1
 
         a_pixel_table.turn_off_borders(border_width=3)
 
-        self.assertEqual(a_pixel_table.pixels[0][0].cache, -1)
+        self.assertEqual(a_pixel_table.cache[0][0], -1)
 
-        for i in range(3):
+        for i in range(10):
             for j in range(10):
-                self.assertEqual(a_pixel_table.pixels[i][j], 0)
-                self.assertIsNone(a_pixel_table.pixels[i][j].orientation)
-
-        for i in range(3, 7):
-            for j in range(3):
-                self.assertEqual(a_pixel_table.pixels[i][j], 0)
-                self.assertIsNone(a_pixel_table.pixels[i][j].orientation)
+                if 3 <= i < 7 and 3 <= j < 7:
+                    self.assertEqual(a_pixel_table.values[i][j], 100)
+                    self.assertTrue(a_pixel_table.on[i][j])
+                else:
+                    self.assertEqual(a_pixel_table.values[i][j], 0)
+                    self.assertTrue(np.isnan(a_pixel_table.orientation[i][j]))
+                    self.assertFalse(a_pixel_table.on[i][j])
 
     def test_get_active_pixels(self):
         test_image_edges = "test_image_edges.png"
@@ -358,27 +301,11 @@ class TextPixelTable(unittest.TestCase):
         a_pixel_table = tables.PixelTable(10, 10)
         a_pixel_table.fill_with_image(Image.open(test_image_edges))
 
-        original_pixels = a_pixel_table.pixels.copy()
-        active_pixels = a_pixel_table.get_active_pixels()
-
-        active_index = 0
-        for row in original_pixels:
-            for element in row:
-                if element.value == 0 and element.orientation is None:
-                    self.assertEqual(element, active_pixels[active_index])
-                    active_index += 1
-
-        for active_pixel in active_pixels:
-            active_pixel.value = 300
-            active_pixel.cache = 3
-            active_pixel.orientation = 1
+        active_rows, active_columns = a_pixel_table.get_active_pixels()
 
-        for row in original_pixels:
-            for element in row:
-                if element.is_on():
-                    self.assertEqual(element, 300)
-                    self.assertEqual(element.cache, 3)
-                    self.assertEqual(element.orientation, 1)
+        self.assertEqual(len(active_rows), a_pixel_table.on.sum())
+        for row_index, column_index in zip(active_rows, active_columns):
+            self.assertNotEqual(a_pixel_table.values[row_index][column_index], 0)
 
     def test_get_luminosity(self):
         test_image_edges = "test_image_edges.png"
@@ -387,24 +314,83 @@ class TextPixelTable(unittest.TestCase):
         a_pixel_table.fill_with_image(Image.open(test_image_edges))
         value_active_pixels = a_pixel_table.get_luminosity_active_pixels()
 
-        self.assertAlmostEqual(value_active_pixels[0], 24)
-        self.assertAlmostEqual(value_active_pixels[1], 24)
-        self.assertAlmostEqual(value_active_pixels[2], 24)
-
+        self.assertEqual(len(value_active_pixels), a_pixel_table.on.sum())
         for value in value_active_pixels:
-            if value.orientation is not None:
-                self.assertNotEqual(value, 0)
+            self.assertNotEqual(value, 0)
+
+    def test_find_continuous_edges(self):
+        a_pixel_table = tables.PixelTable(6, 5)
+        a_pixel_table.values[...] = [[1, 1, 0, 0, 0, 1],
+                                     [0, 0, 1, 0, 0, 1],
+                                     [0, 0, 0, 0, 0, 0],
+                                     [1, 0, 0, 0, 1, 1],
+                                     [1, 0, 0, 0, 0, 1]]
+        a_pixel_table.update_on_mask()
+
+        edge_labels, edge_count = a_pixel_table.find_continuous_edges()
+        self.assertEqual(edge_count, 4)
+        self.assertEqual(edge_labels[0, 0], edge_labels[1, 2])
+        self.assertEqual(edge_labels[0, 5], edge_labels[1, 5])
+        self.assertNotEqual(edge_labels[1, 5], edge_labels[3, 5])
+        self.assertEqual((edge_labels == 0).sum(), (~a_pixel_table.on).sum())
+
+        edge_labels, edge_count = a_pixel_table.find_continuous_edges(connectivity=4)
+        self.assertEqual(edge_count, 5)
+
+        edge_labels, edge_count = a_pixel_table.find_continuous_edges(gap=1)
+        self.assertEqual(edge_count, 1)
 
     def test_rgb_copy(self):
         test_image_edges = "test_image_edges.png"
 
         a_pixel_table = tables.PixelTable(10, 10)
         a_pixel_table.fill_with_image(Image.open(test_image_edges))
+        a_pixel_table.values[4][4] = 19.9
         an_rbg_pixel_table = a_pixel_table.rgb_copy()
 
-        self.assertEqual(an_rbg_pixel_table.shape[:-1], a_pixel_table.pixels.shape)
+        self.assertEqual(an_rbg_pixel_table.shape[:-1], a_pixel_table.shape)
         self.assertEqual(an_rbg_pixel_table.shape[-1], 3)
         for i in range(3):
-            self.assertEqual(an_rbg_pixel_table[3][5][i], a_pixel_table.pixels[3][5].copy_colour_variant()[i])
-            self.assertEqual(an_rbg_pixel_table[4][4][i], a_pixel_table.pixels[4][4].copy_colour_variant()[i])
-            self.assertEqual(an_rbg_pixel_table[0][0][i], a_pixel_table.pixels[0][0].copy_colour_variant()[i])
+            self.assertEqual(an_rbg_pixel_table[3][5][i], int(a_pixel_table.values[3][5]))
+            self.assertEqual(an_rbg_pixel_table[4][4][i], 19)
+            self.assertEqual(an_rbg_pixel_table[0][0][i], int(a_pixel_table.values[0][0]))
+
+    def test_orientation_copy(self):
+        a_pixel_table = tables.PixelTable(len(pix.angle_colour_dict), 1)
+        a_pixel_table.orientation[0] = list(pix.angle_colour_dict.keys())
+        a_pixel_table.orientation[0][0] = np.nan
+
+        orientation_colours = a_pixel_table.orientation_copy()
+
+        self.assertEqual(tuple(orientation_colours[0][0]), (0, 0, 0))
+        for column_index, colour in enumerate(list(pix.angle_colour_dict.values())[1:]):
+            self.assertEqual(tuple(orientation_colours[0][column_index + 1]), colour)
+
+    def test_greyscale_plane(self):
+        rgb_array = np.array([[[100, 100, 100], [10, 20, 30]],
+                              [[255, 255, 255], [0, 0, 0]]], dtype=np.uint8)
+        rgb_image = Image.fromarray(rgb_array)
+        wanted_values = [[100, 18], [255, 0]]
+
+        for mode in ('RGB', 'RGBA'):
+            grey_values = tables.greyscale_plane(rgb_image.convert(mode))
+            self.assertEqual(grey_values.dtype, np.float32)
+            self.assertEqual(grey_values.tolist(), wanted_values)
+
+        palette_image = Image.fromarray(np.array([[0, 1], [2, 3]], dtype=np.uint8), mode='P')
+        palette_image.putpalette([100, 100, 100, 10, 20, 30, 255, 255, 255, 0, 0, 0])
+        self.assertEqual(tables.greyscale_plane(palette_image).tolist(), wanted_values)
+
+        grey_image = Image.fromarray(np.array([[0, 12], [200, 255]], dtype=np.uint8))
+        self.assertEqual(tables.greyscale_plane(grey_image).tolist(), [[0, 12], [200, 255]])
+
+    def test_greyscale_plane_sixteen_bit(self):
+        sixteen_bit_values = np.array([[0, 257], [51400, 65535]])
+
+        for dtype, mode in ((np.uint16, 'I;16'), ('>u2', 'I;16B'), (np.int32, 'I')):
+            sixteen_bit_image = Image.fromarray(sixteen_bit_values.astype(dtype))
+            self.assertEqual(sixteen_bit_image.mode, mode)
+            self.assertEqual(tables.greyscale_plane(sixteen_bit_image).tolist(), [[0, 1], [200, 255]])
+
+        # Unlike the plane, a Grey Pixel keeps the raw 16-bit value.
+        self.assertEqual(pix.GrayPixel(sixteen_bit_image.getpixel((0, 1))).value, 51400)
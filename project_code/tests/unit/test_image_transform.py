@@ -0,0 +1,44 @@
+from project_code.image_manipulation import hough_circle_transform as hough
+from project_code.image_manipulation.classes.wrapper import image_transform as transform
+
+import unittest
+from PIL import Image, ImageDraw
+
+
+def draw_ring_image(circles, width=120, height=90):
+    """Draws a light ring for every (x, y, radius) circle on a dark background."""
+    image = Image.new('L', (width, height), 40)
+    drawing = ImageDraw.Draw(image)
+    for center_x, center_y, radius in circles:
+        drawing.ellipse((center_x - radius, center_y - radius, center_x + radius, center_y + radius), outline=220,
+                        width=2)
+    return image
+
+
+class TestTransformImage(unittest.TestCase):
+    def test_stream_circles(self):
+        whole_image = transform.TransformImage(draw_ring_image([(20, 22, 9), (61, 30, 12), (95, 64, 10),
+                                                                (30, 65, 13)]))
+        whole_image.apply_canny(5, 2)
+
+        streamed_circles = list(whole_image.stream_circles(1))
+
+        self.assertEqual([radius for radius, centers in streamed_circles], list(hough.radius_ranges[1]))
+        self.assertEqual(sum(len(centers) for radius, centers in streamed_circles), 4)
+        self.assertEqual({radius: centers for radius, centers in streamed_circles if centers},
+                         whole_image.find_circles(1))
+
+    def test_gradient_engine_default_tolerance(self):
+        rings = [(25, 25, 18), (80, 40, 24), (45, 95, 20), (100, 100, 27)]
+        working_image = transform.TransformImage(draw_ring_image(rings, 140, 140))
+        working_image.apply_canny(5, 2)
+
+        circle_centers = working_image.find_circles(2)
+        gradient_centers = working_image.find_circles(2, 'gradient')
+
+        self.assertEqual(sum(len(centers) for centers in circle_centers.values()), 4)
+        found_circles = [(x, y, radius) for radius, centers in gradient_centers.items() for x, y in centers]
+        self.assertEqual(len(found_circles), 4)
+        for x, y, radius in rings:
+            self.assertTrue(any(abs(x - found_x) <= 1 and abs(y - found_y) <= 1 and abs(radius - found_radius) <= 2
+                                for found_x, found_y, found_radius in found_circles))
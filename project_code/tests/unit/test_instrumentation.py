@@ -0,0 +1,92 @@
+from project_code.image_manipulation import instrumentation
+from project_code.image_manipulation.classes.wrapper import image_transform as transform
+
+import unittest
+import io
+import json
+import logging
+import numpy as np
+from PIL import Image, ImageDraw
+
+
+def draw_ring_image(circles, width=120, height=90):
+    """Draws a light ring for every (x, y, radius) circle on a dark background."""
+    image = Image.new('L', (width, height), 40)
+    drawing = ImageDraw.Draw(image)
+    for center_x, center_y, radius in circles:
+        drawing.ellipse((center_x - radius, center_y - radius, center_x + radius, center_y + radius), outline=220,
+                        width=2)
+    return image
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_measure_and_annotate(self):
+        @instrumentation.stage('outer')
+        def outer_stage():
+            instrumentation.annotate(count=np.int64(3))
+            with instrumentation.measure('inner', size=2):
+                instrumentation.annotate(found=True)
+                inner_array = np.ones(2 ** 18)
+            del inner_array
+            return 'done'
+
+        # Without sinks the stages only run.
+        self.assertEqual(outer_stage(), 'done')
+        instrumentation.annotate(ignored=True)
+
+        with instrumentation.recording(instrumentation.MemorySink(), memory=True) as (events,):
+            self.assertEqual(outer_stage(), 'done')
+        self.assertFalse(instrumentation.enabled())
+        self.assertEqual([event['event'] for event in events.events], ['inner', 'outer'])
+
+        inner_event, outer_event = events.events
+        self.assertEqual((inner_event['size'], inner_event['found']), (2, True))
+        self.assertEqual(outer_event['count'], 3)
+        self.assertNotIn('found', outer_event)
+        for event in events.events:
+            self.assertGreaterEqual(event['wall_time'], 0)
+            self.assertGreaterEqual(event['cpu_time'], 0)
+            # The inner stage allocated 2 MiB, which is part of the peak of the outer stage.
+            self.assertGreaterEqual(event['peak_memory'], 2 ** 21)
+        self.assertGreaterEqual(outer_event['wall_time'], inner_event['wall_time'])
+
+    def test_sinks(self):
+        event_file = io.StringIO()
+        with self.assertLogs('project_code', logging.INFO) as logs:
+            with instrumentation.recording(instrumentation.JsonLinesSink(event_file), instrumentation.LoggerSink()):
+                instrumentation.emit('stage', candidates={6: 2}, box=np.arange(2), count=np.int64(3))
+
+        self.assertEqual(logs.output, ["INFO:project_code:stage candidates={6: 2} box=[0 1] count=3"])
+        event = json.loads(event_file.getvalue())
+        self.assertEqual((event['event'], event['candidates'], event['box'], event['count']),
+                         ('stage', {'6': 2}, [0, 1], 3))
+
+    def test_pipeline_events(self):
+        working_image = transform.TransformImage(draw_ring_image([(30, 30, 12), (80, 55, 10)]))
+        with working_image.record_events(instrumentation.MemorySink()) as (events,):
+            working_image.apply_canny(5, 2)
+            found_circles = working_image.find_circles(1)
+
+        self.assertEqual([event['event'] for event in events.events],
+                         ['gauss_blur', 'sobel', 'non_maximum_suppression', 'hysteresis', 'canny', 'apply_canny',
+                          'hough', 'find_circles'])
+        hysteresis_event, canny_event = events.named('hysteresis')[0], events.named('canny')[0]
+        self.assertEqual(canny_event['edge_pixels'], int(np.count_nonzero(working_image.pixel_values.on)))
+        self.assertEqual(canny_event['edge_pixels'], hysteresis_event['edge_pixels'])
+        self.assertLess(canny_event['edge_pixels'], events.named('non_maximum_suppression')[0]['edge_pixels'])
+
+        hough_event = events.named('hough')[0]
+        self.assertEqual(hough_event['edge_pixels'], canny_event['edge_pixels'])
+        self.assertEqual(hough_event['circles'], sum(len(centers) for centers in found_circles.values()))
+        self.assertEqual(hough_event['circles'], 2)
+        self.assertTrue(set(found_circles) <= set(hough_event['candidates']))
+
+        with working_image.record_events(instrumentation.MemorySink()) as (events,):
+            streamed_circles = dict(working_image.stream_circles(1))
+        self.assertEqual([event['radius'] for event in events.named('hough_stream_radius')], list(streamed_circles))
+        self.assertEqual([event['circles'] for event in events.events],
+                         [len(centers) for centers in streamed_circles.values()])
+
+
+if __name__ == '__main__':
+    unittest.main()
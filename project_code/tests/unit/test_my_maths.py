@@ -3,6 +3,7 @@ from project_code.my_maths import \
     select_from_matrix as matrix_select, \
     lineair_algebra as lin_alg, \
     calculus as calc, \
+    connected_components as components, \
     trigonometry as trig
 
 import unittest
@@ -176,44 +177,86 @@ class TestCalculus(unittest.TestCase):
         self.assertEqual(calc.local_maximum_1d(np.array([-8, -2, -3])), (1, -2))
         self.assertEqual(calc.local_maximum_1d(np.array([0, 3, 3])), (1, 3))
 
-    def test_local_maximum_2d_cache(self):
-        index, maximum = calc.local_maximum_2d_cache(np.array([[1, 2, 3], [4, 5, 6], [7, 8, 9]]))
-        self.assertEqual(index, (2, 2))
-        self.assertEqual(maximum, 9)
-
-        index, maximum = calc.local_maximum_2d_cache(np.array([[1, 2, 6], [4, 5, 3]]))
-        self.assertEqual(index, (2, 0))
-        self.assertEqual(maximum, -2)
-
-        index, maximum = calc.local_maximum_2d_cache(np.array([[0, 3, 3]]))
-        self.assertEqual(index, (1, 0))
-        self.assertEqual(maximum, 3)
-
-        index, maximum = calc.local_maximum_2d_cache(np.array([[0], [3], [3]]))
-        self.assertEqual(index, (0, 1))
-        self.assertEqual(maximum, 3)
-
-        index, maximum = calc.local_maximum_2d_cache(np.array([0, 3, 3]))
-        self.assertEqual(index, (1, 0))
-        self.assertEqual(maximum, 3)
-
-    def test_local_maximum_3d(self):
-        matrix_3d = np.array([[[1, 2, 3],
-                               [4, 5, 6],
-                               [7, 8, 9]],
-
-                              [[2, 4, 6],
-                               [8, 10, 12],
-                               [14, 16, 18]],
-
-                              [[1, 3, 6],
-                               [9, 12, 15],
-                               [18, 21, 24]]])
-
-        self.assertEqual(calc.local_maximum_3d(matrix_3d), ((2, 2, 2), 24))
-        matrix_3d[2][1][0] = 50
-        self.assertEqual(calc.local_maximum_3d(matrix_3d), ((0, 1, 2), 50))
-
-        matrix_3d *= -1
-
-        self.assertEqual(calc.local_maximum_3d(matrix_3d), ((0, 0, 0), -1))
+    def test_maximum_filter(self):
+        a_matrix = np.array([[1, 5, 2, 0],
+                             [0, 3, 9, 1],
+                             [4, 0, 1, 2]], dtype=np.float32)
+
+        self.assertEqual(calc.sliding_maximum(a_matrix, 1, axis=1).tolist(), [[5, 5, 5, 2],
+                                                                               [3, 9, 9, 9],
+                                                                               [4, 4, 2, 2]])
+        self.assertEqual(calc.sliding_maximum(a_matrix, 1, axis=0).tolist(), [[1, 5, 9, 1],
+                                                                               [4, 5, 9, 2],
+                                                                               [4, 3, 9, 2]])
+        self.assertEqual(calc.maximum_filter(a_matrix, 1).tolist(), [[5, 9, 9, 9],
+                                                                      [5, 9, 9, 9],
+                                                                      [4, 9, 9, 9]])
+        self.assertEqual(calc.maximum_filter(a_matrix, (0, 0)).tolist(), a_matrix.tolist())
+
+        a_volume = np.random.default_rng(1).random((6, 7, 8))
+        for radius in (1, 2, 4):
+            local_maximum = calc.maximum_filter(a_volume, radius)
+            for z, y, x in ((0, 0, 0), (3, 4, 5), (5, 6, 7)):
+                neighbourhood = a_volume[max(z - radius, 0):z + radius + 1,
+                                         max(y - radius, 0):y + radius + 1,
+                                         max(x - radius, 0):x + radius + 1]
+                self.assertEqual(local_maximum[z, y, x], neighbourhood.max())
+
+    def test_sliding_maximum_stream(self):
+        a_volume = np.random.default_rng(2).random((9, 4, 5))
+
+        for radius in (0, 1, 2, 5):
+            streamed_maximum = list(calc.sliding_maximum_stream(iter(a_volume), radius))
+            self.assertEqual(len(streamed_maximum), len(a_volume))
+            self.assertTrue(np.array_equal(np.stack(streamed_maximum), calc.sliding_maximum(a_volume, radius)))
+
+
+class TestConnectedComponents(unittest.TestCase):
+    def test_find_runs(self):
+        a_mask = np.array([[1, 1, 0, 1],
+                           [0, 0, 0, 0],
+                           [1, 1, 1, 1]], dtype=bool)
+
+        run_rows, run_starts, run_ends = components.find_runs(a_mask)
+        self.assertEqual(list(run_rows), [0, 0, 2])
+        self.assertEqual(list(run_starts), [0, 3, 0])
+        self.assertEqual(list(run_ends), [1, 3, 3])
+
+    def test_label_components(self):
+        # A branching edge: a single path walk would miss one of the branches.
+        a_mask = np.array([[0, 0, 0, 0, 0, 0, 0],
+                           [1, 0, 0, 0, 0, 0, 1],
+                           [0, 1, 0, 0, 0, 1, 0],
+                           [0, 0, 1, 1, 1, 0, 0],
+                           [0, 0, 0, 1, 0, 0, 0],
+                           [0, 0, 0, 1, 0, 0, 0],
+                           [0, 0, 0, 0, 0, 1, 0]], dtype=bool)
+
+        labels, count = components.label_components(a_mask, connectivity=8)
+        self.assertEqual(count, 2)
+        self.assertTrue((labels[a_mask][:-1] == 1).all())
+        self.assertEqual(labels[6, 5], 2)
+
+        labels, count = components.label_components(a_mask, connectivity=4)
+        self.assertEqual(count, 6)
+
+        labels, count = components.label_components(a_mask, connectivity=8, gap=1)
+        self.assertEqual(count, 1)
+
+        labels, count = components.label_components(np.zeros((3, 3), dtype=bool))
+        self.assertEqual(count, 0)
+
+        with self.assertRaises(ValueError):
+            components.label_components(a_mask, connectivity=6)
+
+    def test_label_components_matches_scipy(self):
+        from scipy import ndimage
+
+        random_mask = np.random.default_rng(4).random((60, 80)) > 0.6
+        for connectivity, structure in ((4, None), (8, np.ones((3, 3)))):
+            labels, count = components.label_components(random_mask, connectivity)
+            wanted_labels, wanted_count = ndimage.label(random_mask, structure)
+            self.assertEqual(count, wanted_count)
+            # Both labellings group exactly the same pixels.
+            label_pairs = set(zip(labels[random_mask].tolist(), wanted_labels[random_mask].tolist()))
+            self.assertEqual(len(label_pairs), count)
@@ -0,0 +1,55 @@
+from project_code.image_manipulation import scratch_memory as scratch
+from project_code.image_manipulation.classes import pixel_table as tables
+
+import unittest
+import os
+import tempfile
+import numpy as np
+
+
+class TestScratchMemory(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.addCleanup(scratch.configure, *scratch.settings())
+
+    def test_allocation_below_threshold(self):
+        scratch.configure(1000, self.directory.name)
+        array = scratch.full((10, 20), np.nan, dtype=np.float32)
+        self.assertNotIsInstance(array, np.memmap)
+        self.assertTrue(np.isnan(array).all())
+
+        scratch.configure(None, self.directory.name)
+        self.assertNotIsInstance(scratch.zeros((1000, 1000), dtype=np.float64), np.memmap)
+
+    def test_allocation_above_threshold(self):
+        scratch.configure(100, self.directory.name)
+        zeros = scratch.zeros((10, 20), dtype=bool)
+        filled = scratch.full((10, 20), 3, dtype=np.int32)
+        self.assertIsInstance(zeros, np.memmap)
+        self.assertFalse(zeros.any())
+        self.assertTrue((filled == 3).all())
+        self.assertIsInstance(scratch.empty_like(filled), np.memmap)
+        self.assertEqual(scratch.empty_like(filled).dtype, np.int32)
+        # The files are removed right away.
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+        path = scratch.create_shared_file((4, 5), np.float32)
+        self.addCleanup(os.remove, path)
+        scratch.open_shared_file(path, (4, 5))[1] = 7
+        np.testing.assert_array_equal(scratch.open_shared_file(path, (4, 5))[:, 0], [0, 7, 0, 0])
+
+    def test_pixel_table_planes(self):
+        scratch.configure(100, self.directory.name)
+        a_pixel_table = tables.PixelTable(30, 20)
+        for plane in (a_pixel_table.values, a_pixel_table.cache, a_pixel_table.orientation, a_pixel_table.on):
+            self.assertIsInstance(plane, np.memmap)
+
+        a_pixel_table.values[5, 6] = 10
+        a_pixel_table.update_on_mask()
+        self.assertIsInstance(a_pixel_table.on, np.memmap)
+        self.assertEqual([indexes.tolist() for indexes in a_pixel_table.get_active_pixels()], [[5], [6]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,33 +1,74 @@
-from project_code.image_manipulation.classes import pixel as pixel_classes
+from project_code.image_manipulation.classes import pixel_table as tables
 from project_code.image_manipulation import sobel_edge_detector as sobel
 
 import unittest
 import numpy as np
+from scipy import ndimage
 
 
 class TestSobelEdgeDetection(unittest.TestCase):
     """"""
-    def SobelCalculation(self):
-        pixels_3_3 = np.array([[pixel_classes.GrayPixel(10), pixel_classes.GrayPixel(10), pixel_classes.GrayPixel(10)],
-                               [pixel_classes.GrayPixel(10), pixel_classes.GrayPixel(10), pixel_classes.GrayPixel(10)],
-                               [pixel_classes.GrayPixel(10), pixel_classes.GrayPixel(10), pixel_classes.GrayPixel(10)]])
+    def test_derivative_kernels(self):
+        smoothing, derivative = sobel.derivative_kernels(3)
+        self.assertTrue(np.allclose(smoothing * 4, [1, 2, 1]))
+        self.assertTrue(np.allclose(derivative, [-1, 0, 1]))
 
-        pixels_5_5 = np.array([[pixel_classes.GrayPixel(10), pixel_classes.GrayPixel(10), pixel_classes.GrayPixel(10)],
-                               [pixel_classes.GrayPixel(10), pixel_classes.GrayPixel(10), pixel_classes.GrayPixel(10)],
-                               [pixel_classes.GrayPixel(10), pixel_classes.GrayPixel(10), pixel_classes.GrayPixel(10)],
-                               [pixel_classes.GrayPixel(10), pixel_classes.GrayPixel(10), pixel_classes.GrayPixel(10)],
-                               [pixel_classes.GrayPixel(10), pixel_classes.GrayPixel(10), pixel_classes.GrayPixel(10)]])
+        smoothing, derivative = sobel.derivative_kernels(5)
+        self.assertTrue(np.allclose(smoothing * 16, [1, 4, 6, 4, 1]))
+        self.assertTrue(np.allclose(derivative * 3, [-1, -2, 0, 2, 1]))
 
-        self.assertEqual(sobel.sobel_calculation(pixels_3_3), 0)
-        self.assertEqual(sobel.sobel_calculation(pixels_5_5, 5), 0)
+        smoothing, derivative = sobel.derivative_kernels(7)
+        self.assertTrue(np.allclose(smoothing * 64, [1, 6, 15, 20, 15, 6, 1]))
+        self.assertTrue(np.allclose(derivative * 10, [-1, -4, -5, 0, 5, 4, 1]))
 
-        for i in range(3):
-            pixels_3_3[0][i].value = 255
-            pixels_3_3[2][i].value = 255
+        smoothing, derivative = sobel.derivative_kernels(3, 'scharr')
+        self.assertTrue(np.allclose(smoothing * 16, [3, 10, 3]))
 
-        self.assertEqual(sobel.sobel_calculation(pixels_3_3), 0)
+        with self.assertRaises(ValueError):
+            sobel.derivative_kernels(5, 'scharr')
+        with self.assertRaises(ValueError):
+            sobel.derivative_kernels(4)
 
-        for i in range(3):
-            pixels_3_3[0][i].value = 10
+    def test_sobel_gradients(self):
+        image = np.random.default_rng(5).uniform(0, 255, (30, 40)).astype(np.float32)
 
-        self.assertEqual(sobel.sobel_calculation(pixels_3_3), -112.5)
+        strength, orientation = sobel.sobel_gradients(image, magnitude='hypot')
+
+        x_response = ndimage.sobel(image, axis=1, mode='nearest') / 4
+        y_response = ndimage.sobel(image, axis=0, mode='nearest') / 4
+        self.assertTrue(np.allclose(strength, np.hypot(x_response, y_response), atol=1e-3))
+
+        strength, orientation = sobel.sobel_gradients(image, magnitude='l1')
+        self.assertTrue(np.allclose(strength, np.abs(x_response) + np.abs(y_response), atol=1e-3))
+        self.assertTrue((orientation > -np.pi / 2).all())
+        self.assertTrue((orientation <= np.pi / 2).all())
+
+    def test_orientation(self):
+        # Dark left half, bright right half: the gradient points along the x-axis.
+        vertical_edge = np.zeros((7, 7), dtype=np.float32)
+        vertical_edge[:, 4:] = 100
+        strength, orientation = sobel.sobel_gradients(vertical_edge)
+        self.assertAlmostEqual(strength[3, 3], 100)
+        self.assertAlmostEqual(orientation[3, 3], 0)
+
+        # Dark top half, bright bottom half: the gradient points along the y-axis.
+        strength, orientation = sobel.sobel_gradients(vertical_edge.T)
+        self.assertAlmostEqual(strength[3, 3], 100)
+        self.assertAlmostEqual(orientation[3, 3], np.pi / 2, places=5)
+
+        # Bright bottom right corner: the gradient points down and to the right.
+        diagonal_edge = np.fromfunction(lambda row, column: (row + column > 6) * 100, (7, 7), dtype=np.float32)
+        strength, orientation = sobel.sobel_gradients(diagonal_edge)
+        self.assertAlmostEqual(orientation[3, 3], -np.pi / 4, places=5)
+
+    def test_run_sobel_edge_detection(self):
+        a_pixel_table = tables.PixelTable(20, 10)
+        a_pixel_table.values[:, 10:] = 50
+
+        sobel.run_sobel_edge_detection(a_pixel_table, kernel_size=5, operator='sobel', magnitude='hypot')
+
+        self.assertTrue(np.isnan(a_pixel_table.cache).all())
+        self.assertFalse(np.isnan(a_pixel_table.orientation).any())
+        self.assertEqual(a_pixel_table.values[5, 0], 0)
+        self.assertGreater(a_pixel_table.values[5, 10], 0)
+        self.assertTrue(a_pixel_table.on.all())
@@ -0,0 +1,104 @@
+from project_code.image_manipulation import stage_cache as caching
+from project_code.image_manipulation.classes.wrapper import image_transform as transform
+
+import unittest
+import os
+import tempfile
+from unittest import mock
+import numpy as np
+from PIL import Image, ImageDraw
+
+
+def draw_ring_image(circles, width=120, height=90):
+    """Draws a light ring for every (x, y, radius) circle on a dark background."""
+    image = Image.new('L', (width, height), 40)
+    drawing = ImageDraw.Draw(image)
+    for center_x, center_y, radius in circles:
+        drawing.ellipse((center_x - radius, center_y - radius, center_x + radius, center_y + radius), outline=220,
+                        width=2)
+    return image
+
+
+class TestStageCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_keys(self):
+        image = draw_ring_image([(40, 40, 12)])
+        self.assertEqual(caching.image_key(image), caching.image_key(image.copy()))
+        self.assertNotEqual(caching.image_key(image), caching.image_key(draw_ring_image([(41, 40, 12)])))
+        self.assertNotEqual(caching.image_key(image), caching.image_key(image.convert('RGB')))
+
+        blur_key = caching.stage_key('image', 'blur', {'kernel_size': 5})
+        self.assertEqual(blur_key, caching.stage_key('image', 'blur', {'kernel_size': 5}))
+        self.assertNotEqual(blur_key, caching.stage_key('image', 'blur', {'kernel_size': 3}))
+        self.assertNotEqual(caching.stage_key(blur_key, 'canny', {'noise': 2}),
+                            caching.stage_key(caching.stage_key('image', 'blur', {'kernel_size': 3}), 'canny',
+                                              {'noise': 2}))
+
+    def test_store_load_and_evict(self):
+        stage_cache = caching.StageCache(os.path.join(self.directory.name, 'stages'))
+        arrays = {'values': np.arange(12, dtype=np.float32).reshape(3, 4), 'on': np.eye(3, 4, dtype=bool)}
+
+        self.assertIsNone(stage_cache.load('a'))
+        stage_cache.store('a', arrays)
+        self.assertIn('a', stage_cache)
+        loaded_arrays = stage_cache.load('a')
+        self.assertEqual(set(loaded_arrays), {'values', 'on'})
+        np.testing.assert_array_equal(loaded_arrays['values'], arrays['values'])
+        self.assertEqual(loaded_arrays['on'].dtype, bool)
+
+        # Only room for two stages: storing a third removes the least recently used one.
+        stage_cache.max_size = 2 * os.path.getsize(stage_cache.path('a'))
+        stage_cache.store('b', arrays)
+        os.utime(stage_cache.path('a'), (1, 1))
+        os.utime(stage_cache.path('b'), (2, 2))
+        stage_cache.load('a')
+        stage_cache.store('c', arrays)
+        self.assertIn('a', stage_cache)
+        self.assertNotIn('b', stage_cache)
+        self.assertIn('c', stage_cache)
+        self.assertEqual(sorted(os.listdir(stage_cache.directory)), ['a.npz', 'c.npz'])
+
+    def test_transform_image_resumes_from_cached_stages(self):
+        image = draw_ring_image([(30, 30, 12), (80, 55, 15)])
+        stage_cache = caching.StageCache(self.directory.name)
+
+        uncached_image = transform.TransformImage(image)
+        uncached_image.apply_canny(5, 2)
+        first_image = transform.TransformImage(image, stage_cache)
+        first_image.apply_canny(5, 2)
+        self.assertEqual(len(os.listdir(self.directory.name)), 3)
+        for plane in ('values', 'orientation', 'on'):
+            np.testing.assert_array_equal(getattr(first_image.pixel_values, plane),
+                                          getattr(uncached_image.pixel_values, plane))
+
+        # The same settings load the edge map without running any stage.
+        with mock.patch.object(transform.apply_filter, 'gauss_blur') as blur, \
+                mock.patch.object(transform.sobel, 'run_sobel_edge_detection') as gradient, \
+                mock.patch.object(transform.canny, 'canny_detector') as edges:
+            cached_image = transform.TransformImage(image, stage_cache)
+            cached_image.apply_canny(5, 2)
+        for stage in (blur, gradient, edges):
+            stage.assert_not_called()
+        for plane in ('values', 'orientation', 'on'):
+            np.testing.assert_array_equal(getattr(cached_image.pixel_values, plane),
+                                          getattr(uncached_image.pixel_values, plane))
+        self.assertEqual(cached_image.find_circles(1), uncached_image.find_circles(1))
+
+        # Another noise level only runs canny edge detection on the cached gradient.
+        with mock.patch.object(transform.apply_filter, 'gauss_blur') as blur, \
+                mock.patch.object(transform.sobel, 'run_sobel_edge_detection') as gradient:
+            noisy_image = transform.TransformImage(image, stage_cache)
+            noisy_image.apply_canny(5, 4)
+        blur.assert_not_called()
+        gradient.assert_not_called()
+        uncached_image = transform.TransformImage(image)
+        uncached_image.apply_canny(5, 4)
+        np.testing.assert_array_equal(noisy_image.pixel_values.values, uncached_image.pixel_values.values)
+        self.assertEqual(len(os.listdir(self.directory.name)), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
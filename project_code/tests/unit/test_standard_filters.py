@@ -1,9 +1,10 @@
 from project_code.image_manipulation.kernels import blurs as blur
 from project_code.image_manipulation import standard_filters as stand_filter
+from project_code.image_manipulation.classes import pixel_table as tables
 
 import unittest
 import numpy as np
-from scipy import signal
+from scipy import ndimage, signal
 
 
 class TestApplyKernel(unittest.TestCase):
@@ -56,3 +57,42 @@ class TestGaussian(unittest.TestCase):
     def test_gaussian_kernel(self):
         self.assertTrue(list(blur.gaussian_kernel(size=5)), list(signal.windows.gaussian(25, 2, True)))
         self.assertTrue(list(blur.gaussian_kernel(size=3)), list(signal.windows.gaussian(9, 1, True)))
+
+    def test_gaussian_kernel_1d(self):
+        for size in (3, 5, 7):
+            kernel_1d = blur.gaussian_kernel_1d(size)
+            self.assertAlmostEqual(kernel_1d.sum(), 1)
+            self.assertTrue(np.allclose(np.outer(kernel_1d, kernel_1d), blur.gaussian_kernel(size)))
+
+        with self.assertRaises(ValueError):
+            blur.gaussian_kernel_1d(4)
+        with self.assertRaises(ValueError):
+            blur.gaussian_kernel(4)
+
+
+class TestSeparableFilters(unittest.TestCase):
+    def test_gauss_blur(self):
+        image = np.random.default_rng(3).uniform(0, 255, (40, 30))
+
+        for size in (3, 5, 9):
+            for border_mode in ('reflect', 'nearest', 'constant'):
+                a_pixel_table = tables.PixelTable(30, 40)
+                a_pixel_table.values[...] = image
+                stand_filter.gauss_blur(a_pixel_table, size, border_mode)
+
+                wanted_result = ndimage.correlate(image.astype(np.float32), blur.gaussian_kernel(size),
+                                                  mode=border_mode)
+                self.assertTrue(np.allclose(a_pixel_table.values, wanted_result, atol=1e-3))
+
+    def test_correlate_1d(self):
+        plane = np.array([[1, 2, 3],
+                          [4, 5, 6]], dtype=np.float32)
+
+        horizontal = stand_filter.correlate_1d(plane, [-1, 0, 1], 1, 'nearest')
+        self.assertEqual(horizontal.tolist(), [[1, 2, 1], [1, 2, 1]])
+
+        vertical = stand_filter.correlate_1d(plane, [1, 1, 1], 0, 'constant', constant=10)
+        self.assertEqual(vertical.tolist(), [[15, 17, 19], [15, 17, 19]])
+
+        with self.assertRaises(ValueError):
+            stand_filter.correlate_1d(plane, [1, 1, 1], 0, 'wrap')
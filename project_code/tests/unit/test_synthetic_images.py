@@ -0,0 +1,71 @@
+from project_code import synthetic_images as synthetic
+from project_code.image_manipulation.classes.wrapper import image_transform as transform
+
+import unittest
+import os
+import tempfile
+import numpy as np
+
+
+class TestSyntheticImages(unittest.TestCase):
+    def test_draw_radii(self):
+        random = np.random.default_rng(1)
+        for distribution in synthetic.radius_distributions:
+            radii = synthetic.draw_radii(random, 500, (10, 30), distribution)
+            self.assertEqual(len(radii), 500)
+            self.assertTrue(((radii >= 10) & (radii <= 30)).all())
+        self.assertLess(np.abs(synthetic.draw_radii(random, 500, (10, 30), 'normal') - 20).mean(),
+                        np.abs(synthetic.draw_radii(random, 500, (10, 30), 'uniform') - 20).mean())
+        with self.assertRaises(ValueError):
+            synthetic.draw_radii(random, 5, (10, 30), 'cubic')
+
+    def test_place_circles(self):
+        radii = np.full(200, 10)
+        for overlap in (0.0, 0.5):
+            circles = np.array(synthetic.place_circles(np.random.default_rng(2), 200, 150, radii, overlap))
+            self.assertTrue(0 < len(circles) < 200)
+            x, y, placed_radii = circles.T
+            self.assertTrue(((x >= placed_radii) & (x + placed_radii < 200)).all())
+            self.assertTrue(((y >= placed_radii) & (y + placed_radii < 150)).all())
+            distances = np.hypot(x[:, np.newaxis] - x, y[:, np.newaxis] - y) + np.eye(len(circles)) * 1000
+            self.assertGreaterEqual(distances.min(), (1 - overlap) * 20)
+        self.assertEqual(len(synthetic.place_circles(np.random.default_rng(2), 200, 150, radii, 1.0)), 200)
+
+    def test_generate_image(self):
+        settings = {'width': 160, 'height': 120, 'count': 6, 'radii': (9, 14), 'blur': 0.8, 'gaussian_noise': 4,
+                    'photons': 400, 'gradient': 30}
+        image, circles = synthetic.generate_image(5, **settings)
+        same_image, same_circles = synthetic.generate_image(5, **settings)
+        other_image, other_circles = synthetic.generate_image(6, **settings)
+        self.assertEqual((image.size, image.mode), ((160, 120), 'L'))
+        self.assertEqual(circles, same_circles)
+        self.assertTrue(np.array_equal(np.asarray(image), np.asarray(same_image)))
+        self.assertNotEqual(circles, other_circles)
+
+        filled_image, filled_circles = synthetic.generate_image(5, **dict(settings, style='filled'))
+        self.assertEqual(filled_circles, circles)
+        x, y, radius = circles[0]
+        self.assertGreater(np.asarray(filled_image)[y, x], np.asarray(image)[y, x] + 100)
+
+        # The generated particles are found by the pipeline.
+        working_image = transform.TransformImage(image)
+        working_image.apply_canny(5, 2)
+        found_circles = working_image.find_circles(1)
+        found_centers = [center for centers in found_circles.values() for center in centers]
+        for x, y, radius in circles:
+            self.assertTrue(any(abs(x - found_x) <= 2 and abs(y - found_y) <= 2 for found_x, found_y in found_centers))
+
+    def test_save_image_set(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertEqual(synthetic.main([directory, '--count', '3', '--width', '80', '--particles', '4',
+                                             '--radii', '6', '10', '--style', 'filled']), 0)
+            image_paths = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                                 if name.endswith('.png'))
+            self.assertEqual(len(image_paths), 3)
+            for index, image_path in enumerate(image_paths):
+                image, circles = synthetic.generate_image((0, index), 80, count=4, radii=(6, 10), style='filled')
+                self.assertEqual(synthetic.load_ground_truth(image_path), circles)
+
+
+if __name__ == '__main__':
+    unittest.main()
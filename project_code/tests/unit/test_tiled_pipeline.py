@@ -0,0 +1,85 @@
+from project_code.image_manipulation import \
+    hough_circle_transform as hough, \
+    tiled_pipeline as tiling
+from project_code.image_manipulation.classes.wrapper import image_transform as transform
+
+import unittest
+from concurrent import futures
+from unittest import mock
+import numpy as np
+from PIL import Image, ImageDraw
+
+circles = [(20, 22, 9), (61, 30, 12), (95, 64, 10), (30, 85, 13), (120, 20, 8), (140, 90, 11)]
+
+
+def draw_ring_image(width=160, height=110):
+    """Draws a light ring for every (x, y, radius) circle on a dark background."""
+    image = Image.new('L', (width, height), 40)
+    drawing = ImageDraw.Draw(image)
+    for center_x, center_y, radius in circles:
+        drawing.ellipse((center_x - radius, center_y - radius, center_x + radius, center_y + radius), outline=220,
+                        width=2)
+    return image
+
+
+class TestTiledPipeline(unittest.TestCase):
+    def test_tile_boxes(self):
+        boxes = tiling.tile_boxes(100, 70, 40, 5)
+
+        self.assertEqual(len(boxes), 6)
+        self.assertEqual(boxes[0], ((0, 0, 40, 40), (0, 0, 45, 45)))
+        self.assertEqual(boxes[4], ((40, 40, 80, 70), (35, 35, 85, 70)))
+        covered = np.zeros((70, 100), dtype=int)
+        for (left, top, right, bottom), tile in boxes:
+            covered[top:bottom, left:right] += 1
+        self.assertTrue((covered == 1).all())
+
+    def test_find_circles_tiled(self):
+        image = draw_ring_image()
+        whole_image = transform.TransformImage(image)
+        whole_image.apply_canny(5, 2)
+        wanted_circles = whole_image.find_circles(1)
+
+        found_circles = whole_image.find_circles_tiled(1, tile_size=48)
+        self.assertEqual(found_circles, wanted_circles)
+        self.assertEqual(sum(len(centers) for centers in found_circles.values()), len(circles))
+
+        x, y, radii, scores = tiling.find_circles_tiled(image, hough.radius_ranges[1], tile_size=64, workers=2)
+        self.assertEqual(hough.circles_per_radius(x, y, radii), wanted_circles)
+
+    def test_find_circles_tiled_empty_image(self):
+        for workers in (1, 2):
+            x, y, radii, scores = tiling.find_circles_tiled(Image.new('L', (0, 0)), hough.radius_ranges[1],
+                                                            workers=workers)
+
+            self.assertEqual([len(x), len(y), len(radii), len(scores)], [0, 0, 0, 0])
+
+    def test_tiles_in_flight(self):
+        image = draw_ring_image()
+        wanted_circles = tiling.find_circles_tiled(image, hough.radius_ranges[1], tile_size=32)
+        # Counts the tiles that are cropped but not searched yet, with threads in place of the worker processes.
+        cropped_tiles = list()
+        searched_tiles = list()
+        tiles_in_flight = list()
+        crop_image = image.crop
+        search_tile = tiling.find_circles_in_tile
+
+        def crop_tile(box):
+            cropped_tiles.append(box)
+            return crop_image(box)
+
+        def search_counted_tile(*arguments):
+            tiles_in_flight.append(len(cropped_tiles) - len(searched_tiles))
+            found_circles = search_tile(*arguments)
+            searched_tiles.append(arguments[2])
+            return found_circles
+
+        with mock.patch.object(image, 'crop', crop_tile), \
+                mock.patch.object(tiling, 'find_circles_in_tile', search_counted_tile), \
+                mock.patch.object(tiling.futures, 'ProcessPoolExecutor', futures.ThreadPoolExecutor):
+            found_circles = tiling.find_circles_tiled(image, hough.radius_ranges[1], tile_size=32, workers=2)
+
+        self.assertEqual(len(cropped_tiles), len(tiling.tile_boxes(160, 110, 32, 1)))
+        self.assertLessEqual(max(tiles_in_flight), 2)
+        for found_values, wanted_values in zip(found_circles, wanted_circles):
+            self.assertTrue(np.array_equal(found_values, wanted_values))